@@ -1,16 +1,38 @@
-from typing import Union
-from datetime import date
+from datetime import date, datetime, timezone
+from itertools import zip_longest
+from typing import BinaryIO
+from xml.etree.ElementTree import ParseError
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
+from pydantic import ValidationError
+from sqlalchemy import func, select, true, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
 import models
-from definitions import ActivityType, DistanceTagRunning, DistanceTagSwimming
-from schemas.activities import ActivityCreate
+from database import checkpoint_policy
+from definitions import ActivityType, ExportFormat, JobKind, JobStatus, RollupPeriod, TrackingType, Terrain, Pool
+from schemas.activities import ActivityCreate, ActivityUpload
 from schemas.events import EventCreate
-from schemas.results import ResultBase, GoalBase
+from schemas.jobs import JobCreate
+from schemas.results import ResultBase, GoalBase, Split, encode_splits
 from schemas.training import TrainingBase
 from schemas.users import UserCreate, UserUpdate
-from utils.utils import calculate_pace, calculate_speed, get_distance_tag, sort_on_pace, get_activity_distance_tag
+from utils import analytics
+from utils.aggregation import aggregate_rollups, effort_paces, aggregate_days
+from utils.cache import stats_cache, prediction_cache, get_bucket_cache, get_pending_buckets
+from utils.predictions import attach_predictions
+from utils.distance_tags import get_distance_tags
+from utils.export import iter_csv, iter_export_batches, iter_ndjson
+from utils.fit import decode_fit, is_fit, summarize_fit
+from utils.storage import checkpoint, get_pragmas, get_wal_size
+from utils.tracks import TrackSummary, iter_track_points, summarize_track
+from utils.training_load import update_training_load
+from utils.utils import calculate_pace, calculate_speed, get_distance_tag, sort_on_pace, get_activity_distance_tag, \
+    get_main_result
+
+BEST_EFFORTS_LIMIT = 3
+RETAG_CHUNK_SIZE = 1000
 
 
 def get_user(db: Session, user_id: int):
@@ -51,200 +73,632 @@ def edit_user(db: Session, user_id: int, user: UserUpdate):
     return db_user
 
 
+def export_user(db: Session, user_id: int, export_format: ExportFormat):
+    if db.get(models.User, user_id) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    batches = iter_export_batches(db, user_id)
+    return iter_csv(batches) if export_format == ExportFormat.csv else iter_ndjson(batches)
+
+
 def remove_user(db: Session, user_id: int):
     db_user = db.get(models.User, user_id)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
     db.delete(db_user)
     db.commit()
+    stats_cache.invalidate(user_id)
+    get_bucket_cache(db).invalidate(user_id)
+    prediction_cache.invalidate(user_id)
     return {"ok": True}
 
 
 def get_activities(db: Session, type: str, user_id: int):
-    return db.query(models.Activity).filter(models.Activity.user_id == user_id).filter(
-        models.Activity.type == type).all()
+    return db.query(models.Activity).options(selectinload(models.Activity.results)) \
+        .filter(models.Activity.user_id == user_id).filter(models.Activity.type == type).all()
 
 
 def get_activity(db: Session, activity_id: int):
     return db.query(models.Activity).filter(models.Activity.id == activity_id).first()
 
 
-def create_result(db: Session, result: ResultBase, activity_id: int,
-                  activity_type: ActivityType):
-    db_results = models.Result(
+def get_result_values(result: ResultBase, activity_type: ActivityType):
+    return dict(
         **result.model_dump(),
-        activity_id=activity_id,
         pace=calculate_pace(result.time, result.distance),
         speed=calculate_speed(result.time, result.distance),
         distance_tag=get_distance_tag(result.distance, activity_type),
     )
-    db.add(db_results)
-    db.commit()
-    db.refresh(db_results)
 
-    return db_results
 
+def build_result(result: ResultBase, activity_type: ActivityType, **kwargs):
+    return models.Result(**get_result_values(result, activity_type), **kwargs)
 
-def create_activity(db: Session, activity: ActivityCreate, user_id: int, event_id: int | None, training_id: int | None):
-    db_activity = models.Activity(
+
+def get_activity_values(activity: ActivityCreate):
+    return dict(
         name=activity.name,
         type=activity.type,
         description=activity.description,
-        date=activity.date,
+        date=activity.date.isoformat(),
         environment=activity.environment,
         training_type=activity.training_type,
         race_type=activity.race_type,
         with_friends=activity.with_friends,
         distance_tag=get_activity_distance_tag(activity.results, activity.type),
+        splits=encode_splits(activity.splits),
+    )
+
+
+def update_changed(db_object, values: dict):
+    for key, value in values.items():
+        if getattr(db_object, key) != value:
+            setattr(db_object, key, value)
+
+
+def create_activity(db: Session, activity: ActivityCreate, user_id: int, event_id: int | None, training_id: int | None):
+    check_activity(activity)
+    db_activity = models.Activity(
+        **get_activity_values(activity),
         user_id=user_id,
         month_id=get_month_id(db=db, date=activity.date, user_id=user_id, activity_type=activity.type.value),
         year_id=get_year_id(db=db, date=activity.date, user_id=user_id, activity_type=activity.type.value),
         event_id=event_id if event_id else None,
         training_id=training_id if training_id else None,
+        results=[build_result(result, activity.type) for result in activity.results],
     )
     db.add(db_activity)
-    db.commit()
-    db.refresh(db_activity)
+    update_rollups(db, db_activity.month_id, db_activity.year_id, activity)
+    db.flush()
 
-    for result in activity.results:
-        create_result(db, result, db_activity.id, activity.type)
+    is_best_effort = add_best_effort(db, db_activity)
+    update_training_load(db, user_id, activity.date)
+    db.commit()
+    stats_cache.invalidate(user_id)
+    if is_best_effort:
+        prediction_cache.invalidate(user_id)
 
     return db_activity
 
 
+def import_activities(db: Session, activities: list, user_id: int):
+    """Store every valid item of a bulk import; each item gets either its new id or the reason it was skipped.
+
+    Items are validated one by one, so a malformed item does not reject the rest of the batch.
+    """
+    imported, valid = [], []
+    for index, item in enumerate(activities):
+        activity, error = parse_activity(item)
+        imported.append({'index': index, 'id': None, 'error': error})
+        if error is None:
+            valid.append((imported[-1], activity))
+    if not valid:
+        return imported
+
+    by_date = sorted((activity for _, activity in valid), key=lambda activity: activity.date)
+    month_ids = resolve_buckets(db, models.Monthly, models.Monthly.month, user_id,
+                                [(activity.type.value, get_month_key(activity.date)) for activity in by_date])
+    year_ids = resolve_buckets(db, models.Yearly, models.Yearly.year, user_id,
+                               [(activity.type.value, get_year_key(activity.date)) for activity in by_date])
+
+    db_activities = []
+    totals = {}
+    for _, activity in valid:
+        db_activity = models.Activity(
+            **get_activity_values(activity),
+            user_id=user_id,
+            month_id=month_ids[(activity.type.value, get_month_key(activity.date))],
+            year_id=year_ids[(activity.type.value, get_year_key(activity.date))],
+            results=[build_result(result, activity.type) for result in activity.results],
+        )
+        db_activities.append(db_activity)
+
+        main_result = get_main_result(activity)
+        for key in ((models.Monthly, db_activity.month_id), (models.Yearly, db_activity.year_id)):
+            distance, time, count = totals.get(key, (0.0, 0, 0))
+            totals[key] = (distance + main_result.distance, time + main_result.time, count + 1)
+    db.add_all(db_activities)
+    db.flush()
+
+    for (model, bucket_id), (distance, time, count) in totals.items():
+        add_to_rollup(db, model, bucket_id, distance, time, count)
+    for activity_type, distance_tag in {(db_activity.type.value, db_activity.distance_tag)
+                                        for db_activity in db_activities if db_activity.distance_tag}:
+        refill_best_efforts(db, user_id, activity_type, distance_tag)
+    update_training_load(db, user_id, by_date[0].date)
+    db.commit()
+    stats_cache.invalidate(user_id)
+    prediction_cache.invalidate(user_id)
+
+    for (item, _), db_activity in zip(valid, db_activities):
+        item['id'] = db_activity.id
+    return imported
+
+
+def parse_activity(item) -> tuple[ActivityCreate | None, str | None]:
+    try:
+        activity = ActivityCreate.model_validate(item)
+    except ValidationError as error:
+        return None, "; ".join(f"{'.'.join(map(str, detail['loc'])) or 'activity'}: {detail['msg']}"
+                               for detail in error.errors())
+    return activity, get_activity_error(activity)
+
+
+def get_activity_error(activity: ActivityCreate):
+    """The reason an activity cannot be stored, shared by single, edited and bulk imported activities."""
+    if not activity.results:
+        return "Activity has no results"
+    if any(result.distance <= 0 or result.time <= 0 for result in activity.results):
+        return "Result distance and time must be positive"
+    return None
+
+
+def check_activity(activity: ActivityCreate):
+    error = get_activity_error(activity)
+    if error:
+        raise HTTPException(status_code=422, detail=error)
+
+
+def resolve_buckets(db: Session, model, period_column, user_id: int, keys: list[tuple[str, str]]):
+    """Map (activity_type, period) keys to bucket ids, creating missing buckets.
+
+    Ids come from the bucket cache when possible; the rest are upserted on the unique (user_id, activity_type,
+    period) index in one statement, so parallel writers converge on the same bucket.
+    """
+    cache, pending = get_bucket_cache(db), get_pending_buckets(db)
+    bucket_ids = {}
+    for key in dict.fromkeys(keys):
+        cache_key = (user_id, model.__tablename__, *key)
+        bucket_id = pending.get(cache_key) or cache.get(cache_key)
+        if bucket_id is not None:
+            bucket_ids[key] = bucket_id
+    missing = [key for key in dict.fromkeys(keys) if key not in bucket_ids]
+    if not missing:
+        return bucket_ids
+
+    statement = insert(model).values([
+        {"user_id": user_id, "activity_type": activity_type, period_column.key: period}
+        for activity_type, period in missing
+    ])
+    statement = statement.on_conflict_do_update(
+        index_elements=[model.user_id, model.activity_type, period_column],
+        set_={period_column.key: statement.excluded[period_column.key]},
+    ).returning(model.activity_type, period_column, model.id)
+    for activity_type, period, bucket_id in db.execute(statement):
+        bucket_ids[(activity_type, period)] = bucket_id
+        pending[(user_id, model.__tablename__, activity_type, period)] = bucket_id
+    return bucket_ids
+
+
+def upload_activity(db: Session, file: BinaryIO, user_id: int, upload: ActivityUpload):
+    header = file.read(12)
+    file.seek(0)
+    try:
+        if is_fit(header):
+            summary = summarize_fit(decode_fit(file.read()))
+        else:
+            summary = summarize_track(iter_track_points(file))
+    except (ParseError, ValueError) as error:
+        raise HTTPException(status_code=400, detail=f"Invalid track file: {error}")
+
+    return create_activity_from_track(db, summary, user_id, upload)
+
+
+def create_activity_from_track(db: Session, summary: TrackSummary, user_id: int, upload: ActivityUpload):
+    results = [ResultBase(distance=summary.distance, time=summary.time, tracking_type=TrackingType.personal)]
+    splits = [Split(distance=distance, time=time) for distance, time in summary.splits if distance > 0 and time > 0]
+    activity_type = upload.type or summary.activity_type or ActivityType.running
+    environment = upload.environment or summary.pool or \
+        (Terrain.road if activity_type is ActivityType.running else Pool.open_waters)
+    activity = ActivityCreate(**upload.model_dump(exclude={"type", "environment"}), type=activity_type,
+                              environment=environment, date=summary.start.date(), results=results, splits=splits)
+    return create_activity(db, activity, user_id, event_id=None, training_id=None)
+
+
 def edit_activity(db: Session, activity_id: int, activity: ActivityCreate, event_id: int | None, training_id: int | None):
-    db_activity = db.query(models.Activity).filter(models.Activity.id == activity_id).first()
-    remove_activity(db, activity_id)
-    return create_activity(db, activity, db_activity.user_id, event_id=event_id, training_id=training_id)
+    """Update an activity in place, touching the derived data only where an input to it changed.
+
+    Rollups and the training load depend on the date, type and main result; best efforts on the type, distance tag
+    and effort pace. Editing anything else, such as the name or description, only updates the activity row.
+    """
+    db_activity = db.get(models.Activity, activity_id)
+    if not db_activity:
+        raise HTTPException(status_code=404, detail="Activity not found")
+    check_activity(activity)
+    user_id = db_activity.user_id
+    old_date, old_type, old_tag = str(db_activity.date), db_activity.type, db_activity.distance_tag
+    old_month_id, old_year_id = db_activity.month_id, db_activity.year_id
+    old_main, old_pace = get_main_values(db_activity), sort_on_pace(db_activity)
+    was_best_effort = db_activity.best_effort is not None
+
+    values = get_activity_values(activity)
+    if values['date'] != old_date or values['type'] != old_type:
+        values['month_id'] = get_month_id(db=db, date=activity.date, user_id=user_id, activity_type=activity.type.value)
+        values['year_id'] = get_year_id(db=db, date=activity.date, user_id=user_id, activity_type=activity.type.value)
+    if event_id:
+        values['event_id'] = event_id
+    if training_id:
+        values['training_id'] = training_id
+    update_changed(db_activity, values)
+    update_results(db_activity, activity)
+    new_main = get_main_values(db_activity)
+
+    load_changed = (old_date, old_type, old_main) != (db_activity.date, db_activity.type, new_main)
+    effort_changed = (old_type, old_tag, old_pace) != \
+        (db_activity.type, db_activity.distance_tag, sort_on_pace(db_activity))
+    if load_changed:
+        move_rollups(db, (old_month_id, old_year_id), old_main, (db_activity.month_id, db_activity.year_id), new_main)
+    db.flush()
+
+    is_best_effort = False
+    if effort_changed:
+        if was_best_effort:
+            refill_best_efforts(db, user_id, old_type, old_tag)
+        if not was_best_effort or (old_type, old_tag) != (db_activity.type, db_activity.distance_tag):
+            is_best_effort = add_best_effort(db, db_activity)
+    if load_changed:
+        update_training_load(db, user_id, min(date.fromisoformat(old_date), activity.date))
+    db.commit()
+    stats_cache.invalidate(user_id)
+    if effort_changed and (was_best_effort or is_best_effort):
+        prediction_cache.invalidate(user_id)
+
+    return db_activity
+
+
+def get_main_values(activity) -> tuple[float, int]:
+    main_result = get_main_result(activity)
+    return (main_result.distance, main_result.time) if main_result else (0.0, 0)
+
+
+def move_rollups(db: Session, old_bucket_ids: tuple[int, int], old_main: tuple[float, int],
+                 new_bucket_ids: tuple[int, int], new_main: tuple[float, int]):
+    """Move an edited activity's main result between buckets, with one UPDATE per bucket it stays in."""
+    for model, old_id, new_id in zip((models.Monthly, models.Yearly), old_bucket_ids, new_bucket_ids):
+        if old_id == new_id:
+            add_to_rollup(db, model, old_id, new_main[0] - old_main[0], new_main[1] - old_main[1], 0)
+        else:
+            add_to_rollup(db, model, old_id, -old_main[0], -old_main[1], -1)
+            add_to_rollup(db, model, new_id, new_main[0], new_main[1], 1)
+
+
+def update_results(db_activity: models.Activity, activity: ActivityCreate):
+    for db_result, result in zip_longest(list(db_activity.results), activity.results):
+        if result is None:
+            db_activity.results.remove(db_result)
+        elif db_result is None:
+            db_activity.results.append(build_result(result, activity.type))
+        else:
+            update_changed(db_result, get_result_values(result, activity.type))
 
 
 def remove_activity(db: Session, activity_id: int):
     db_activity = db.get(models.Activity, activity_id)
     if not db_activity:
         raise HTTPException(status_code=404, detail="Activity not found")
+    update_rollups(db, db_activity.month_id, db_activity.year_id, db_activity, sign=-1)
+    is_best_effort = db_activity.best_effort is not None
     db.delete(db_activity)
+    db.flush()
+    if is_best_effort:
+        refill_best_efforts(db, db_activity.user_id, db_activity.type, db_activity.distance_tag)
+    update_training_load(db, db_activity.user_id, date.fromisoformat(str(db_activity.date)))
     db.commit()
+    stats_cache.invalidate(db_activity.user_id)
+    if is_best_effort:
+        prediction_cache.invalidate(db_activity.user_id)
 
     return {"ok": True}
 
 
-def get_month_id(db: Session, date: date, user_id: int, activity_type: str, create_if_none=True) -> int:
-    month = f"{date.year}-{date.month}"
-    db_monthly = db.query(models.Monthly).filter(models.Monthly.month == month,
-                                                 models.Monthly.activity_type == activity_type).first()
-    if create_if_none and not db_monthly:
-        return create_monthly(db=db, month=month, user_id=user_id, activity_type=activity_type).id
-    else:
-        return db_monthly.id
+def get_month_key(date: date) -> str:
+    return f"{date.year}-{date.month}"
 
 
-def get_year_id(db: Session, date: date, user_id: int, activity_type: str, create_if_none=True) -> Union[int, None]:
-    year = str(date.year)
-    db_yearly = db.query(models.Yearly).filter(models.Yearly.year == year,
-                                               models.Yearly.activity_type == activity_type).first()
-    if create_if_none and not db_yearly:
-        return create_yearly(db=db, year=year, user_id=user_id, activity_type=activity_type).id
-    else:
-        return db_yearly.id
+def get_year_key(date: date) -> str:
+    return str(date.year)
 
 
-def create_monthly(db: Session, month: str, user_id: int, activity_type: str):
-    db_monthly = db.query(models.Monthly).filter(
-        models.Monthly.month == month, models.Monthly.activity_type == activity_type).first()
-    if not db_monthly:
-        db_monthly = models.Monthly(month=month, user_id=user_id, activity_type=activity_type)
-        db.add(db_monthly)
-        db.commit()
-    return db_monthly
+def get_month_id(db: Session, date: date, user_id: int, activity_type: str) -> int:
+    key = (activity_type, get_month_key(date))
+    return resolve_buckets(db, models.Monthly, models.Monthly.month, user_id, [key])[key]
 
 
-def create_yearly(db: Session, year: str, user_id: int, activity_type: str):
-    db_yearly = db.query(models.Yearly).filter(
-        models.Yearly.year == year, models.Yearly.activity_type == activity_type).first()
-    if not db_yearly:
-        db_yearly = models.Yearly(year=year, user_id=user_id, activity_type=activity_type)
-        db.add(db_yearly)
-        db.commit()
-    return db_yearly
+def get_year_id(db: Session, date: date, user_id: int, activity_type: str) -> int:
+    key = (activity_type, get_year_key(date))
+    return resolve_buckets(db, models.Yearly, models.Yearly.year, user_id, [key])[key]
+
+
+def update_rollups(db: Session, month_id: int, year_id: int, activity, sign: int = 1):
+    main_result = get_main_result(activity)
+    distance = main_result.distance if main_result else 0.0
+    time = main_result.time if main_result else 0
+
+    for model, bucket_id in ((models.Monthly, month_id), (models.Yearly, year_id)):
+        add_to_rollup(db, model, bucket_id, sign * distance, sign * time, sign)
+
+
+def add_to_rollup(db: Session, model, bucket_id: int, distance: float, time: int, count: int):
+    db.query(model).filter(model.id == bucket_id).update({
+        model.total_distance: model.total_distance + distance,
+        model.total_time: model.total_time + time,
+        model.activity_count: model.activity_count + count,
+    })
+
+
+def rebuild_rollups(db: Session, user_id: int):
+    monthly, yearly = aggregate_rollups(db, user_id)
+
+    for model, totals in ((models.Monthly, monthly), (models.Yearly, yearly)):
+        for bucket in db.query(model).filter(model.user_id == user_id):
+            bucket.total_distance, bucket.total_time, bucket.activity_count = totals.get(bucket.id, (0.0, 0, 0))
+    db.commit()
+    stats_cache.invalidate(user_id)
+
+    return {"ok": True}
 
 
 def get_stats(db: Session, user_id: int, activity_type: str):
+    """The buckets with their stored totals and every activity embedded, plus the best efforts.
+
+    Embedding the activities makes this grow with the number of activities, not buckets; they are loaded once and
+    shared by the monthly and yearly buckets. get_stats_summary serves the same totals with activity ids only, and
+    the SQL aggregation in utils.aggregation only backs rebuild_rollups.
+    """
     monthlies = db.query(models.Monthly) \
-        .filter(models.Monthly.user_id == user_id, models.Monthly.activity_type == activity_type)
+        .filter(models.Monthly.user_id == user_id, models.Monthly.activity_type == activity_type).all()
     yearlies = db.query(models.Yearly) \
-        .filter(models.Yearly.user_id == user_id, models.Yearly.activity_type == activity_type)
+        .filter(models.Yearly.user_id == user_id, models.Yearly.activity_type == activity_type).all()
+    activities = db.query(models.Activity).options(selectinload(models.Activity.results)) \
+        .filter(models.Activity.user_id == user_id, models.Activity.type == activity_type) \
+        .order_by(models.Activity.id).all()
+    for buckets, foreign_key in ((monthlies, "month_id"), (yearlies, "year_id")):
+        bucket_activities = {}
+        for activity in activities:
+            bucket_activities.setdefault(getattr(activity, foreign_key), []).append(activity)
+        for bucket in buckets:
+            set_committed_value(bucket, "activities", bucket_activities.get(bucket.id, []))
 
     return {'monthly': monthlies, 'yearly': yearlies,
             'best_efforts': get_best_efforts(db=db, user_id=user_id, activity_type=activity_type)}
 
 
-def get_best_efforts(db: Session, user_id: int, activity_type: str):
-    best_efforts = {}
-    if activity_type == ActivityType.running:
-        for tag in DistanceTagRunning:
-            best_efforts[tag.value] = db.query(models.Activity).join(models.Result) \
-                .filter(models.Activity.user_id == user_id, models.Activity.type == activity_type,
-                        models.Activity.distance_tag == tag).all()
+def get_stats_summary(db: Session, user_id: int, activity_type: str):
+    monthlies = db.query(models.Monthly) \
+        .filter(models.Monthly.user_id == user_id, models.Monthly.activity_type == activity_type).all()
+    yearlies = db.query(models.Yearly) \
+        .filter(models.Yearly.user_id == user_id, models.Yearly.activity_type == activity_type).all()
+
+    monthly_ids, yearly_ids = {}, {}
+    activities = db.query(models.Activity.id, models.Activity.month_id, models.Activity.year_id) \
+        .filter(models.Activity.user_id == user_id, models.Activity.type == activity_type) \
+        .order_by(models.Activity.id)
+    for activity_id, month_id, year_id in activities:
+        monthly_ids.setdefault(month_id, []).append(activity_id)
+        yearly_ids.setdefault(year_id, []).append(activity_id)
+
+    return {
+        'monthly': [{**get_bucket_summary(monthly), 'month': monthly.month,
+                     'activity_ids': monthly_ids.get(monthly.id, [])} for monthly in monthlies],
+        'yearly': [{**get_bucket_summary(yearly), 'year': yearly.year,
+                    'activity_ids': yearly_ids.get(yearly.id, [])} for yearly in yearlies],
+        'best_efforts': get_best_efforts(db, user_id, activity_type, ids_only=True),
+    }
+
+
+def get_bucket_summary(bucket: models.Monthly | models.Yearly):
+    return {
+        'activity_type': bucket.activity_type,
+        'total_distance': bucket.total_distance,
+        'total_time': bucket.total_time,
+        'activity_count': bucket.activity_count,
+    }
+
+
+def get_rollups(db: Session, user_id: int, activity_type: str, date_from: date, date_to: date,
+                period: RollupPeriod):
+    if date_from >= date_to:
+        raise HTTPException(status_code=400, detail="date_from must be before date_to")
+
+    rollups = {}
+    if period == RollupPeriod.range:
+        rollups[f"{date_from}/{date_to}"] = (0.0, 0, 0)
+    for day, distance, time, count in aggregate_days(db, user_id, activity_type, date_from, date_to):
+        day = date.fromisoformat(day)
+        if period == RollupPeriod.day:
+            key = day.isoformat()
+        elif period == RollupPeriod.week:
+            iso_year, iso_week, _ = day.isocalendar()
+            key = f"{iso_year}-W{iso_week:02d}"
+        else:
+            key = f"{date_from}/{date_to}"
+        total_distance, total_time, activity_count = rollups.get(key, (0.0, 0, 0))
+        rollups[key] = (total_distance + distance, total_time + time, activity_count + count)
 
-    elif activity_type == ActivityType.swimming:
-        for tag in DistanceTagSwimming:
-            best_efforts[tag.value] = db.query(models.Activity).join(models.Result) \
-                .filter(models.Activity.user_id == user_id, models.Activity.type == activity_type,
-                        models.Activity.distance_tag == tag).all()
-    else:
+    return [{'period': key, 'total_distance': total_distance, 'total_time': total_time,
+             'activity_count': activity_count}
+            for key, (total_distance, total_time, activity_count) in rollups.items()]
+
+
+def get_training_load(db: Session, user_id: int, date_from: date | None, date_to: date | None):
+    training_load = db.query(models.TrainingLoad).filter(models.TrainingLoad.user_id == user_id)
+    if date_from:
+        training_load = training_load.filter(models.TrainingLoad.date >= date_from.isoformat())
+    if date_to:
+        training_load = training_load.filter(models.TrainingLoad.date < date_to.isoformat())
+    return training_load.order_by(models.TrainingLoad.date).all()
+
+
+def rebuild_training_load(db: Session, user_id: int):
+    update_training_load(db, user_id, date.min)
+    db.commit()
+
+    return {"ok": True}
+
+
+def get_trends(db: Session, user_id: int, activity_type: str, window: int):
+    return analytics.get_trends(db, user_id, activity_type, window)
+
+
+def get_best_efforts(db: Session, user_id: int, activity_type: str, ids_only: bool = False):
+    best_efforts = {tag: [] for tag in get_distance_tags(activity_type)}
+    if not best_efforts:
         return {}
 
-    for key in best_efforts.keys():
-        best_efforts_by_distance = best_efforts[key].sort(key=sort_on_pace)
-        if best_efforts_by_distance:
-            best_efforts[key] = best_efforts_by_distance[:3]
+    if ids_only:
+        efforts = db.query(models.BestEffort.distance_tag, models.BestEffort.activity_id)
+    else:
+        efforts = db.query(models.BestEffort.distance_tag, models.Activity).join(models.BestEffort.activity) \
+            .options(selectinload(models.Activity.results))
+    efforts = efforts.filter(models.BestEffort.user_id == user_id, models.BestEffort.activity_type == activity_type) \
+        .order_by(models.BestEffort.pace, models.BestEffort.activity_id)
+    for distance_tag, activity in efforts:
+        if distance_tag in best_efforts:
+            best_efforts[distance_tag].append(activity)
 
     return best_efforts
 
 
+def add_best_effort(db: Session, db_activity: models.Activity):
+    pace = sort_on_pace(db_activity)
+    if pace is None or not db_activity.distance_tag:
+        return False
+
+    efforts = db.query(models.BestEffort).filter(
+        models.BestEffort.user_id == db_activity.user_id,
+        models.BestEffort.activity_type == db_activity.type,
+        models.BestEffort.distance_tag == db_activity.distance_tag,
+    ).order_by(models.BestEffort.pace, models.BestEffort.activity_id).all()
+    if len(efforts) >= BEST_EFFORTS_LIMIT and pace >= efforts[BEST_EFFORTS_LIMIT - 1].pace:
+        return False
+
+    db.add(models.BestEffort(user_id=db_activity.user_id, activity_type=db_activity.type,
+                             distance_tag=db_activity.distance_tag, activity_id=db_activity.id, pace=pace))
+    for effort in efforts[BEST_EFFORTS_LIMIT - 1:]:
+        db.delete(effort)
+    return True
+
+
+def refill_best_efforts(db: Session, user_id: int, activity_type: str, distance_tag: str):
+    db.query(models.BestEffort).filter(
+        models.BestEffort.user_id == user_id,
+        models.BestEffort.activity_type == activity_type,
+        models.BestEffort.distance_tag == distance_tag,
+    ).delete()
+
+    paces = effort_paces(user_id, activity_type, distance_tag)
+    for activity_id, pace in db.execute(
+            select(paces).order_by(paces.c.pace, paces.c.activity_id).limit(BEST_EFFORTS_LIMIT)):
+        db.add(models.BestEffort(user_id=user_id, activity_type=activity_type, distance_tag=distance_tag,
+                                 activity_id=activity_id, pace=pace))
+
+
+def rebuild_best_efforts(db: Session, user_id: int):
+    db.query(models.BestEffort).filter(models.BestEffort.user_id == user_id).delete()
+    for activity_type in ActivityType:
+        for tag in get_distance_tags(activity_type):
+            refill_best_efforts(db, user_id, activity_type.value, tag)
+    db.commit()
+    stats_cache.invalidate(user_id)
+    prediction_cache.invalidate(user_id)
+
+    return {"ok": True}
+
+
+def retag_distances(db: Session, chunk_size: int = RETAG_CHUNK_SIZE):
+    """Reclassify stored result and activity distance tags against the current tag tables.
+
+    Rows are read in primary key order, one chunk at a time, and only changed tags are written back with one bulk
+    UPDATE and commit per chunk. Best efforts are rebuilt for every user whose activity tags changed, and the
+    cached stats of every user whose result tags changed are dropped.
+    """
+    results = select(models.Result.id, models.Result.distance, models.Activity.type, models.Result.distance_tag,
+                     models.Activity.user_id) \
+        .join(models.Result.activity)
+    changed_results = retag_chunks(db, models.Result, results, chunk_size)
+
+    first_results = select(models.Result.activity_id, func.min(models.Result.id).label("result_id")) \
+        .where(models.Result.tracking_type.in_([TrackingType.official, TrackingType.personal])) \
+        .group_by(models.Result.activity_id).subquery()
+    activities = select(models.Activity.id, models.Result.distance, models.Activity.type,
+                        models.Activity.distance_tag, models.Activity.user_id) \
+        .outerjoin(first_results, first_results.c.activity_id == models.Activity.id) \
+        .outerjoin(models.Result, models.Result.id == first_results.c.result_id)
+    changed_activities = retag_chunks(db, models.Activity, activities, chunk_size)
+
+    for user_id in sorted({user_id for user_id, in changed_activities}):
+        rebuild_best_efforts(db, user_id)
+    for user_id in {user_id for user_id, in changed_results}:
+        stats_cache.invalidate(user_id)
+    return {"results": len(changed_results), "activities": len(changed_activities)}
+
+
+def retag_chunks(db: Session, model, rows, chunk_size: int):
+    changed, last_id = [], 0
+    while chunk := db.execute(rows.where(model.id > last_id).order_by(model.id).limit(chunk_size)).all():
+        updates = []
+        for row_id, distance, activity_type, distance_tag, *extra in chunk:
+            new_tag = get_distance_tag(distance, activity_type) if distance is not None else None
+            if new_tag != distance_tag:
+                updates.append({"id": row_id, "distance_tag": new_tag})
+                changed.append(tuple(extra))
+        if updates:
+            db.execute(update(model), updates)
+        db.commit()
+        last_id = chunk[-1][0]
+    return changed
+
+
 def get_events(db: Session, type: str, user_id: int):
-    return db.query(models.Event).filter(models.Event.user_id == user_id).filter(
-        models.Event.type == type).all()
+    events = db.query(models.Event).options(selectinload(models.Event.goal)) \
+        .filter(models.Event.user_id == user_id).filter(models.Event.type == type).all()
+    return attach_predictions(db, events)
 
 
 def get_event(db: Session, event_id: int):
-    return db.query(models.Event).filter(models.Event.id == event_id).first()
+    db_event = db.query(models.Event).filter(models.Event.id == event_id).first()
+    if db_event:
+        attach_predictions(db, [db_event])
+    return db_event
 
 
-def create_goal(db: Session, goal: GoalBase, distance: float, event_id: int):
-    db_goal = models.Goal(
+def get_goal_values(goal: GoalBase, distance: float):
+    return dict(
         **goal.model_dump(),
-        event_id=event_id,
         pace=calculate_pace(goal.time, distance),
         speed=calculate_speed(goal.time, distance),
     )
-    db.add(db_goal)
-    db.commit()
-    db.refresh(db_goal)
-    print(db_goal)
 
-    return db_goal
 
+def build_goal(goal: GoalBase, distance: float):
+    return models.Goal(**get_goal_values(goal, distance))
 
-def create_event(db: Session, event: EventCreate, user_id: int):
-    db_event = models.Event(
+
+def get_event_values(event: EventCreate):
+    return dict(
         name=event.name,
         type=event.type,
         description=event.description,
-        date=event.date,
+        date=event.date.isoformat(),
         distance=event.distance,
         environment=event.environment,
         race_type=event.race_type,
         distance_tag=get_distance_tag(event.distance, event.type),
-        user_id=user_id,
         training_id=event.training_id,
     )
+
+
+def create_event(db: Session, event: EventCreate, user_id: int):
+    db_event = models.Event(
+        **get_event_values(event),
+        user_id=user_id,
+        goal=build_goal(event.goal, event.distance) if event.goal else None,
+    )
     db.add(db_event)
     db.commit()
-    db.refresh(db_event)
-
-    if event.goal:
-        create_goal(db, event.goal, event.distance, db_event.id)
+    stats_cache.invalidate(user_id)
+    # A new event has no activity yet; setting it spares a lazy load when the response is built.
+    set_committed_value(db_event, "activity", None)
 
     return db_event
 
@@ -255,14 +709,26 @@ def remove_event(db: Session, event_id: int):
         raise HTTPException(status_code=404, detail="Event not found")
     db.delete(db_event)
     db.commit()
+    stats_cache.invalidate(db_event.user_id)
 
     return {"ok": True}
 
 
 def edit_event(db: Session, event_id: int, event: EventCreate):
-    db_event = db.query(models.Event).filter(models.Event.id == event_id).first()
-    remove_event(db, event_id)
-    return create_event(db, event, db_event.user_id)
+    db_event = db.get(models.Event, event_id)
+    if not db_event:
+        raise HTTPException(status_code=404, detail="Event not found")
+    update_changed(db_event, get_event_values(event))
+    if not event.goal:
+        db_event.goal = None
+    elif not db_event.goal:
+        db_event.goal = build_goal(event.goal, event.distance)
+    else:
+        update_changed(db_event.goal, get_goal_values(event.goal, event.distance))
+    db.commit()
+    stats_cache.invalidate(db_event.user_id)
+
+    return db_event
 
 
 def get_trainings(db: Session, type: str, user_id: int):
@@ -274,13 +740,19 @@ def get_training(db: Session, training_id: int):
     return db.query(models.Training).filter(models.Training.id == training_id).first()
 
 
-def create_training(db: Session, training: TrainingBase, user_id: int):
-    db_training = models.Training(
+def get_training_values(training: TrainingBase):
+    return dict(
         name=training.name,
         type=training.type,
         description=training.description,
-        begin_date=training.begin_date,
-        end_date=training.end_date,
+        begin_date=training.begin_date.isoformat(),
+        end_date=training.end_date.isoformat(),
+    )
+
+
+def create_training(db: Session, training: TrainingBase, user_id: int):
+    db_training = models.Training(
+        **get_training_values(training),
         user_id=user_id,
     )
     db.add(db_training)
@@ -301,9 +773,13 @@ def remove_training(db: Session, training_id: int):
 
 
 def edit_training(db: Session, training_id: int, training: TrainingBase):
-    db_training = db.query(models.Training).filter(models.Training.id == training_id).first()
-    remove_training(db, training_id)
-    return create_training(db, training, db_training.user_id)
+    db_training = db.get(models.Training, training_id)
+    if not db_training:
+        raise HTTPException(status_code=404, detail="Training not found")
+    update_changed(db_training, get_training_values(training))
+    db.commit()
+
+    return db_training
 
 
 def get_untraceables(db, user_id):
@@ -391,3 +867,90 @@ def remove_date_untraceable(db, untraceable_id, remove_date):
     db.commit()
     db.refresh(db_untraceable)
     return db_untraceable
+
+
+def get_untraceable_dates(db: Session, user_id: int, date_from: date, date_to: date):
+    untraceable_date = func.json_each(models.Untraceable.dates).table_valued("value")
+    return db.execute(
+        select(untraceable_date.c.value, models.Untraceable.id)
+        .join(untraceable_date, true())
+        .where(models.Untraceable.user_id == user_id,
+               untraceable_date.c.value >= date_from.isoformat(), untraceable_date.c.value < date_to.isoformat())
+        .order_by(untraceable_date.c.value, models.Untraceable.id)
+    ).all()
+
+
+def get_calendar(db: Session, user_id: int, date_from: date, date_to: date):
+    if date_from >= date_to:
+        raise HTTPException(status_code=400, detail="date_from must be before date_to")
+
+    days = []
+    activity_days = iter(aggregate_days(db, user_id, None, date_from, date_to))
+    untraceable_dates = iter(get_untraceable_dates(db, user_id, date_from, date_to))
+    activity_day, untraceable_date = next(activity_days, None), next(untraceable_dates, None)
+    while activity_day or untraceable_date:
+        day = min(row[0] for row in (activity_day, untraceable_date) if row)
+        calendar_day = {'date': day, 'untraceable_ids': []}
+        if activity_day and activity_day[0] == day:
+            _, calendar_day['total_distance'], calendar_day['total_time'], calendar_day['activity_count'] = \
+                activity_day
+            activity_day = next(activity_days, None)
+        while untraceable_date and untraceable_date[0] == day:
+            calendar_day['untraceable_ids'].append(untraceable_date[1])
+            untraceable_date = next(untraceable_dates, None)
+        days.append(calendar_day)
+
+    return days
+
+
+def get_storage_info(db: Session):
+    return {"pragmas": get_pragmas(db.connection()), **checkpoint_policy.info(),
+            "wal_size": get_wal_size(db.get_bind())}
+
+
+def run_checkpoint(db: Session, mode: str):
+    try:
+        return checkpoint(db.get_bind(), mode)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+
+def get_jobs(db: Session, user_id: int | None = None, status: JobStatus | None = None):
+    jobs = db.query(models.Job)
+    if user_id is not None:
+        jobs = jobs.filter(models.Job.user_id == user_id)
+    if status is not None:
+        jobs = jobs.filter(models.Job.status == status)
+    return jobs.order_by(models.Job.id).all()
+
+
+def get_job(db: Session, job_id: int):
+    return db.get(models.Job, job_id)
+
+
+def create_job(db: Session, job: JobCreate):
+    if job.kind != JobKind.retag and job.user_id is None:
+        raise HTTPException(status_code=400, detail=f"A {job.kind.value} job needs a user_id")
+    if job.kind == JobKind.import_activities:
+        # The activities are validated one by one when the job runs, like a bulk import, and get their own errors.
+        if not isinstance(job.payload, list):
+            raise HTTPException(status_code=400, detail="An import job needs a list of activities as payload")
+
+    db_job = models.Job(**job.model_dump(), status=JobStatus.queued, progress=0.0, attempts=0,
+                        created_at=datetime.now(timezone.utc).isoformat(timespec="seconds"))
+    db.add(db_job)
+    db.commit()
+    return db_job
+
+
+def retry_job(db: Session, job_id: int):
+    db_job = db.get(models.Job, job_id)
+    if not db_job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if db_job.status != JobStatus.failed:
+        raise HTTPException(status_code=400, detail="Only failed jobs can be retried")
+
+    update_changed(db_job, dict(status=JobStatus.queued, progress=0.0, attempts=0, error=None, result=None,
+                                started_at=None, finished_at=None))
+    db.commit()
+    return db_job
@@ -1,20 +1,79 @@
+import os
+from functools import lru_cache
+
+from fastapi import Request
+from pydantic import TypeAdapter
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+from utils.storage import CheckpointPolicy, StorageProfile, apply_read_only, apply_storage_profile
+
 SQLALCHEMY_DATABASE_URL = "sqlite:///db/homerun.db"
+ASYNC_DATABASE_URL = "sqlite+aiosqlite:///db/homerun.db"
 
+# Every write, from requests and from background jobs alike, goes through the single connection of `engine`, so
+# writers queue in its pool instead of contending for SQLite's write lock. Reads get pools of query-only
+# connections that, in WAL mode, never wait for the writer. Async sessions are read-only: handlers that write are
+# sync and run in the thread pool, where waiting for the writer does not block the event loop.
+READ_POOL_SIZE = os.cpu_count() or 4
+READ_METHODS = frozenset({"GET", "HEAD"})
+
+storage_profile = StorageProfile.from_env()
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}, pool_size=1, max_overflow=0
+)
+apply_storage_profile(engine, storage_profile)
+checkpoint_policy = CheckpointPolicy(engine, storage_profile)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+read_engine = create_engine(
+    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}, pool_size=READ_POOL_SIZE, max_overflow=0
 )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+apply_storage_profile(read_engine, storage_profile)
+apply_read_only(read_engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=read_engine)
+
+async_read_engine = create_async_engine(ASYNC_DATABASE_URL, pool_size=READ_POOL_SIZE, max_overflow=0)
+apply_storage_profile(async_read_engine.sync_engine, storage_profile)
+apply_read_only(async_read_engine.sync_engine)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
 
-def get_db():
-    db = SessionLocal()
+def get_db(request: Request):
+    db = ReadSessionLocal() if request.method in READ_METHODS else SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+
+@lru_cache
+def get_type_adapter(response_model) -> TypeAdapter:
+    return TypeAdapter(response_model)
+
+
+async def run_sync(db: AsyncSession, function, *args, response_model=None, **kwargs):
+    """Run a sync crud function on the connection of an async session without blocking the event loop.
+
+    With a response_model the result is validated before leaving the session's greenlet, so relationships are
+    still loaded lazily there instead of failing once the request handler serializes the ORM objects.
+
+    The function still runs on the event loop thread, so this is for database-bound work only; handlers doing heavy
+    Python work (parsing uploads, stats, trends, predictions) are sync and run in the thread pool on get_db.
+    """
+    def call(session):
+        result = function(session, *args, **kwargs)
+        if response_model is None or result is None:
+            return result
+        return get_type_adapter(response_model).validate_python(result, from_attributes=True)
+
+    return await db.run_sync(call)
@@ -23,6 +23,31 @@ class ActivityType(str, Enum):
     swimming = "swimming"
 
 
+class RollupPeriod(str, Enum):
+    day = "day"
+    week = "week"
+    range = "range"
+
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+class JobKind(str, Enum):
+    rebuild = "rebuild"
+    retag = "retag"
+    import_activities = "import"
+    warm_cache = "warm cache"
+
+
+class JobStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+
+
 class TrackingType(str, Enum):
     personal = "personal"
     official = "official"
@@ -1,16 +1,29 @@
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI
 
-import models
-from database import engine
-from routers import users, activities, stats, config, events, training, untraceables
+from database import engine, checkpoint_policy
+from migrations import check_schema
+from routers import users, activities, stats, config, events, training, untraceables, calendar, jobs
 from fastapi.middleware.cors import CORSMiddleware
+from utils.jobs import job_runner
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    check_schema(engine)
+    checkpoint_policy.start()
+    job_runner.start()
+    yield
+    job_runner.shutdown()
+    checkpoint_policy.stop()
 
-models.Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title="Homerun",
     redoc_url=None,
+    lifespan=lifespan,
 )
 
 origins = [
@@ -34,6 +47,8 @@ app.include_router(untraceables.router)
 app.include_router(events.router)
 app.include_router(training.router)
 app.include_router(stats.router)
+app.include_router(calendar.router)
+app.include_router(jobs.router)
 app.include_router(config.router)
 
 if __name__ == "__main__":
@@ -0,0 +1,48 @@
+from sqlalchemy.engine import Connection, Engine
+
+from migrations import v001_initial_schema, v002_baseline_upgrade, v003_query_indexes, v004_queue_rebuild_jobs
+
+# Migration n brings a database to schema version n; the version is kept in SQLite's PRAGMA user_version.
+MIGRATIONS = [v001_initial_schema, v002_baseline_upgrade, v003_query_indexes, v004_queue_rebuild_jobs]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+class SchemaVersionError(RuntimeError):
+    pass
+
+
+def get_schema_version(connection: Connection) -> int:
+    return connection.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def migrate(engine: Engine, target: int = SCHEMA_VERSION) -> list[int]:
+    """Apply the pending migrations up to target and return the versions applied.
+
+    pysqlite runs DDL outside of a transaction, so a migration interrupted halfway is simply applied again: every
+    migration must be idempotent.
+    """
+    if not 0 <= target <= SCHEMA_VERSION:
+        raise ValueError(f"Unknown schema version {target}")
+    applied = []
+    with engine.connect() as connection:
+        version = get_schema_version(connection)
+        if version > target:
+            raise SchemaVersionError(f"Database schema is at version {version}, downgrading is not supported")
+        for number, migration in enumerate(MIGRATIONS[version:target], start=version + 1):
+            migration.upgrade(connection)
+            connection.exec_driver_sql(f"PRAGMA user_version = {number}")
+            connection.commit()
+            applied.append(number)
+    return applied
+
+
+def check_schema(engine: Engine):
+    """Fail fast when the database does not match the code; reads a single header field instead of every table."""
+    with engine.connect() as connection:
+        version = get_schema_version(connection)
+    if version < SCHEMA_VERSION:
+        raise SchemaVersionError(f"Database schema is at version {version}, expected {SCHEMA_VERSION}; "
+                                 f"run `python -m migrations` to migrate it")
+    if version > SCHEMA_VERSION:
+        raise SchemaVersionError(f"Database schema version {version} is newer than this version of Homerun "
+                                 f"({SCHEMA_VERSION})")
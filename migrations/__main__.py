@@ -0,0 +1,16 @@
+import argparse
+
+from database import engine
+from migrations import SCHEMA_VERSION, get_schema_version, migrate
+
+parser = argparse.ArgumentParser(prog="python -m migrations", description="Migrate the Homerun database schema.")
+parser.add_argument("--target", type=int, default=SCHEMA_VERSION, help="schema version to migrate to")
+parser.add_argument("--status", action="store_true", help="only print the current and latest schema version")
+args = parser.parse_args()
+
+if args.status:
+    with engine.connect() as connection:
+        print(f"schema version {get_schema_version(connection)} of {SCHEMA_VERSION}")
+else:
+    applied = migrate(engine, args.target)
+    print(f"applied migrations {', '.join(map(str, applied))}" if applied else "schema is up to date")
@@ -0,0 +1,172 @@
+"""Baseline schema: the tables as create_all built them when the migrations were introduced.
+
+Databases created by create_all at startup already have these tables, so every statement is IF NOT EXISTS and
+such a database is stamped with this version; v002 brings tables created by older models up to these ones.
+"""
+
+TABLES = [
+    """CREATE TABLE IF NOT EXISTS users (
+        id INTEGER NOT NULL,
+        user_name VARCHAR,
+        hashed_password VARCHAR,
+        PRIMARY KEY (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER NOT NULL,
+        kind VARCHAR NOT NULL,
+        user_id INTEGER,
+        status VARCHAR NOT NULL,
+        payload JSON,
+        result JSON,
+        error VARCHAR,
+        progress DOUBLE NOT NULL,
+        attempts INTEGER NOT NULL,
+        max_attempts INTEGER NOT NULL,
+        created_at VARCHAR NOT NULL,
+        started_at VARCHAR,
+        finished_at VARCHAR,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS monthly (
+        id INTEGER NOT NULL,
+        month VARCHAR,
+        user_id INTEGER NOT NULL,
+        activity_type VARCHAR NOT NULL,
+        total_distance DOUBLE NOT NULL,
+        total_time INTEGER NOT NULL,
+        activity_count INTEGER NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS training (
+        id INTEGER NOT NULL,
+        name VARCHAR NOT NULL,
+        type VARCHAR NOT NULL,
+        description VARCHAR,
+        begin_date VARCHAR NOT NULL,
+        end_date VARCHAR NOT NULL,
+        user_id INTEGER NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS training_load (
+        id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        date VARCHAR NOT NULL,
+        load DOUBLE NOT NULL,
+        acute DOUBLE NOT NULL,
+        chronic DOUBLE NOT NULL,
+        balance DOUBLE NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS untraceables (
+        id INTEGER NOT NULL,
+        name VARCHAR NOT NULL,
+        description VARCHAR,
+        dates JSON NOT NULL,
+        user_id INTEGER NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS yearly (
+        id INTEGER NOT NULL,
+        year VARCHAR,
+        user_id INTEGER NOT NULL,
+        activity_type VARCHAR NOT NULL,
+        total_distance DOUBLE NOT NULL,
+        total_time INTEGER NOT NULL,
+        activity_count INTEGER NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS events (
+        id INTEGER NOT NULL,
+        name VARCHAR NOT NULL,
+        type VARCHAR NOT NULL,
+        description VARCHAR,
+        date VARCHAR NOT NULL,
+        environment VARCHAR,
+        race_type VARCHAR,
+        distance DOUBLE NOT NULL,
+        distance_tag VARCHAR,
+        user_id INTEGER NOT NULL,
+        training_id INTEGER,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id),
+        FOREIGN KEY(training_id) REFERENCES training (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS activities (
+        id INTEGER NOT NULL,
+        name VARCHAR NOT NULL,
+        type VARCHAR NOT NULL,
+        description VARCHAR,
+        date VARCHAR NOT NULL,
+        distance_tag VARCHAR,
+        splits BLOB,
+        environment VARCHAR,
+        training_type VARCHAR,
+        race_type VARCHAR,
+        with_friends BOOLEAN,
+        user_id INTEGER NOT NULL,
+        month_id INTEGER NOT NULL,
+        year_id INTEGER NOT NULL,
+        event_id INTEGER,
+        training_id INTEGER,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id),
+        FOREIGN KEY(month_id) REFERENCES monthly (id),
+        FOREIGN KEY(year_id) REFERENCES yearly (id),
+        FOREIGN KEY(event_id) REFERENCES events (id),
+        FOREIGN KEY(training_id) REFERENCES training (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS goals (
+        id INTEGER NOT NULL,
+        event_id INTEGER,
+        time INTEGER,
+        pace INTEGER,
+        speed DOUBLE,
+        PRIMARY KEY (id),
+        FOREIGN KEY(event_id) REFERENCES events (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS best_efforts (
+        id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        activity_type VARCHAR NOT NULL,
+        distance_tag VARCHAR NOT NULL,
+        activity_id INTEGER NOT NULL,
+        pace INTEGER NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id),
+        UNIQUE (activity_id),
+        FOREIGN KEY(activity_id) REFERENCES activities (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS results (
+        id INTEGER NOT NULL,
+        activity_id INTEGER NOT NULL,
+        distance DOUBLE NOT NULL,
+        distance_tag VARCHAR,
+        time INTEGER NOT NULL,
+        pace INTEGER NOT NULL,
+        speed DOUBLE NOT NULL,
+        url VARCHAR,
+        tracking_type VARCHAR,
+        PRIMARY KEY (id),
+        FOREIGN KEY(activity_id) REFERENCES activities (id)
+    )""",
+]
+
+INDEXES = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_user_name ON users (user_name)",
+    "CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs (status)",
+    "CREATE INDEX IF NOT EXISTS ix_jobs_user_id ON jobs (user_id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_training_load_user_id_date ON training_load (user_id, date)",
+    "CREATE INDEX IF NOT EXISTS ix_best_efforts_user_id_activity_type_distance_tag_pace "
+    "ON best_efforts (user_id, activity_type, distance_tag, pace)",
+]
+
+
+def upgrade(connection):
+    for statement in TABLES + INDEXES:
+        connection.exec_driver_sql(statement)
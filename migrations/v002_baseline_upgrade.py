@@ -0,0 +1,105 @@
+"""Bring databases created by create_all before the migrations existed up to the version 1 tables.
+
+Such databases already had every table v001 creates with IF NOT EXISTS, so they kept the old columns:
+
+- monthly and yearly lacked the rollup totals and activities lacked the packed splits;
+- activities.distance_tag was NOT NULL, while activities off the standard distances now have no tag;
+- a bucket was looked up by month (or year) and activity type only, so the first user to log an activity in a
+  month owned the bucket every other user's activities were added to, and concurrent inserts left duplicates.
+
+The totals are only added here; v004 queues the jobs that compute them.
+"""
+
+ROLLUP_COLUMNS = [
+    ("total_distance", "DOUBLE NOT NULL DEFAULT 0"),
+    ("total_time", "INTEGER NOT NULL DEFAULT 0"),
+    ("activity_count", "INTEGER NOT NULL DEFAULT 0"),
+]
+
+# The activities table of v001; SQLite cannot drop a NOT NULL constraint in place, so the table is rebuilt.
+ACTIVITIES = """CREATE TABLE activities_rebuilt (
+    id INTEGER NOT NULL,
+    name VARCHAR NOT NULL,
+    type VARCHAR NOT NULL,
+    description VARCHAR,
+    date VARCHAR NOT NULL,
+    distance_tag VARCHAR,
+    splits BLOB,
+    environment VARCHAR,
+    training_type VARCHAR,
+    race_type VARCHAR,
+    with_friends BOOLEAN,
+    user_id INTEGER NOT NULL,
+    month_id INTEGER NOT NULL,
+    year_id INTEGER NOT NULL,
+    event_id INTEGER,
+    training_id INTEGER,
+    PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES users (id),
+    FOREIGN KEY(month_id) REFERENCES monthly (id),
+    FOREIGN KEY(year_id) REFERENCES yearly (id),
+    FOREIGN KEY(event_id) REFERENCES events (id),
+    FOREIGN KEY(training_id) REFERENCES training (id)
+)"""
+ACTIVITY_COLUMNS = ("id, name, type, description, date, distance_tag, splits, environment, training_type, race_type, "
+                    "with_friends, user_id, month_id, year_id, event_id, training_id")
+
+BUCKETS = [("monthly", "month", "month_id"), ("yearly", "year", "year_id")]
+
+
+def get_columns(connection, table: str) -> dict[str, bool]:
+    """Map the column names of a table to whether they are NOT NULL."""
+    return {column[1]: bool(column[3]) for column in connection.exec_driver_sql(f"PRAGMA table_info({table})")}
+
+
+def add_columns(connection):
+    for table, _, _ in BUCKETS:
+        columns = get_columns(connection, table)
+        for name, definition in ROLLUP_COLUMNS:
+            if name not in columns:
+                connection.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+    if "splits" not in get_columns(connection, "activities"):
+        connection.exec_driver_sql("ALTER TABLE activities ADD COLUMN splits BLOB")
+
+
+def make_distance_tag_nullable(connection):
+    if not get_columns(connection, "activities")["distance_tag"]:
+        return
+    connection.exec_driver_sql("DROP TABLE IF EXISTS activities_rebuilt")
+    connection.exec_driver_sql(ACTIVITIES)
+    connection.exec_driver_sql(
+        f"INSERT INTO activities_rebuilt ({ACTIVITY_COLUMNS}) SELECT {ACTIVITY_COLUMNS} FROM activities")
+    connection.exec_driver_sql("DROP TABLE activities")
+    connection.exec_driver_sql("ALTER TABLE activities_rebuilt RENAME TO activities")
+
+
+def split_buckets(connection, table: str, period: str, foreign_key: str):
+    """Give every user their own bucket per period and activity type, and point their activities at it.
+
+    Of duplicate buckets the one with the lowest id is kept. A shared bucket stays with the user who created it,
+    even when only other users' activities were in it: the app leaves empty buckets behind as well.
+    """
+    connection.exec_driver_sql(f"""
+        INSERT INTO {table} ({period}, user_id, activity_type, total_distance, total_time, activity_count)
+        SELECT DISTINCT bucket.{period}, activities.user_id, bucket.activity_type, 0, 0, 0
+        FROM activities JOIN {table} AS bucket ON bucket.id = activities.{foreign_key}
+        WHERE NOT EXISTS (SELECT 1 FROM {table} AS own WHERE own.user_id = activities.user_id
+                          AND own.activity_type = bucket.activity_type AND own.{period} IS bucket.{period})
+    """)
+    connection.exec_driver_sql(f"""
+        UPDATE activities SET {foreign_key} = (
+            SELECT min(own.id) FROM {table} AS bucket JOIN {table} AS own
+                ON own.activity_type = bucket.activity_type AND own.{period} IS bucket.{period}
+            WHERE bucket.id = activities.{foreign_key} AND own.user_id = activities.user_id
+        )
+        WHERE {foreign_key} IN (SELECT id FROM {table})
+    """)
+    connection.exec_driver_sql(
+        f"DELETE FROM {table} WHERE id NOT IN (SELECT min(id) FROM {table} GROUP BY user_id, activity_type, {period})")
+
+
+def upgrade(connection):
+    add_columns(connection)
+    make_distance_tag_nullable(connection)
+    for table, period, foreign_key in BUCKETS:
+        split_buckets(connection, table, period, foreign_key)
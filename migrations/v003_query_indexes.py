@@ -0,0 +1,53 @@
+"""Replace the index on nearly every column with composite indexes matching the crud queries.
+
+Every insert into activities and results used to maintain about ten B-trees, while the lookups by (user_id, type),
+(user_id, type, distance_tag) and by foreign key (stats buckets, events, trainings, goals) had no usable index.
+create_all never adds indexes to existing tables, so the composite indexes declared on the models since are
+created here as well.
+"""
+
+OBSOLETE_INDEXES = [
+    "ix_activities_id", "ix_activities_name", "ix_activities_type", "ix_activities_description",
+    "ix_activities_date", "ix_activities_distance_tag", "ix_activities_environment", "ix_activities_training_type",
+    "ix_activities_race_type", "ix_activities_with_friends",
+    "ix_untraceables_id", "ix_untraceables_name", "ix_untraceables_description", "ix_untraceables_dates",
+    "ix_users_id",
+    "ix_monthly_id", "ix_monthly_month", "ix_monthly_activity_type",
+    "ix_yearly_id", "ix_yearly_year", "ix_yearly_activity_type",
+    "ix_results_id", "ix_results_distance", "ix_results_time", "ix_results_pace", "ix_results_speed",
+    "ix_results_url",
+    "ix_best_efforts_id", "ix_training_load_id", "ix_jobs_id",
+    "ix_goals_id", "ix_goals_time", "ix_goals_pace", "ix_goals_speed",
+    "ix_events_id", "ix_events_name", "ix_events_type", "ix_events_description", "ix_events_date",
+    "ix_events_environment", "ix_events_race_type", "ix_events_distance", "ix_events_distance_tag",
+    "ix_training_id", "ix_training_name", "ix_training_type", "ix_training_description", "ix_training_begin_date",
+    "ix_training_end_date",
+]
+
+# Foreign keys that are mostly NULL get partial indexes, so activities and events without a link cost nothing.
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_activities_user_id_type_date ON activities (user_id, type, date)",
+    "CREATE INDEX IF NOT EXISTS ix_activities_user_id_type_distance_tag "
+    "ON activities (user_id, type, distance_tag)",
+    "CREATE INDEX IF NOT EXISTS ix_activities_user_id_date ON activities (user_id, date)",
+    "CREATE INDEX IF NOT EXISTS ix_activities_month_id ON activities (month_id)",
+    "CREATE INDEX IF NOT EXISTS ix_activities_year_id ON activities (year_id)",
+    "CREATE INDEX IF NOT EXISTS ix_activities_event_id ON activities (event_id) WHERE event_id IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS ix_activities_training_id ON activities (training_id) WHERE training_id IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS ix_results_activity_id ON results (activity_id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_monthly_user_id_activity_type_month "
+    "ON monthly (user_id, activity_type, month)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_yearly_user_id_activity_type_year ON yearly (user_id, activity_type, year)",
+    "CREATE INDEX IF NOT EXISTS ix_untraceables_user_id ON untraceables (user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_goals_event_id ON goals (event_id)",
+    "CREATE INDEX IF NOT EXISTS ix_events_user_id_type ON events (user_id, type)",
+    "CREATE INDEX IF NOT EXISTS ix_events_training_id ON events (training_id) WHERE training_id IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS ix_training_user_id_type ON training (user_id, type)",
+]
+
+
+def upgrade(connection):
+    for name in OBSOLETE_INDEXES:
+        connection.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+    for statement in INDEXES:
+        connection.exec_driver_sql(statement)
@@ -0,0 +1,24 @@
+"""Queue the jobs that compute the data derived from activities for databases that predate it.
+
+The rollup totals, best efforts and training load are maintained on every write since they were introduced, but
+databases migrated from before then start out with zero totals and empty tables, and v002 moved activities between
+buckets. Computing them takes the app's own code, which a migration must not import as it changes with every later
+version, so the work is queued on the jobs table instead: the job runner picks the jobs up when the app starts.
+
+The retag job is queued first, as best efforts are grouped by distance tag and it rebuilds them for every user whose
+tags it changes. Jobs that are already queued are not queued twice, and a database without activities has nothing
+to compute.
+"""
+
+QUEUE_JOB = """
+    INSERT INTO jobs (kind, user_id, status, progress, attempts, max_attempts, created_at)
+    SELECT '{kind}', {user_id}, 'queued', 0.0, 0, 3, strftime('%Y-%m-%dT%H:%M:%S+00:00', 'now') {source}
+    WHERE NOT EXISTS (SELECT 1 FROM jobs WHERE kind = '{kind}' AND user_id IS {user_id} AND status = 'queued')
+"""
+
+
+def upgrade(connection):
+    if connection.exec_driver_sql("SELECT 1 FROM activities LIMIT 1").first() is None:
+        return
+    connection.exec_driver_sql(QUEUE_JOB.format(kind="retag", user_id="NULL", source=""))
+    connection.exec_driver_sql(QUEUE_JOB.format(kind="rebuild", user_id="users.id", source="FROM users"))
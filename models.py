@@ -1,25 +1,34 @@
-from sqlalchemy import Column, Integer, String, Double, ForeignKey, Boolean, Float, JSON
+from sqlalchemy import Column, Integer, String, Double, ForeignKey, Boolean, Float, JSON, Index, LargeBinary, text
 from sqlalchemy.orm import relationship
 
 from database import Base
-from utils.utils import get_official_and_personal_indices
 
 
 class Activity(Base):
     __tablename__ = "activities"
-
-    id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, index=True, nullable=False)
-    type = Column(String, index=True, nullable=False)
-    description = Column(String, index=True)
-    date = Column(String, index=True, nullable=False)
+    __table_args__ = (
+        Index("ix_activities_user_id_type_date", "user_id", "type", "date"),
+        Index("ix_activities_user_id_type_distance_tag", "user_id", "type", "distance_tag"),
+        Index("ix_activities_user_id_date", "user_id", "date"),
+        Index("ix_activities_month_id", "month_id"),
+        Index("ix_activities_year_id", "year_id"),
+        Index("ix_activities_event_id", "event_id", sqlite_where=text("event_id IS NOT NULL")),
+        Index("ix_activities_training_id", "training_id", sqlite_where=text("training_id IS NOT NULL")),
+    )
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    type = Column(String, nullable=False)
+    description = Column(String)
+    date = Column(String, nullable=False)
     results = relationship("Result", back_populates="activity", cascade="all, delete-orphan")
-    distance_tag = Column(String, index=True, nullable=False)
+    distance_tag = Column(String)
+    splits = Column(LargeBinary)
 
-    environment = Column(String, index=True)
-    training_type = Column(String, index=True)
-    race_type = Column(String, index=True)
-    with_friends = Column(Boolean, index=True)
+    environment = Column(String)
+    training_type = Column(String)
+    race_type = Column(String)
+    with_friends = Column(Boolean)
 
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     month_id = Column(Integer, ForeignKey("monthly.id"), nullable=False)
@@ -32,15 +41,19 @@ class Activity(Base):
     yearly = relationship("Yearly", back_populates="activities")
     event = relationship("Event", back_populates="activity")
     training = relationship("Training", back_populates="activities")
+    best_effort = relationship("BestEffort", back_populates="activity", cascade="all, delete-orphan", uselist=False)
 
 
 class Untraceable(Base):
     __tablename__ = "untraceables"
-
-    id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, index=True, nullable=False)
-    description = Column(String, index=True)
-    dates = Column(JSON, index=True, nullable=False)
+    __table_args__ = (
+        Index("ix_untraceables_user_id", "user_id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    description = Column(String)
+    dates = Column(JSON, nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
 
     user = relationship("User", back_populates="untraceables")
@@ -49,7 +62,7 @@ class Untraceable(Base):
 class User(Base):
     __tablename__ = "users"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     user_name = Column(String, unique=True, index=True)
     hashed_password = Column(String)
 
@@ -59,124 +72,147 @@ class User(Base):
     trainings = relationship("Training", back_populates="user", cascade="all, delete-orphan")
     monthly = relationship("Monthly", back_populates="user", cascade="all, delete-orphan")
     yearly = relationship("Yearly", back_populates="user", cascade="all, delete-orphan")
+    training_load = relationship("TrainingLoad", back_populates="user", cascade="all, delete-orphan")
+    jobs = relationship("Job", back_populates="user", cascade="all, delete-orphan")
 
 
 class Monthly(Base):
     __tablename__ = "monthly"
+    __table_args__ = (
+        Index("ix_monthly_user_id_activity_type_month", "user_id", "activity_type", "month", unique=True),
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
-    month = Column(String, index=True)
+    id = Column(Integer, primary_key=True)
+    month = Column(String)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    activity_type = Column(String, index=True, nullable=False)
+    activity_type = Column(String, nullable=False)
+    total_distance = Column(Double, nullable=False, default=0.0)
+    total_time = Column(Integer, nullable=False, default=0)
+    activity_count = Column(Integer, nullable=False, default=0)
 
     activities = relationship("Activity", back_populates="monthly", cascade="all, delete-orphan")
     user = relationship("User", back_populates="monthly")
 
-    @property
-    def total_distance(self) -> int:
-        total_distance = 0
-        for activity in self.activities:
-            official_index, personal_index = get_official_and_personal_indices(activity)
-            if personal_index:
-                total_distance += activity.results[personal_index].distance
-            elif official_index:
-                total_distance += activity.results[official_index].distance
-            else:
-                total_distance += activity.results[0].distance
-        return total_distance
-
-    @property
-    def total_time(self) -> int:
-        total_time = 0
-        for activity in self.activities:
-            official_index, personal_index = get_official_and_personal_indices(activity)
-            if personal_index:
-                total_time += activity.results[personal_index].time
-            elif official_index:
-                total_time += activity.results[official_index].time
-            else:
-                total_time += activity.results[0].time
-        return total_time
-
 
 class Yearly(Base):
     __tablename__ = "yearly"
+    __table_args__ = (
+        Index("ix_yearly_user_id_activity_type_year", "user_id", "activity_type", "year", unique=True),
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
-    year = Column(String, index=True)
+    id = Column(Integer, primary_key=True)
+    year = Column(String)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    activity_type = Column(String, index=True, nullable=False)
+    activity_type = Column(String, nullable=False)
+    total_distance = Column(Double, nullable=False, default=0.0)
+    total_time = Column(Integer, nullable=False, default=0)
+    activity_count = Column(Integer, nullable=False, default=0)
 
     activities = relationship("Activity", back_populates="yearly", cascade="all, delete-orphan")
     user = relationship("User", back_populates="yearly")
 
-    @property
-    def total_distance(self) -> int:
-        total_distance = 0
-        for activity in self.activities:
-            official_index, personal_index = get_official_and_personal_indices(activity)
-            if personal_index:
-                total_distance += activity.results[personal_index].distance
-            elif official_index:
-                total_distance += activity.results[official_index].distance
-            else:
-                total_distance += activity.results[0].distance
-        return total_distance
-
-    @property
-    def total_time(self) -> int:
-        total_time = 0
-        for activity in self.activities:
-            official_index, personal_index = get_official_and_personal_indices(activity)
-            if personal_index:
-                total_time += activity.results[personal_index].time
-            elif official_index:
-                total_time += activity.results[official_index].time
-            else:
-                total_time += activity.results[0].time
-        return total_time
-
 
 class Result(Base):
     __tablename__ = "results"
 
-    id = Column(Integer, primary_key=True, index=True)
-    activity_id = Column(Integer, ForeignKey("activities.id"), nullable=False)
-    distance = Column(Double, index=True, nullable=False)
+    id = Column(Integer, primary_key=True)
+    activity_id = Column(Integer, ForeignKey("activities.id"), index=True, nullable=False)
+    distance = Column(Double, nullable=False)
     distance_tag = Column(String)
-    time = Column(Integer, index=True, nullable=False)
-    pace = Column(Integer, index=True, nullable=False)
-    speed = Column(Double, index=True, nullable=False)
-    url = Column(String, index=True)
+    time = Column(Integer, nullable=False)
+    pace = Column(Integer, nullable=False)
+    speed = Column(Double, nullable=False)
+    url = Column(String)
     tracking_type = Column(String)
 
     activity = relationship("Activity", back_populates="results")
 
 
+class BestEffort(Base):
+    __tablename__ = "best_efforts"
+    __table_args__ = (
+        Index("ix_best_efforts_user_id_activity_type_distance_tag_pace", "user_id", "activity_type", "distance_tag",
+              "pace"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    activity_type = Column(String, nullable=False)
+    distance_tag = Column(String, nullable=False)
+    activity_id = Column(Integer, ForeignKey("activities.id"), nullable=False, unique=True)
+    pace = Column(Integer, nullable=False)
+
+    activity = relationship("Activity", back_populates="best_effort")
+
+
+class TrainingLoad(Base):
+    __tablename__ = "training_load"
+    __table_args__ = (
+        Index("ix_training_load_user_id_date", "user_id", "date", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    date = Column(String, nullable=False)
+    load = Column(Double, nullable=False)
+    acute = Column(Double, nullable=False)
+    chronic = Column(Double, nullable=False)
+    balance = Column(Double, nullable=False)
+
+    user = relationship("User", back_populates="training_load")
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    status = Column(String, index=True, nullable=False)
+    payload = Column(JSON)
+    result = Column(JSON)
+    error = Column(String)
+    progress = Column(Double, nullable=False, default=0.0)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    created_at = Column(String, nullable=False)
+    started_at = Column(String)
+    finished_at = Column(String)
+
+    user = relationship("User", back_populates="jobs")
+
+
 class Goal(Base):
     __tablename__ = "goals"
+    __table_args__ = (
+        Index("ix_goals_event_id", "event_id"),
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     event_id = Column(Integer, ForeignKey("events.id"), nullable=True)
-    time = Column(Integer, index=True)
-    pace = Column(Integer, index=True)
-    speed = Column(Double, index=True)
+    time = Column(Integer)
+    pace = Column(Integer)
+    speed = Column(Double)
 
     event = relationship("Event", back_populates="goal")
 
 
 class Event(Base):
     __tablename__ = "events"
-
-    id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, index=True, nullable=False)
-    type = Column(String, index=True, nullable=False)
-    description = Column(String, index=True)
-    date = Column(String, index=True, nullable=False)
-    environment = Column(String, index=True)
-    race_type = Column(String, index=True)
-    distance = Column(Double, index=True, nullable=False)
-    distance_tag = Column(String, index=True, nullable=True)
+    __table_args__ = (
+        Index("ix_events_user_id_type", "user_id", "type"),
+        Index("ix_events_training_id", "training_id", sqlite_where=text("training_id IS NOT NULL")),
+    )
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    type = Column(String, nullable=False)
+    description = Column(String)
+    date = Column(String, nullable=False)
+    environment = Column(String)
+    race_type = Column(String)
+    distance = Column(Double, nullable=False)
+    distance_tag = Column(String, nullable=True)
 
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     training_id = Column(Integer, ForeignKey("training.id"))
@@ -189,13 +225,16 @@ class Event(Base):
 
 class Training(Base):
     __tablename__ = "training"
-
-    id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, index=True, nullable=False)
-    type = Column(String, index=True, nullable=False)
-    description = Column(String, index=True)
-    begin_date = Column(String, index=True, nullable=False)
-    end_date = Column(String, index=True, nullable=False)
+    __table_args__ = (
+        Index("ix_training_user_id_type", "user_id", "type"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    type = Column(String, nullable=False)
+    description = Column(String)
+    begin_date = Column(String, nullable=False)
+    end_date = Column(String, nullable=False)
 
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
 
@@ -1,11 +1,12 @@
-from typing import List
+from typing import Any, List, Annotated
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, UploadFile
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 import crud
-from schemas.activities import Activity, ActivityCreate
-from database import get_db
+from schemas.activities import Activity, ActivityCreate, ActivityImport, ActivityUpload
+from database import get_async_db, get_db, run_sync
 
 router = APIRouter(
     prefix="/api/activities",
@@ -16,12 +17,13 @@ router = APIRouter(
 
 @router.get("/{user_id}/{type}", response_model=list[Activity])
 def get_activities(user_id: int, type: str, db: Session = Depends(get_db)) -> List[Activity]:
+    # Sync, so validating every activity with its results runs in the thread pool instead of on the event loop.
     return crud.get_activities(db=db, type=type, user_id=user_id)
 
 
 @router.get("/{activity_id}", response_model=Activity)
-def get_activity(activity_id: int, db: Session = Depends(get_db)) -> Activity:
-    activity = crud.get_activity(db=db, activity_id=activity_id)
+async def get_activity(activity_id: int, db: AsyncSession = Depends(get_async_db)) -> Activity:
+    activity = await run_sync(db, crud.get_activity, activity_id=activity_id, response_model=Activity)
     if activity is None:
         raise HTTPException(status_code=404, detail="Activity not found")
     return activity
@@ -35,7 +37,23 @@ def create_activity(
         event_id: int | None = None,
         training_id: int | None = None
 ):
-    return crud.create_activity(db=db, activity=activity, user_id=user_id, event_id=event_id, training_id=training_id)
+    return crud.create_activity(db=db, activity=activity, user_id=user_id, event_id=event_id,
+                                training_id=training_id)
+
+
+@router.post("/{user_id}/bulk", response_model=list[ActivityImport])
+def import_activities(user_id: int, activities: Annotated[List[Any], Body()],
+                      db: Session = Depends(get_db)) -> List[ActivityImport]:
+    # The items are ActivityCreate bodies, validated one by one so that a malformed item only fails itself.
+    return crud.import_activities(db=db, activities=activities, user_id=user_id)
+
+
+@router.post("/{user_id}/upload", response_model=Activity)
+def upload_activity(user_id: int, file: UploadFile, upload: Annotated[ActivityUpload, Query()],
+                    db: Session = Depends(get_db)):
+    # A sync handler runs in the thread pool, so parsing a long track does not block the event loop; the spooled
+    # upload is streamed to the parser as it is.
+    return crud.upload_activity(db=db, file=file.file, user_id=user_id, upload=upload)
 
 
 @router.put("/{activity_id}")
@@ -46,7 +64,8 @@ def edit_activity(
         event_id: int | None = None,
         training_id: int | None = None
 ) -> Activity:
-    return crud.edit_activity(db=db, activity_id=activity_id, activity=activity, event_id=event_id, training_id=training_id)
+    return crud.edit_activity(db=db, activity_id=activity_id, activity=activity, event_id=event_id,
+                              training_id=training_id)
 
 
 @router.delete("/{activity_id}")
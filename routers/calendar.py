@@ -0,0 +1,21 @@
+from datetime import date
+from typing import List
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud
+from database import get_async_db, run_sync
+from schemas.calendar import CalendarDay
+
+router = APIRouter(
+    prefix="/api/calendar",
+    tags=["calendar"],
+    responses={404: {"description": "Not found"}},
+)
+
+
+@router.get("/{user_id}", response_model=list[CalendarDay])
+async def get_calendar(user_id: int, date_from: date, date_to: date,
+                       db: AsyncSession = Depends(get_async_db)) -> List[CalendarDay]:
+    return await run_sync(db, crud.get_calendar, user_id=user_id, date_from=date_from, date_to=date_to)
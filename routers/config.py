@@ -1,13 +1,14 @@
 from typing import List, Dict, Any
 
 from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 import crud
 from definitions import DistanceTagRunning, ActivityType, RaceType, TrainingTypeSwimming, TrainingTypeRunning, Pool, \
     Terrain, TrackingType
 from schemas.activities import Activity, ActivityCreate
-from database import get_db
+from database import get_async_db, get_db, run_sync
 
 router = APIRouter(
     prefix="/api/config",
@@ -17,7 +18,7 @@ router = APIRouter(
 
 
 @router.get("/", response_model=dict[str, list[Any]])
-def get_config() -> dict[str, list[Any]]:
+async def get_config() -> dict[str, list[Any]]:
     return {
         "activity_type": [e.value for e in ActivityType],
         "tracking": [e.value for e in TrackingType],
@@ -29,4 +30,11 @@ def get_config() -> dict[str, list[Any]]:
     }
 
 
+@router.get("/storage")
+async def get_storage(db: AsyncSession = Depends(get_async_db)):
+    return await run_sync(db, crud.get_storage_info)
 
+
+@router.post("/storage/checkpoint")
+def checkpoint(mode: str = "passive", db: Session = Depends(get_db)):
+    return crud.run_checkpoint(db=db, mode=mode)
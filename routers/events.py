@@ -15,6 +15,7 @@ router = APIRouter(
 )
 
 
+# Events carry predictions, which are computed in Python: these handlers are sync so they run in the thread pool.
 @router.get("/{user_id}/{type}", response_model=list[Event])
 def get_events(user_id: int, type: str, db: Session = Depends(get_db)) -> List[Event]:
     return crud.get_events(db=db, type=type, user_id=user_id)
@@ -32,9 +33,7 @@ def get_event(event_id: int, db: Session = Depends(get_db)) -> Event:
 def create_event(
         user_id: int, event: EventCreate, db: Session = Depends(get_db)
 ):
-    event = crud.create_event(db=db, event=event, user_id=user_id)
-    event.activity = None
-    return event
+    return crud.create_event(db=db, event=event, user_id=user_id)
 
 
 @router.put("/{event_id}")
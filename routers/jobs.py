@@ -0,0 +1,47 @@
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+import crud
+from database import get_async_db, get_db, run_sync
+from definitions import JobStatus
+from schemas.jobs import Job, JobCreate
+from utils.jobs import JobRunner, get_job_runner
+
+router = APIRouter(
+    prefix="/api/jobs",
+    tags=["jobs"],
+    responses={404: {"description": "Not found"}},
+)
+
+
+@router.get("/", response_model=list[Job])
+async def get_jobs(user_id: int | None = None, status: JobStatus | None = None,
+                   db: AsyncSession = Depends(get_async_db)) -> List[Job]:
+    return await run_sync(db, crud.get_jobs, user_id=user_id, status=status, response_model=list[Job])
+
+
+@router.get("/{job_id}", response_model=Job)
+async def get_job(job_id: int, db: AsyncSession = Depends(get_async_db)) -> Job:
+    job = await run_sync(db, crud.get_job, job_id=job_id, response_model=Job)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.post("/", response_model=Job, status_code=202)
+def create_job(job: JobCreate, db: Session = Depends(get_db),
+               runner: JobRunner = Depends(get_job_runner)) -> Job:
+    db_job = crud.create_job(db=db, job=job)
+    runner.submit(db_job.id)
+    return db_job
+
+
+@router.post("/{job_id}/retry", response_model=Job, status_code=202)
+def retry_job(job_id: int, db: Session = Depends(get_db),
+              runner: JobRunner = Depends(get_job_runner)) -> Job:
+    db_job = crud.retry_job(db=db, job_id=job_id)
+    runner.submit(db_job.id)
+    return db_job
@@ -1,11 +1,15 @@
+from datetime import date
 from typing import List
 
-from fastapi import Depends, APIRouter
+from fastapi import Depends, APIRouter, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 import crud
-from database import get_db
-from schemas.stats import Stats
+from database import get_async_db, get_db, run_sync
+from definitions import RollupPeriod
+from schemas.stats import Stats, StatsSummary, Rollup, Trends, TrainingLoad
+from utils.cache import stats_cache
 
 router = APIRouter(
     prefix="/api/stats",
@@ -14,8 +18,63 @@ router = APIRouter(
 )
 
 
+@router.get("/cache")
+async def get_cache_info():
+    return stats_cache.info()
+
+
+@router.get("/{user_id}/training-load", response_model=list[TrainingLoad])
+async def get_training_load(user_id: int, date_from: date | None = None, date_to: date | None = None,
+                            db: AsyncSession = Depends(get_async_db)) -> List[TrainingLoad]:
+    return await run_sync(db, crud.get_training_load, user_id=user_id, date_from=date_from, date_to=date_to,
+                          response_model=list[TrainingLoad])
+
+
+# The stats, summary and trends are assembled and validated in Python: these handlers are sync so they run in the
+# thread pool instead of blocking the event loop.
 @router.get("/{user_id}/{activity_type}", response_model=Stats)
 def get_stats(user_id: int, activity_type: str, db: Session = Depends(get_db)) -> Stats:
-    return crud.get_stats(db=db, user_id=user_id, activity_type=activity_type)
+    stats = stats_cache.get((user_id, activity_type))
+    if stats is None:
+        generation = stats_cache.generation(user_id)
+        stats = Stats.model_validate(crud.get_stats(db=db, user_id=user_id, activity_type=activity_type),
+                                     from_attributes=True)
+        stats_cache.set((user_id, activity_type), stats, generation)
+    return stats
+
+
+@router.get("/{user_id}/{activity_type}/summary", response_model=StatsSummary)
+def get_stats_summary(user_id: int, activity_type: str, db: Session = Depends(get_db)) -> StatsSummary:
+    stats = stats_cache.get((user_id, activity_type, "summary"))
+    if stats is None:
+        generation = stats_cache.generation(user_id)
+        stats = StatsSummary.model_validate(crud.get_stats_summary(db=db, user_id=user_id,
+                                                                   activity_type=activity_type))
+        stats_cache.set((user_id, activity_type, "summary"), stats, generation)
+    return stats
+
+
+@router.get("/{user_id}/{activity_type}/range", response_model=list[Rollup])
+async def get_rollups(user_id: int, activity_type: str, date_from: date, date_to: date,
+                      period: RollupPeriod = RollupPeriod.range,
+                      db: AsyncSession = Depends(get_async_db)) -> List[Rollup]:
+    return await run_sync(db, crud.get_rollups, user_id=user_id, activity_type=activity_type, date_from=date_from,
+                          date_to=date_to, period=period)
+
+
+@router.get("/{user_id}/{activity_type}/trends", response_model=Trends)
+def get_trends(user_id: int, activity_type: str, window: int = Query(default=5, ge=1),
+               db: Session = Depends(get_db)) -> Trends:
+    return crud.get_trends(db=db, user_id=user_id, activity_type=activity_type, window=window)
+
+
+@router.post("/retag")
+def retag_distances(db: Session = Depends(get_db)):
+    return crud.retag_distances(db=db)
 
 
+@router.post("/{user_id}/rebuild")
+def rebuild_rollups(user_id: int, db: Session = Depends(get_db)):
+    crud.rebuild_rollups(db=db, user_id=user_id)
+    crud.rebuild_training_load(db=db, user_id=user_id)
+    return crud.rebuild_best_efforts(db=db, user_id=user_id)
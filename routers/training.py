@@ -1,11 +1,12 @@
 from typing import List
 
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 import crud
 from schemas.activities import Activity, ActivityCreate
-from database import get_db
+from database import get_async_db, get_db, run_sync
 from schemas.events import Event, EventCreate
 from schemas.training import Training, TrainingBase
 
@@ -17,13 +18,13 @@ router = APIRouter(
 
 
 @router.get("/{user_id}/{type}", response_model=list[Training])
-def get_trainings(user_id: int, type: str, db: Session = Depends(get_db)) -> List[Training]:
-    return crud.get_trainings(db=db, type=type, user_id=user_id)
+async def get_trainings(user_id: int, type: str, db: AsyncSession = Depends(get_async_db)) -> List[Training]:
+    return await run_sync(db, crud.get_trainings, type=type, user_id=user_id, response_model=list[Training])
 
 
 @router.get("/{training_id}", response_model=Training)
-def get_training(training_id: int, db: Session = Depends(get_db)) -> Training:
-    training = crud.get_training(db=db, training_id=training_id)
+async def get_training(training_id: int, db: AsyncSession = Depends(get_async_db)) -> Training:
+    training = await run_sync(db, crud.get_training, training_id=training_id, response_model=Training)
     if training is None:
         raise HTTPException(status_code=404, detail="Training not found")
     return training
@@ -37,7 +38,7 @@ def create_training(
 
 @router.put("/{training_id}")
 def edit_training(training_id: int, training: TrainingBase,
-               db: Session = Depends(get_db)) -> Training:
+                  db: Session = Depends(get_db)) -> Training:
     return crud.edit_training(db=db, training_id=training_id, training=training)
 
 
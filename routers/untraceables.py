@@ -1,10 +1,11 @@
 from typing import List
 
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 import crud
-from database import get_db
+from database import get_async_db, get_db, run_sync
 from schemas.untraceables import Untraceable, UntraceableCreate, UntraceableUpdate, UntraceableBase
 
 router = APIRouter(
@@ -15,13 +16,14 @@ router = APIRouter(
 
 
 @router.get("/{user_id}", response_model=list[Untraceable])
-def get_untraceables(user_id: int, db: Session = Depends(get_db)) -> List[Untraceable]:
-    return crud.get_untraceables(db=db, user_id=user_id)
+async def get_untraceables(user_id: int, db: AsyncSession = Depends(get_async_db)) -> List[Untraceable]:
+    return await run_sync(db, crud.get_untraceables, user_id=user_id, response_model=list[Untraceable])
 
 
 @router.get("/untraceable/{untraceable_id}", response_model=Untraceable)
-def get_untraceable(untraceable_id: int, db: Session = Depends(get_db)) -> Untraceable:
-    untraceable = crud.get_untraceable(db=db, untraceable_id=untraceable_id)
+async def get_untraceable(untraceable_id: int, db: AsyncSession = Depends(get_async_db)) -> Untraceable:
+    untraceable = await run_sync(db, crud.get_untraceable, untraceable_id=untraceable_id,
+                                 response_model=Untraceable)
     if untraceable is None:
         raise HTTPException(status_code=404, detail="Untraceable activity not found")
     return untraceable
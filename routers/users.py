@@ -1,7 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 import crud
+from definitions import ExportFormat
 from schemas.users import User, UserCreate, UserUpdate
 from database import get_db
 
@@ -12,6 +14,7 @@ router = APIRouter(
 )
 
 
+# The user handlers are sync: loading and validating whole user graphs runs in the thread pool, not on the event loop.
 @router.get("/", response_model=list[User])
 def read_users(db: Session = Depends(get_db)):
     users = crud.get_users(db)
@@ -20,15 +23,26 @@ def read_users(db: Session = Depends(get_db)):
 
 @router.get("/{user_id}", response_model=User)
 def read_user(user_id: int, db: Session = Depends(get_db)):
-    db_user = crud.get_user(db, user_id=user_id)
+    db_user = crud.get_user(db=db, user_id=user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return db_user
 
 
+@router.get("/{user_id}/export")
+def export_user(user_id: int, format: ExportFormat = ExportFormat.ndjson, db: Session = Depends(get_db)):
+    # Stays on a sync session: the streamed batches are fetched lazily while the response is being sent.
+    media_type = "text/csv" if format == ExportFormat.csv else "application/x-ndjson"
+    return StreamingResponse(
+        crud.export_user(db=db, user_id=user_id, export_format=format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="homerun-{user_id}.{format.value}"'},
+    )
+
+
 @router.post("/", response_model=User)
 def create_user(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_user_name(db, user_name=user.user_name)
+    db_user = crud.get_user_by_user_name(db=db, user_name=user.user_name)
     if db_user:
         raise HTTPException(status_code=400, detail="User name already registered")
     return crud.create_user(db=db, user=user)
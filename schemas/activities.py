@@ -1,9 +1,9 @@
 from datetime import date
 from typing import Union, List
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator, model_validator
 
-from definitions import ActivityType, Terrain, Pool, TrainingTypeSwimming, TrainingTypeRunning, RaceType
-from schemas.results import Result, ResultBase
+from definitions import ActivityType, Terrain, Pool, TrainingTypeSwimming, TrainingTypeRunning, RaceType, TrackingType
+from schemas.results import Result, ResultBase, Split, decode_splits
 
 
 class ActivityBase(BaseModel):
@@ -55,10 +55,44 @@ class Activity(ActivityBase):
     month_id: int
     year_id: int
     results: List[Result]
-    distance_tag: str
+    splits: List[Split] = []
+    distance_tag: str | None = None
     event_id: int | None = None
     training_id: int | None = None
 
+    @field_validator("splits", mode="before")
+    @classmethod
+    def decode_stored_splits(cls, splits):
+        return decode_splits(splits) if splits is None or isinstance(splits, bytes) else splits
+
 
 class ActivityCreate(ActivityBase):
     results: List[ResultBase]
+    splits: List[Split] = []
+
+    @model_validator(mode="after")
+    def move_split_results(self):
+        """Results tracked as splits are stored as compact splits instead of result rows."""
+        split_results = [result for result in self.results if result.tracking_type == TrackingType.split]
+        if split_results:
+            self.results = [result for result in self.results if result.tracking_type != TrackingType.split]
+            self.splits = self.splits + [Split(distance=result.distance, time=result.time) for result in split_results]
+        return self
+
+
+class ActivityUpload(BaseModel):
+    name: str = "Uploaded activity"
+    type: ActivityType | None = None
+    description: Union[str, None] = Field(
+        default=None, title="The description of the activity", max_length=300
+    )
+    environment: Terrain | Pool | None = None
+    training_type: TrainingTypeRunning | TrainingTypeSwimming | None = None
+    race_type: RaceType | None = None
+    with_friends: bool = False
+
+
+class ActivityImport(BaseModel):
+    index: int
+    id: int | None = None
+    error: str | None = None
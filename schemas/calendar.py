@@ -0,0 +1,12 @@
+from datetime import date
+from typing import List
+
+from pydantic import BaseModel
+
+
+class CalendarDay(BaseModel):
+    date: date
+    activity_count: int = 0
+    total_distance: float = 0.0
+    total_time: int = 0
+    untraceable_ids: List[int] = []
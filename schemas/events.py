@@ -4,7 +4,7 @@ from pydantic import BaseModel, Field
 
 from definitions import ActivityType, Terrain, Pool, RaceType, DistanceTagRunning, DistanceTagSwimming
 from schemas.activities import Activity
-from schemas.results import Goal, GoalBase
+from schemas.results import Goal, GoalBase, Prediction
 
 
 class EventBase(BaseModel):
@@ -45,8 +45,10 @@ class Event(EventBase):
     user_id: int
     distance_tag: str
     goal: Goal | None = None
+    prediction: Prediction | None = None
     activity: Activity | None = None
 
 
 class EventCreate(EventBase):
+    distance: float = Field(gt=0)
     goal: GoalBase | None = None
@@ -0,0 +1,35 @@
+from typing import Any
+
+from pydantic import BaseModel, Field
+
+from definitions import JobKind, JobStatus
+
+
+class JobCreate(BaseModel):
+    kind: JobKind
+    user_id: int | None = None
+    payload: Any = None
+    max_attempts: int = Field(default=3, ge=1)
+
+    model_config = {
+        "json_schema_extra": {
+            "examples": [
+                {
+                    "kind": "rebuild",
+                    "user_id": 1,
+                }
+            ]
+        }
+    }
+
+
+class Job(JobCreate):
+    id: int
+    status: JobStatus
+    progress: float
+    attempts: int
+    result: Any = None
+    error: str | None = None
+    created_at: str
+    started_at: str | None = None
+    finished_at: str | None = None
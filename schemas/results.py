@@ -1,6 +1,12 @@
-from pydantic import BaseModel
+import struct
 
-from definitions import TrackingType, DistanceTagRunning, DistanceTagSwimming
+from pydantic import BaseModel, Field
+
+from definitions import TrackingType
+
+# One split per record: distance in meters and time in seconds.
+SPLIT_LAYOUT = struct.Struct("<II")
+SPLIT_MAX = 0xFFFFFFFF
 
 
 class GoalBase(BaseModel):
@@ -12,6 +18,12 @@ class Goal(GoalBase):
     speed: float
 
 
+class Prediction(BaseModel):
+    time: int
+    pace: int
+    goal_difference: int | None = None
+
+
 class ResultBase(BaseModel):
     distance: float
     time: int
@@ -22,4 +34,23 @@ class ResultBase(BaseModel):
 class Result(ResultBase):
     pace: int
     speed: float
-    distance_tag: DistanceTagRunning | DistanceTagSwimming | None = None
+    distance_tag: str | None = None
+
+
+class Split(BaseModel):
+    # Limited to what SPLIT_LAYOUT can pack; distances are stored in whole meters.
+    distance: float = Field(ge=0.001, le=SPLIT_MAX / 1000)
+    time: int = Field(gt=0, le=SPLIT_MAX)
+
+
+def encode_splits(splits: list[Split]) -> bytes | None:
+    """Pack splits into the binary column of an activity, so any number of splits is stored in a single row."""
+    if not splits:
+        return None
+    return b"".join(SPLIT_LAYOUT.pack(round(split.distance * 1000), split.time) for split in splits)
+
+
+def decode_splits(data: bytes | None) -> list[Split]:
+    if not data:
+        return []
+    return [Split(distance=meters / 1000, time=time) for meters, time in SPLIT_LAYOUT.iter_unpack(data)]
@@ -1,3 +1,4 @@
+from datetime import date
 from typing import List
 
 from pydantic import BaseModel
@@ -5,11 +6,19 @@ from pydantic import BaseModel
 from schemas.activities import Activity, ActivityType
 
 
-class Grouped(BaseModel):
+class GroupedBase(BaseModel):
     activity_type: ActivityType
-    activities: List[Activity]
     total_distance: float
     total_time: int
+    activity_count: int
+
+
+class Grouped(GroupedBase):
+    activities: List[Activity]
+
+
+class GroupedSummary(GroupedBase):
+    activity_ids: List[int]
 
 
 class Monthly(Grouped):
@@ -20,7 +29,55 @@ class Yearly(Grouped):
     year: str
 
 
+class MonthlySummary(GroupedSummary):
+    month: str
+
+
+class YearlySummary(GroupedSummary):
+    year: str
+
+
+class Rollup(BaseModel):
+    period: str
+    total_distance: float
+    total_time: int
+    activity_count: int
+
+
+class Volume(BaseModel):
+    dates: List[date]
+    volume_7d: List[float]
+    volume_28d: List[float]
+
+
+class PaceSeries(BaseModel):
+    dates: List[date]
+    pace: List[float]
+    speed: List[float]
+    moving_average_pace: List[float]
+    trend: float | None = None
+
+
+class Trends(BaseModel):
+    volume: Volume
+    paces: dict[str, PaceSeries]
+
+
+class TrainingLoad(BaseModel):
+    date: date
+    load: float
+    acute: float
+    chronic: float
+    balance: float
+
+
 class Stats(BaseModel):
     monthly: List[Monthly]
     yearly: List[Yearly]
     best_efforts: dict[str, List[Activity]]
+
+
+class StatsSummary(BaseModel):
+    monthly: List[MonthlySummary]
+    yearly: List[YearlySummary]
+    best_efforts: dict[str, List[int]]
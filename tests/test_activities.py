@@ -1,37 +1,48 @@
+import asyncio
+import struct
+from io import BytesIO
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from sqlmodel import Session, SQLModel, select
-from sqlmodel.pool import StaticPool
 
+import crud
 from main import app
-from database import Base, get_db
-from models import User, Activity
-from tests.utils import get_activity_json, create_activity
+from database import Base, get_db, get_async_db
+from models import User, Activity, Result
+from tests.utils import get_activity_json, get_result_json, create_activity, create_event
 
 USER_URL = "/api/users"
 ACTIVITY_URL = "/api/activities"
-SQLALCHEMY_DATABASE_URL = "sqlite://"
 
 
 @pytest.fixture(name="session")
-def session_fixture():
+def session_fixture(tmp_path):
     engine = create_engine(
-        SQLALCHEMY_DATABASE_URL,
+        f"sqlite:///{tmp_path / 'homerun.db'}",
         connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
     )
 
     Base.metadata.create_all(bind=engine)
     SQLModel.metadata.create_all(engine)
     with Session(engine) as session:
         yield session
+    engine.dispose()
+
+
+@pytest.fixture(name="async_engine")
+def async_engine_fixture(session: Session):
+    return create_async_engine(session.get_bind().url.set(drivername="sqlite+aiosqlite"), poolclass=NullPool)
 
 
 @pytest.fixture(name="client")
-def client_fixture(session: Session):
-    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=session.get_bind())
+def client_fixture(session: Session, async_engine: AsyncEngine):
+    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False,
+                                       bind=session.get_bind())
 
     def override_get_db():
         try:
@@ -40,7 +51,14 @@ def client_fixture(session: Session):
         finally:
             db.close()
 
+    TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
+
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
     client = TestClient(app)
     yield client
     app.dependency_overrides.clear()
@@ -141,3 +159,341 @@ def test_remove_activity(session: Session, client: TestClient):
     assert len(user_data[0].activities) == 2
     assert user_data[0].activities[0].name == "activity 1"
     assert user_data[0].activities[1].name == "activity 3"
+
+
+def test_import_activities(session: Session, client: TestClient):
+    user = User(user_name="user", hashed_password="123456")
+    session.add(user)
+    session.commit()
+
+    activity_without_results = get_activity_json(2, "activity 2")
+    activity_without_results["results"] = []
+    response = client.post(
+        ACTIVITY_URL + "/1/bulk",
+        json=[
+            get_activity_json(1, "activity 1", date="2023-11-22"),
+            activity_without_results,
+            get_activity_json(2, "activity 3", date="2023-12-22"),
+            get_activity_json(3, "activity 4", date="2024-01-22"),
+        ],
+    )
+    data = response.json()
+    activities = session.exec(select(Activity)).all()
+    stats = client.get("/api/stats/1/running/summary").json()
+
+    assert response.status_code == 200
+    assert data == [
+        {'index': 0, 'id': 1, 'error': None},
+        {'index': 1, 'id': None, 'error': "Activity has no results"},
+        {'index': 2, 'id': 2, 'error': None},
+        {'index': 3, 'id': 3, 'error': None},
+    ]
+    assert [activity.name for activity in activities] == ["activity 1", "activity 3", "activity 4"]
+    assert [(monthly["month"], monthly["activity_count"]) for monthly in stats["monthly"]] == \
+           [("2023-11", 1), ("2023-12", 1), ("2024-1", 1)]
+    assert [(yearly["year"], yearly["total_distance"]) for yearly in stats["yearly"]] == \
+           [("2023", 20.0), ("2024", 10.0)]
+    assert stats["best_efforts"]["10k"] == [1, 2, 3]
+
+
+def test_import_activities_validates_each_item(session: Session, client: TestClient):
+    session.add(User(user_name="user", hashed_password="123456"))
+    session.commit()
+
+    response = client.post(ACTIVITY_URL + "/1/bulk", json=[
+        {**get_activity_json(1, "activity 1"), "date": "2023-13-01"},
+        get_activity_json(1, "activity 2"),
+        {**get_activity_json(1, "activity 3"), "type": "cycling"},
+        "activity 4",
+    ])
+    data = response.json()
+
+    assert response.status_code == 200
+    assert [item["id"] for item in data] == [None, 1, None, None]
+    assert data[0]["error"].startswith("date: ")
+    assert data[2]["error"].startswith("type: ")
+    assert data[3]["error"].startswith("activity: ")
+    assert [activity.name for activity in session.exec(select(Activity)).all()] == ["activity 2"]
+
+
+def test_create_activity_single_commit(session: Session, client: TestClient):
+    user = User(user_name="user", hashed_password="123456")
+    session.add(user)
+    session.commit()
+    commits, statements = [], []
+    event.listen(session.get_bind(), "commit", lambda connection: commits.append(len(statements)))
+    event.listen(session.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    response = client.post(ACTIVITY_URL + "/1", json=get_activity_json(1, "activity 1"))
+
+    assert response.status_code == 200
+    assert response.json() == get_activity_json(1, "activity 1")
+    assert len(commits) == 1
+    assert commits[0] == len(statements)
+
+
+def test_edit_activity_in_place(session: Session, client: TestClient):
+    user = User(user_name="user", hashed_password="123456")
+    event_1 = create_event("event 1")
+    session.add(user)
+    session.add(event_1)
+    session.commit()
+
+    client.post(ACTIVITY_URL + "/1", params={"event_id": 1}, json=get_activity_json(1, "activity 1"))
+    activity = get_activity_json(1, "activity edited", date="2023-12-01")
+    activity["results"][0]["time"] = 2900
+    activity["results"].append({"distance": 10.0, "time": 2950, "tracking_type": "official"})
+    response = client.put(ACTIVITY_URL + "/1", json=activity)
+    data = response.json()
+    results = session.exec(select(Result).order_by(Result.id)).all()
+    stats = client.get("/api/stats/1/running/summary").json()
+
+    assert response.status_code == 200
+    assert data["id"] == 1
+    assert data["event_id"] == 1
+    assert data["date"] == "2023-12-01"
+    assert [result["time"] for result in data["results"]] == [2900, 2950]
+    assert [(result.id, result.time) for result in results] == [(1, 2900), (2, 2950)]
+    assert [(monthly["month"], monthly["activity_count"]) for monthly in stats["monthly"]] == \
+           [("2023-11", 0), ("2023-12", 1)]
+    assert stats["yearly"][0]["total_time"] == 2900
+    assert stats["best_efforts"]["10k"] == [1]
+
+
+def test_edit_activity_description_only(session: Session, client: TestClient):
+    user = User(user_name="user", hashed_password="123456")
+    session.add(user)
+    session.commit()
+    client.post(ACTIVITY_URL + "/1", json=get_activity_json(1, "activity 1", date="2021-01-04"))
+    client.post(ACTIVITY_URL + "/1", json=get_activity_json(2, "activity 2", date="2023-11-22"))
+    statements = []
+    event.listen(session.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    activity = get_activity_json(1, "activity 1", date="2021-01-04")
+    activity["description"] = "edited"
+    response = client.put(ACTIVITY_URL + "/1", json=activity)
+    stats = client.get("/api/stats/1/running/summary").json()
+
+    assert response.status_code == 200
+    assert response.json()["description"] == "edited"
+    writes = [statement for statement in statements if not statement.startswith("SELECT")]
+    assert [statement.split()[1] for statement in writes] == ["activities"]
+    assert [yearly["total_time"] for yearly in stats["yearly"]] == [3000, 3000]
+    assert stats["best_efforts"]["10k"] == [1, 2]
+
+
+def test_edit_activity_not_found(session: Session, client: TestClient):
+    response = client.put(ACTIVITY_URL + "/1", json=get_activity_json(1, "activity edited"))
+
+    assert response.status_code == 404
+
+
+def test_create_activity_with_splits(session: Session, client: TestClient):
+    user = User(user_name="user", hashed_password="123456")
+    session.add(user)
+    session.commit()
+
+    activity = get_activity_json(1, "activity 1")
+    activity["results"].append({"distance": 5.0, "time": 1450, "tracking_type": "split"})
+    activity["splits"] = [{"distance": 5.0, "time": 1550}]
+    response = client.post(ACTIVITY_URL + "/1", json=activity)
+    data = response.json()
+    results = session.exec(select(Result)).all()
+
+    assert response.status_code == 200
+    assert data["results"] == get_activity_json(1)["results"]
+    assert data["splits"] == [{"distance": 5.0, "time": 1550}, {"distance": 5.0, "time": 1450}]
+    assert len(results) == 1
+    assert client.get(ACTIVITY_URL + "/1").json()["splits"] == data["splits"]
+
+
+def get_track_tcx(points):
+    trackpoints = "".join(
+        f"<Trackpoint><Time>2023-11-22T08:{minute:02d}:00Z</Time>"
+        f"<DistanceMeters>{meters}</DistanceMeters></Trackpoint>"
+        for minute, meters in points
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<TrainingCenterDatabase xmlns="http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2">'
+        f'<Activities><Activity Sport="Running"><Lap><Track>{trackpoints}</Track></Lap></Activity></Activities>'
+        '</TrainingCenterDatabase>'
+    )
+
+
+def test_upload_activity(session: Session, client: TestClient):
+    user = User(user_name="user", hashed_password="123456")
+    session.add(user)
+    session.commit()
+
+    # 5.1 km in 26 moving minutes, with a 3 minute stop after the first kilometer
+    track = get_track_tcx([(0, 0), (5, 1000), (8, 1000), (13, 2000), (28, 5000), (29, 5100)])
+    response = client.post(
+        ACTIVITY_URL + "/1/upload",
+        params={"name": "morning run", "training_type": "base"},
+        files={"file": ("run.tcx", track, "application/xml")},
+    )
+    data = response.json()
+
+    assert response.status_code == 200
+    assert data["name"] == "morning run"
+    assert data["date"] == "2023-11-22"
+    assert data["environment"] == "road"
+    assert [(result["tracking_type"], result["distance"], result["time"]) for result in data["results"]] == [
+        ("personal", 5.1, 1560),
+    ]
+    assert data["splits"] == [
+        {"distance": 1.0, "time": 300},
+        {"distance": 1.0, "time": 300},
+        {"distance": 1.0, "time": 300},
+        {"distance": 1.0, "time": 300},
+        {"distance": 1.0, "time": 300},
+        {"distance": 0.1, "time": 60},
+    ]
+    assert data["distance_tag"] == "5k"
+
+
+def test_heavy_reads_run_in_worker_thread(session: Session, client: TestClient, monkeypatch):
+    session.add(User(user_name="user", hashed_password="123456"))
+    session.commit()
+    client.post(ACTIVITY_URL + "/1", json=get_activity_json(1, "activity 1"))
+    threads = []
+
+    def record_thread(function):
+        def call(*args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+                threads.append("event loop")
+            except RuntimeError:
+                threads.append("worker thread")
+            return function(*args, **kwargs)
+        return call
+
+    for name in ("get_activities", "get_user", "get_users"):
+        monkeypatch.setattr(crud, name, record_thread(getattr(crud, name)))
+    responses = [client.get(ACTIVITY_URL + "/1/running"), client.get("/api/users/1"), client.get("/api/users/")]
+
+    assert [response.status_code for response in responses] == [200, 200, 200]
+    assert responses[0].json() == [get_activity_json(1, "activity 1")]
+    assert threads == ["worker thread"] * 3
+
+
+def test_upload_activity_parses_in_worker_thread(session: Session, client: TestClient, monkeypatch):
+    user = User(user_name="user", hashed_password="123456")
+    session.add(user)
+    session.commit()
+    parsed = []
+    iter_track_points = crud.iter_track_points
+
+    def record_parse(file):
+        try:
+            asyncio.get_running_loop()
+            parsed.append(("event loop", file))
+        except RuntimeError:
+            parsed.append(("worker thread", file))
+        return iter_track_points(file)
+
+    monkeypatch.setattr(crud, "iter_track_points", record_parse)
+    track = get_track_tcx([(0, 0), (5, 1000), (10, 2000), (25, 5000)])
+    response = client.post(ACTIVITY_URL + "/1/upload", files={"file": ("run.tcx", track, "application/xml")})
+
+    assert response.status_code == 200
+    assert [thread for thread, _ in parsed] == ["worker thread"]
+    assert not isinstance(parsed[0][1], BytesIO)
+
+
+def test_upload_activity_mixed_time_zones(session: Session, client: TestClient):
+    user = User(user_name="user", hashed_password="123456")
+    session.add(user)
+    session.commit()
+
+    track = get_track_tcx([(0, 0), (5, 1000), (10, 2000), (25, 5000)]).replace("08:05:00Z", "08:05:00") \
+        .replace("08:10:00Z", "10:10:00+02:00")
+    response = client.post(ACTIVITY_URL + "/1/upload", files={"file": ("run.tcx", track, "application/xml")})
+
+    assert response.status_code == 200
+    assert [(result["distance"], result["time"]) for result in response.json()["results"]] == [(5.0, 1500)]
+
+
+def test_upload_activity_invalid_file(session: Session, client: TestClient):
+    response = client.post(ACTIVITY_URL + "/1/upload", files={"file": ("run.gpx", "<gpx>", "application/xml")})
+
+    assert response.status_code == 400
+
+
+def get_swim_fit():
+    def definition(local_type, message, fields):
+        return struct.pack("<BBBHB", 0x40 | local_type, 0, 0, message, len(fields)) + \
+            b"".join(struct.pack("<BBB", *field) for field in fields)
+
+    records = [
+        # session: start_time, sport, total_timer_time (ms), total_distance (cm), pool_length (cm), unread uint8
+        definition(0, 18, [(2, 4, 0x86), (5, 1, 0x00), (8, 4, 0x86), (9, 4, 0x86), (44, 2, 0x84), (7, 1, 0x02)]),
+        # lap: timestamp, total_timer_time, total_distance
+        definition(1, 19, [(253, 4, 0x86), (8, 4, 0x86), (9, 4, 0x86)]),
+        # length: timestamp, length_type
+        definition(2, 101, [(253, 4, 0x86), (12, 1, 0x00)]),
+        struct.pack("<BIB", 2, 1_070_000_030, 1),
+        struct.pack("<BIB", 0x80 | (2 << 5) | 0x1F, 0xFFFFFFFF, 0),  # idle length with a compressed timestamp
+        struct.pack("<BIII", 1, 1_070_000_600, 580_000, 50_000),
+        struct.pack("<BIII", 1, 1_070_001_200, 620_000, 50_000),
+        struct.pack("<BIBIIHB", 0, 1_070_000_000, 5, 1_200_000, 100_000, 2_500, 0),
+    ]
+    data = b"".join(records)
+    return struct.pack("<BBHI4sH", 14, 0x10, 2132, len(data), b".FIT", 0) + data + b"\x00\x00"
+
+
+def test_upload_activity_fit(session: Session, client: TestClient):
+    user = User(user_name="user", hashed_password="123456")
+    session.add(user)
+    session.commit()
+
+    response = client.post(ACTIVITY_URL + "/1/upload", files={"file": ("swim.fit", get_swim_fit())})
+    data = response.json()
+
+    assert response.status_code == 200
+    assert data["type"] == "swimming"
+    assert data["environment"] == "25m"
+    assert data["date"] == "2023-11-27"
+    assert data["distance_tag"] == "1000"
+    assert [(result["tracking_type"], result["distance"], result["time"]) for result in data["results"]] == [
+        ("personal", 1.0, 1200),
+    ]
+    assert data["splits"] == [{"distance": 0.5, "time": 580}, {"distance": 0.5, "time": 620}]
+
+
+def test_split_only_activity_rejected_on_every_path(session: Session, client: TestClient):
+    user = User(user_name="user", hashed_password="123456")
+    session.add(user)
+    session.commit()
+    client.post(ACTIVITY_URL + "/1", json=get_activity_json(1, "activity 1"))
+    split_only = get_activity_json(2, "activity 2")
+    split_only["results"] = [{**get_result_json("split"), "distance": 1.0, "time": 300}]
+
+    created = client.post(ACTIVITY_URL + "/1", json=split_only)
+    edited = client.put(ACTIVITY_URL + "/1", json=split_only)
+    imported = client.post(ACTIVITY_URL + "/1/bulk", json=[split_only])
+
+    assert created.status_code == 422
+    assert created.json() == {"detail": "Activity has no results"}
+    assert edited.status_code == 422
+    assert imported.json() == [{'index': 0, 'id': None, 'error': "Activity has no results"}]
+    assert [activity.name for activity in session.exec(select(Activity)).all()] == ["activity 1"]
+
+
+def test_create_activity_with_invalid_splits(session: Session, client: TestClient):
+    user = User(user_name="user", hashed_password="123456")
+    session.add(user)
+    session.commit()
+
+    negative = client.post(ACTIVITY_URL + "/1", json={**get_activity_json(1, "activity 1"),
+                                                      "splits": [{"distance": 1.0, "time": -300}]})
+    too_long = client.post(ACTIVITY_URL + "/1", json={**get_activity_json(1, "activity 1"),
+                                                      "splits": [{"distance": 5_000_000.0, "time": 300}]})
+    split_result = get_activity_json(1, "activity 1")
+    split_result["results"].append({**get_result_json("split"), "time": 2 ** 32})
+
+    assert negative.status_code == 422
+    assert too_long.status_code == 422
+    assert client.post(ACTIVITY_URL + "/1", json=split_result).status_code == 422
+    assert session.exec(select(Activity)).all() == []
@@ -0,0 +1,90 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from sqlmodel import Session, SQLModel
+
+from database import Base, get_db, get_async_db
+from main import app
+from models import User
+from tests.utils import create_untraceable, get_activity_json
+
+CALENDAR_URL = "/api/calendar"
+ACTIVITY_URL = "/api/activities"
+
+
+@pytest.fixture(name="session")
+def session_fixture(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'homerun.db'}",
+        connect_args={"check_same_thread": False},
+    )
+
+    Base.metadata.create_all(bind=engine)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+@pytest.fixture(name="async_engine")
+def async_engine_fixture(session: Session):
+    return create_async_engine(session.get_bind().url.set(drivername="sqlite+aiosqlite"), poolclass=NullPool)
+
+
+@pytest.fixture(name="client")
+def client_fixture(session: Session, async_engine: AsyncEngine):
+    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=session.get_bind())
+
+    def override_get_db():
+        try:
+            db = TestingSessionLocal()
+            yield db
+        finally:
+            db.close()
+
+    TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    client = TestClient(app)
+    yield client
+    app.dependency_overrides.clear()
+
+
+def test_get_calendar(session: Session, client: TestClient):
+    user = User(user_name="user", hashed_password="123456")
+    untraceable_1 = create_untraceable("untraceable 1")
+    untraceable_2 = create_untraceable("untraceable 2")
+    untraceable_2.dates = ["2023-11-23", "2023-11-30"]
+    session.add(user)
+    session.add(untraceable_1)
+    session.add(untraceable_2)
+    session.commit()
+
+    client.post(ACTIVITY_URL + "/1", json=get_activity_json(1, "activity 1", "personal", "2023-11-21"))
+    client.post(ACTIVITY_URL + "/1", json=get_activity_json(2, "activity 2", "personal", "2023-11-23"))
+    client.post(ACTIVITY_URL + "/1", json=get_activity_json(3, "activity 3", "personal", "2023-11-23"))
+    response = client.get(CALENDAR_URL + "/1", params={"date_from": "2023-11-21", "date_to": "2023-11-30"})
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {'date': '2023-11-21', 'activity_count': 1, 'total_distance': 10.0, 'total_time': 3000,
+         'untraceable_ids': []},
+        {'date': '2023-11-22', 'activity_count': 0, 'total_distance': 0.0, 'total_time': 0,
+         'untraceable_ids': [1]},
+        {'date': '2023-11-23', 'activity_count': 2, 'total_distance': 20.0, 'total_time': 6000,
+         'untraceable_ids': [1, 2]},
+    ]
+
+
+def test_get_calendar_invalid_range(session: Session, client: TestClient):
+    response = client.get(CALENDAR_URL + "/1", params={"date_from": "2023-11-30", "date_to": "2023-11-21"})
+
+    assert response.status_code == 400
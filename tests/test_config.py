@@ -0,0 +1,144 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from sqlmodel import Session, SQLModel
+
+import database
+from main import app
+from database import Base, get_db, get_async_db
+from utils.storage import StorageProfile, apply_read_only, apply_storage_profile, CheckpointPolicy
+
+CONFIG_URL = "/api/config"
+USER_URL = "/api/users"
+TEST_PROFILE = StorageProfile(synchronous="FULL", busy_timeout=1000)
+
+
+@pytest.fixture(name="session")
+def session_fixture(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'homerun.db'}",
+        connect_args={"check_same_thread": False},
+    )
+    apply_storage_profile(engine, TEST_PROFILE)
+
+    Base.metadata.create_all(bind=engine)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+@pytest.fixture(name="async_engine")
+def async_engine_fixture(session: Session):
+    engine = create_async_engine(session.get_bind().url.set(drivername="sqlite+aiosqlite"), poolclass=NullPool)
+    apply_storage_profile(engine.sync_engine, TEST_PROFILE)
+    return engine
+
+
+@pytest.fixture(name="client")
+def client_fixture(session: Session, async_engine: AsyncEngine):
+    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=session.get_bind())
+
+    def override_get_db():
+        try:
+            db = TestingSessionLocal()
+            yield db
+        finally:
+            db.close()
+
+    TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    client = TestClient(app)
+    yield client
+    app.dependency_overrides.clear()
+
+
+def test_get_storage(session: Session, client: TestClient):
+    response = client.get(CONFIG_URL + "/storage")
+    data = response.json()
+
+    assert response.status_code == 200
+    assert data["pragmas"] == {
+        "journal_mode": "wal",
+        "synchronous": 2,
+        "cache_size": -64000,
+        "mmap_size": 268435456,
+        "busy_timeout": 1000,
+        "temp_store": 2,
+        "wal_autocheckpoint": 1000,
+    }
+    assert data["wal_size"] > 0
+
+
+def test_checkpoint(session: Session, client: TestClient):
+    response = client.post(CONFIG_URL + "/storage/checkpoint", params={"mode": "truncate"})
+    invalid = client.post(CONFIG_URL + "/storage/checkpoint", params={"mode": "everything"})
+
+    assert response.status_code == 200
+    assert response.json()["mode"] == "TRUNCATE"
+    assert response.json()["busy"] is False
+    assert client.get(CONFIG_URL + "/storage").json()["wal_size"] == 0
+    assert invalid.status_code == 400
+
+
+def test_checkpoint_policy_truncates_large_wal(session: Session):
+    policy = CheckpointPolicy(session.get_bind(), StorageProfile(wal_size_limit=0))
+
+    assert policy.run_once()["mode"] == "TRUNCATE"
+    assert policy.run_once()["mode"] == "PASSIVE"
+
+
+def test_storage_profile_from_env():
+    profile = StorageProfile.from_env({"HOMERUN_SQLITE_SYNCHRONOUS": "OFF", "HOMERUN_SQLITE_CACHE_SIZE": "-2000"})
+
+    assert profile.synchronous == "OFF"
+    assert profile.cache_size == -2000
+    with pytest.raises(ValueError):
+        StorageProfile(journal_mode="WAL; DROP TABLE users")
+
+
+def test_read_only_engine_rejects_writes(session: Session):
+    read_engine = create_engine(session.get_bind().url)
+    apply_read_only(read_engine)
+
+    with read_engine.connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM users")).scalar() == 0
+        with pytest.raises(OperationalError, match="readonly"):
+            connection.execute(text("INSERT INTO users (user_name, hashed_password) VALUES ('user 1', '123456')"))
+    read_engine.dispose()
+
+
+def test_reads_and_writes_use_separate_engines(session: Session, client: TestClient, async_engine: AsyncEngine,
+                                               monkeypatch):
+    write_engine = session.get_bind()
+    read_engine = create_async_engine(async_engine.url, poolclass=NullPool)
+    apply_read_only(read_engine.sync_engine)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(autoflush=False, bind=write_engine))
+    monkeypatch.setattr(database, "AsyncReadSessionLocal", async_sessionmaker(read_engine, expire_on_commit=False))
+    app.dependency_overrides.pop(get_db)
+    app.dependency_overrides.pop(get_async_db)
+    reads, writes = [], []
+    event.listen(read_engine.sync_engine, "before_cursor_execute", lambda *args: reads.append(args[2]))
+    event.listen(write_engine, "before_cursor_execute", lambda *args: writes.append(args[2]))
+
+    created = client.post(USER_URL + "/", json={"user_name": "user 1", "password": "123456"})
+    reads_after_create, writes_after_create = len(reads), len(writes)
+    response = client.get("/api/untraceables/1")
+
+    assert created.status_code == 200
+    assert response.status_code == 200
+    assert response.json() == []
+    assert reads_after_create == 0
+    assert any(statement.startswith("INSERT INTO users") for statement in writes)
+    assert len(reads) > 0
+    assert len(writes) == writes_after_create
@@ -1,36 +1,44 @@
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlmodel.pool import StaticPool
+from sqlalchemy.pool import NullPool
 from sqlmodel import Session, SQLModel, select
 
-from database import Base, get_db
+from database import Base, get_db, get_async_db
 from main import app
 from models import User, Event
-from tests.utils import create_activity, create_event, get_event_json
+from tests.utils import create_activity, create_event, get_event_json, get_activity_json
+from utils.cache import prediction_cache
 
 EVENTS_URL = "/api/events"
-SQLALCHEMY_DATABASE_URL = "sqlite://"
+ACTIVITY_URL = "/api/activities"
 
 
 @pytest.fixture(name="session")
-def session_fixture():
+def session_fixture(tmp_path):
     engine = create_engine(
-        SQLALCHEMY_DATABASE_URL,
+        f"sqlite:///{tmp_path / 'homerun.db'}",
         connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
     )
 
     Base.metadata.create_all(bind=engine)
     SQLModel.metadata.create_all(engine)
     with Session(engine) as session:
         yield session
+    engine.dispose()
+
+
+@pytest.fixture(name="async_engine")
+def async_engine_fixture(session: Session):
+    return create_async_engine(session.get_bind().url.set(drivername="sqlite+aiosqlite"), poolclass=NullPool)
 
 
 @pytest.fixture(name="client")
-def client_fixture(session: Session):
-    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=session.get_bind())
+def client_fixture(session: Session, async_engine: AsyncEngine):
+    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False,
+                                       bind=session.get_bind())
 
     def override_get_db():
         try:
@@ -39,7 +47,15 @@ def client_fixture(session: Session):
         finally:
             db.close()
 
+    TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
+
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    prediction_cache.clear()
     client = TestClient(app)
     yield client
     app.dependency_overrides.clear()
@@ -149,3 +165,101 @@ def test_remove_event(session: Session, client: TestClient):
     assert len(user_data[0].events) == 2
     assert user_data[0].events[0].name == "event 1"
     assert user_data[0].events[1].name == "event 3"
+
+
+def test_get_events_with_prediction(session: Session, client: TestClient):
+    user = User(user_name="user", hashed_password="123456")
+    session.add(user)
+    session.commit()
+
+    for distance, time in [(5.0, 1500), (10.0, 3150)]:
+        activity = get_activity_json(1, "activity", "official", "2023-11-22")
+        activity["results"][0].update(distance=distance, time=time)
+        client.post(ACTIVITY_URL + "/1", json=activity)
+    event = get_event_json(1, "event 1", with_activity=False)
+    client.post(EVENTS_URL + "/1", json={**event, "date": "2099-07-23", "distance": 21.1, "goal": {"time": 6600}})
+    client.post(EVENTS_URL + "/1", json=event)
+    response = client.get(EVENTS_URL + "/1/running")
+    response_event = client.get(EVENTS_URL + "/1")
+    data = response.json()
+
+    assert response.status_code == 200
+    assert 6900 < data[0]["prediction"]["time"] < 7100
+    assert data[0]["prediction"]["pace"] == round(data[0]["prediction"]["time"] / 21.1)
+    assert data[0]["prediction"]["goal_difference"] == data[0]["prediction"]["time"] - 6600
+    assert data[1]["prediction"] is None
+    assert response_event.json()["prediction"] == data[0]["prediction"]
+    assert prediction_cache.info()["misses"] == 1
+
+
+def test_prediction_read_before_invalidate_is_not_cached(session: Session, client: TestClient):
+    session.add(User(user_name="user", hashed_password="123456"))
+    session.commit()
+    client.post(ACTIVITY_URL + "/1", json=get_activity_json(1, "activity", "official", "2023-11-22"))
+    client.post(EVENTS_URL + "/1", json={**get_event_json(1, "event 1", with_activity=False), "date": "2099-07-23"})
+    prediction_cache.clear()
+
+    def invalidate_during_fit(connection, cursor, statement, *args):
+        if "best_efforts" in statement:
+            prediction_cache.invalidate(1)
+
+    event.listen(session.get_bind(), "before_cursor_execute", invalidate_during_fit)
+    response = client.get(EVENTS_URL + "/1/running")
+    event.remove(session.get_bind(), "before_cursor_execute", invalidate_during_fit)
+
+    assert response.json()[0]["prediction"] is not None
+    assert prediction_cache.get((1, "running")) is None
+
+
+def test_events_without_distance_get_no_prediction(session: Session, client: TestClient):
+    session.add(User(user_name="user", hashed_password="123456"))
+    session.commit()
+    client.post(ACTIVITY_URL + "/1", json=get_activity_json(1, "activity", "official", "2023-11-22"))
+    for distance in (0.0, -5.0):
+        db_event = create_event(f"event {distance}")
+        db_event.date, db_event.distance = "2099-07-23", distance
+        session.add(db_event)
+    session.commit()
+
+    created = client.post(EVENTS_URL + "/1", json={**get_event_json(1, "event 1", with_activity=False),
+                                                   "distance": 0})
+    response = client.get(EVENTS_URL + "/1/running")
+
+    assert created.status_code == 422
+    assert response.status_code == 200
+    assert [event["prediction"] for event in response.json()] == [None, None]
+
+
+def test_create_event_single_commit(session: Session, client: TestClient):
+    user = User(user_name="user", hashed_password="123456")
+    session.add(user)
+    session.commit()
+    commits, statements = [], []
+    event.listen(session.get_bind(), "commit", lambda connection: commits.append(len(statements)))
+    event.listen(session.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    response = client.post(EVENTS_URL + "/1", json={**get_event_json(1, "event 1"), "goal": {"time": 3000}})
+
+    assert response.status_code == 200
+    assert response.json()["goal"] == {"time": 3000, "pace": 300, "speed": 12.0}
+    assert len(commits) == 1
+    assert commits[0] == len(statements)
+
+
+def test_edit_event_keeps_activity(session: Session, client: TestClient):
+    user = User(user_name="user", hashed_password="123456")
+    event_1 = create_event("event 1")
+    activity_1 = create_activity()
+    activity_1.event_id = 1
+    session.add(user)
+    session.add(event_1)
+    session.add(activity_1)
+    session.commit()
+
+    response = client.put(EVENTS_URL + "/1", json={**get_event_json(1, "event edited"), "goal": {"time": 2900}})
+    response_without_goal = client.put(EVENTS_URL + "/1", json=get_event_json(1, "event edited"))
+
+    assert response.status_code == 200
+    assert response.json() == {**get_event_json(1, "event edited"),
+                               "goal": {"time": 2900, "pace": 290, "speed": 10.0 * 3600 / 2900}}
+    assert response_without_goal.json() == get_event_json(1, "event edited")
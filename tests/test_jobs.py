@@ -0,0 +1,166 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from sqlmodel import Session, SQLModel, select
+
+from main import app
+from database import Base, get_db, get_async_db
+from models import User, Monthly
+from tests.utils import get_activity_json
+from utils.jobs import JobRunner, get_job_runner, JOB_HANDLERS
+from definitions import JobKind
+
+JOB_URL = "/api/jobs"
+
+
+@pytest.fixture(name="session")
+def session_fixture(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'homerun.db'}",
+        connect_args={"check_same_thread": False},
+    )
+
+    Base.metadata.create_all(bind=engine)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+@pytest.fixture(name="async_engine")
+def async_engine_fixture(session: Session):
+    return create_async_engine(session.get_bind().url.set(drivername="sqlite+aiosqlite"), poolclass=NullPool)
+
+
+@pytest.fixture(name="runner")
+def runner_fixture(session: Session):
+    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False,
+                                       bind=session.get_bind())
+    runner = JobRunner(session_factory=TestingSessionLocal, max_workers=1, retry_delay=0)
+    runner.start()
+    yield runner
+    runner.shutdown()
+
+
+@pytest.fixture(name="client")
+def client_fixture(session: Session, async_engine: AsyncEngine, runner: JobRunner):
+    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=session.get_bind())
+
+    def override_get_db():
+        try:
+            db = TestingSessionLocal()
+            yield db
+        finally:
+            db.close()
+
+    TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_job_runner] = lambda: runner
+    client = TestClient(app)
+    yield client
+    app.dependency_overrides.clear()
+
+
+def test_rebuild_job(session: Session, client: TestClient, runner: JobRunner):
+    user_1 = User(user_name="user 1", hashed_password="123456")
+    session.add(user_1)
+    session.commit()
+    client.post("/api/activities/1", json=get_activity_json(1, "activity 1"))
+    session.exec(select(Monthly)).one().total_distance = 0.0
+    session.commit()
+
+    response = client.post(JOB_URL + "/", json={"kind": "rebuild", "user_id": 1})
+    assert runner.join(timeout=5)
+    job = client.get(JOB_URL + f"/{response.json()['id']}").json()
+    session.expire_all()
+
+    assert response.status_code == 202
+    assert response.json()["status"] == "queued"
+    assert job["status"] == "succeeded"
+    assert job["progress"] == 1.0
+    assert job["attempts"] == 1
+    assert job["result"] == {"ok": True}
+    assert session.exec(select(Monthly)).one().total_distance == 10.0
+
+
+def test_import_job(session: Session, client: TestClient, runner: JobRunner):
+    user_1 = User(user_name="user 1", hashed_password="123456")
+    session.add(user_1)
+    session.commit()
+
+    response = client.post(JOB_URL + "/", json={"kind": "import", "user_id": 1, "payload": [
+        get_activity_json(1, "activity 1"), get_activity_json(2, "activity 2", date="2023-12-22")]})
+    assert runner.join(timeout=5)
+    job = client.get(JOB_URL + f"/{response.json()['id']}").json()
+
+    assert job["status"] == "succeeded"
+    assert job["result"] == [{'index': 0, 'id': 1, 'error': None}, {'index': 1, 'id': 2, 'error': None}]
+    assert [activity["name"] for activity in client.get("/api/activities/1/running").json()] == \
+           ["activity 1", "activity 2"]
+
+
+def test_jobs_share_single_writer_connection(session: Session, client: TestClient):
+    writer = create_engine(session.get_bind().url, connect_args={"check_same_thread": False},
+                           pool_size=1, max_overflow=0, pool_timeout=1)
+    WriterSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=writer)
+    runner = JobRunner(session_factory=WriterSessionLocal, retry_delay=0)
+    runner.start()
+    app.dependency_overrides[get_job_runner] = lambda: runner
+    session.add(User(user_name="user 1", hashed_password="123456"))
+    session.commit()
+    client.post("/api/activities/1", json=get_activity_json(1, "activity 1"))
+
+    responses = [client.post(JOB_URL + "/", json={"kind": kind, "user_id": 1, "max_attempts": 1})
+                 for kind in ("warm cache", "rebuild")]
+    assert runner.join(timeout=10)
+    jobs = [client.get(JOB_URL + f"/{response.json()['id']}").json() for response in responses]
+    runner.shutdown()
+    writer.dispose()
+
+    assert [(job["status"], job["error"], job["progress"]) for job in jobs] == \
+           [("succeeded", None, 1.0), ("succeeded", None, 1.0)]
+
+
+def test_job_retries_then_fails(session: Session, client: TestClient, runner: JobRunner, monkeypatch):
+    calls = []
+
+    def failing_handler(db, job, report):
+        calls.append(job.attempts)
+        raise RuntimeError("disk full")
+
+    monkeypatch.setitem(JOB_HANDLERS, JobKind.retag, failing_handler)
+    response = client.post(JOB_URL + "/", json={"kind": "retag", "max_attempts": 2})
+    assert runner.join(timeout=5)
+    job = client.get(JOB_URL + f"/{response.json()['id']}").json()
+
+    assert calls == [1, 2]
+    assert job["status"] == "failed"
+    assert job["error"] == "RuntimeError: disk full"
+
+    monkeypatch.setitem(JOB_HANDLERS, JobKind.retag, lambda db, job, report: {"ok": True})
+    retry = client.post(JOB_URL + f"/{job['id']}/retry")
+    assert runner.join(timeout=5)
+
+    assert retry.status_code == 202
+    assert client.get(JOB_URL + "/", params={"status": "succeeded"}).json()[0]["id"] == job["id"]
+
+
+def test_create_job_without_user(session: Session, client: TestClient):
+    response = client.post(JOB_URL + "/", json={"kind": "rebuild"})
+
+    assert response.status_code == 400
+
+
+def test_get_job_not_found(session: Session, client: TestClient):
+    response = client.get(JOB_URL + "/1")
+
+    assert response.status_code == 404
@@ -0,0 +1,371 @@
+import re
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from sqlmodel import Session, SQLModel
+
+from database import Base, get_db, get_async_db
+from main import app
+from migrations import SCHEMA_VERSION, SchemaVersionError, check_schema, migrate
+from definitions import ActivityType
+from models import Job, User
+from tests.utils import create_event, create_training, create_untraceable, get_activity_json
+from utils.cache import stats_cache
+from utils.distance_tags import DISTANCE_TAG_TABLES
+from utils.jobs import JobRunner
+
+SCAN = re.compile(r"^SCAN (\w+)")
+
+# The schema create_all built from the models before the migrations and the stored rollups were introduced.
+BASELINE_SCHEMA = """
+CREATE TABLE users (id INTEGER NOT NULL, user_name VARCHAR, hashed_password VARCHAR, PRIMARY KEY (id));
+CREATE INDEX ix_users_id ON users (id);
+CREATE UNIQUE INDEX ix_users_user_name ON users (user_name);
+CREATE TABLE untraceables (
+    id INTEGER NOT NULL, name VARCHAR NOT NULL, description VARCHAR, dates JSON NOT NULL, user_id INTEGER NOT NULL,
+    PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES users (id));
+CREATE INDEX ix_untraceables_name ON untraceables (name);
+CREATE INDEX ix_untraceables_id ON untraceables (id);
+CREATE INDEX ix_untraceables_description ON untraceables (description);
+CREATE INDEX ix_untraceables_dates ON untraceables (dates);
+CREATE TABLE monthly (
+    id INTEGER NOT NULL, month VARCHAR, user_id INTEGER NOT NULL, activity_type VARCHAR NOT NULL,
+    PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES users (id));
+CREATE INDEX ix_monthly_activity_type ON monthly (activity_type);
+CREATE INDEX ix_monthly_month ON monthly (month);
+CREATE INDEX ix_monthly_id ON monthly (id);
+CREATE TABLE yearly (
+    id INTEGER NOT NULL, year VARCHAR, user_id INTEGER NOT NULL, activity_type VARCHAR NOT NULL,
+    PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES users (id));
+CREATE INDEX ix_yearly_activity_type ON yearly (activity_type);
+CREATE INDEX ix_yearly_id ON yearly (id);
+CREATE INDEX ix_yearly_year ON yearly (year);
+CREATE TABLE training (
+    id INTEGER NOT NULL, name VARCHAR NOT NULL, type VARCHAR NOT NULL, description VARCHAR,
+    begin_date VARCHAR NOT NULL, end_date VARCHAR NOT NULL, user_id INTEGER NOT NULL,
+    PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES users (id));
+CREATE INDEX ix_training_id ON training (id);
+CREATE INDEX ix_training_end_date ON training (end_date);
+CREATE INDEX ix_training_begin_date ON training (begin_date);
+CREATE INDEX ix_training_type ON training (type);
+CREATE INDEX ix_training_name ON training (name);
+CREATE INDEX ix_training_description ON training (description);
+CREATE TABLE events (
+    id INTEGER NOT NULL, name VARCHAR NOT NULL, type VARCHAR NOT NULL, description VARCHAR, date VARCHAR NOT NULL,
+    environment VARCHAR, race_type VARCHAR, distance DOUBLE NOT NULL, distance_tag VARCHAR,
+    user_id INTEGER NOT NULL, training_id INTEGER,
+    PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES users (id), FOREIGN KEY(training_id) REFERENCES training (id));
+CREATE INDEX ix_events_race_type ON events (race_type);
+CREATE INDEX ix_events_distance_tag ON events (distance_tag);
+CREATE INDEX ix_events_date ON events (date);
+CREATE INDEX ix_events_name ON events (name);
+CREATE INDEX ix_events_id ON events (id);
+CREATE INDEX ix_events_type ON events (type);
+CREATE INDEX ix_events_environment ON events (environment);
+CREATE INDEX ix_events_description ON events (description);
+CREATE INDEX ix_events_distance ON events (distance);
+CREATE TABLE activities (
+    id INTEGER NOT NULL, name VARCHAR NOT NULL, type VARCHAR NOT NULL, description VARCHAR, date VARCHAR NOT NULL,
+    distance_tag VARCHAR NOT NULL, environment VARCHAR, training_type VARCHAR, race_type VARCHAR,
+    with_friends BOOLEAN, user_id INTEGER NOT NULL, month_id INTEGER NOT NULL, year_id INTEGER NOT NULL,
+    event_id INTEGER, training_id INTEGER,
+    PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES users (id), FOREIGN KEY(month_id) REFERENCES monthly (id),
+    FOREIGN KEY(year_id) REFERENCES yearly (id), FOREIGN KEY(event_id) REFERENCES events (id),
+    FOREIGN KEY(training_id) REFERENCES training (id));
+CREATE INDEX ix_activities_id ON activities (id);
+CREATE INDEX ix_activities_with_friends ON activities (with_friends);
+CREATE INDEX ix_activities_description ON activities (description);
+CREATE INDEX ix_activities_type ON activities (type);
+CREATE INDEX ix_activities_training_type ON activities (training_type);
+CREATE INDEX ix_activities_name ON activities (name);
+CREATE INDEX ix_activities_environment ON activities (environment);
+CREATE INDEX ix_activities_distance_tag ON activities (distance_tag);
+CREATE INDEX ix_activities_race_type ON activities (race_type);
+CREATE INDEX ix_activities_date ON activities (date);
+CREATE TABLE goals (
+    id INTEGER NOT NULL, event_id INTEGER, time INTEGER, pace INTEGER, speed DOUBLE,
+    PRIMARY KEY (id), FOREIGN KEY(event_id) REFERENCES events (id));
+CREATE INDEX ix_goals_id ON goals (id);
+CREATE INDEX ix_goals_pace ON goals (pace);
+CREATE INDEX ix_goals_time ON goals (time);
+CREATE INDEX ix_goals_speed ON goals (speed);
+CREATE TABLE results (
+    id INTEGER NOT NULL, activity_id INTEGER NOT NULL, distance DOUBLE NOT NULL, distance_tag VARCHAR,
+    time INTEGER NOT NULL, pace INTEGER NOT NULL, speed DOUBLE NOT NULL, url VARCHAR, tracking_type VARCHAR,
+    PRIMARY KEY (id), FOREIGN KEY(activity_id) REFERENCES activities (id));
+CREATE INDEX ix_results_time ON results (time);
+CREATE INDEX ix_results_distance ON results (distance);
+CREATE INDEX ix_results_pace ON results (pace);
+CREATE INDEX ix_results_id ON results (id);
+CREATE INDEX ix_results_url ON results (url);
+CREATE INDEX ix_results_speed ON results (speed);
+"""
+
+# Buckets as the baseline crud left them: looked up without the user, so user 2's activity went into the bucket of
+# user 1, and a concurrent insert created a second bucket for the same month.
+BASELINE_DATA = """
+INSERT INTO users VALUES (1, 'user 1', '123456'), (2, 'user 2', '123456');
+INSERT INTO monthly VALUES (1, '2023-11', 1, 'running'), (2, '2023-11', 1, 'running');
+INSERT INTO yearly VALUES (1, '2023', 1, 'running');
+INSERT INTO activities VALUES
+    (1, 'activity 1', 'running', NULL, '2023-11-21', '10k', 'road', 'base', NULL, 0, 1, 1, 1, NULL, NULL),
+    (2, 'activity 2', 'running', NULL, '2023-11-22', '10k', 'road', 'base', NULL, 0, 1, 2, 1, NULL, NULL),
+    (3, 'activity 3', 'running', NULL, '2023-11-23', '10k', 'road', 'base', NULL, 0, 2, 1, 1, NULL, NULL);
+INSERT INTO results VALUES
+    (1, 1, 10.0, '10k', 3000, 300, 12.0, NULL, 'personal'),
+    (2, 2, 10.0, '10k', 3100, 310, 11.61, NULL, 'personal'),
+    (3, 3, 10.0, '10k', 2900, 290, 12.41, NULL, 'personal');
+"""
+
+
+@pytest.fixture(name="session")
+def session_fixture(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'homerun.db'}",
+        connect_args={"check_same_thread": False},
+    )
+
+    Base.metadata.create_all(bind=engine)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+@pytest.fixture(name="async_engine")
+def async_engine_fixture(session: Session):
+    return create_async_engine(session.get_bind().url.set(drivername="sqlite+aiosqlite"), poolclass=NullPool)
+
+
+@pytest.fixture(name="client")
+def client_fixture(session: Session, async_engine: AsyncEngine):
+    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=session.get_bind())
+
+    def override_get_db():
+        try:
+            db = TestingSessionLocal()
+            yield db
+        finally:
+            db.close()
+
+    TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    stats_cache.clear()
+    client = TestClient(app)
+    yield client
+    app.dependency_overrides.clear()
+
+
+def get_capture(statements: list, *kinds: str):
+    def capture(connection, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(kinds):
+            statements.append((statement, parameters))
+    return capture
+
+
+def get_full_scans(session: Session, statements: list) -> list[tuple[str, str]]:
+    tables = set(Base.metadata.tables)
+    connection = session.connection()
+    full_scans = []
+    for statement, parameters in statements:
+        for *_, detail in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters):
+            scan = SCAN.match(detail)
+            if scan and scan.group(1) in tables and "USING" not in detail:
+                full_scans.append((detail, statement))
+    return full_scans
+
+
+def get_schema(engine) -> dict[str, set]:
+    with engine.connect() as connection:
+        tables = connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'").scalars().all()
+        indexes = connection.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND name NOT LIKE 'sqlite_autoindex%'").scalars()
+        return {
+            "indexes": set(indexes),
+            **{table: {(column[1], column[2], bool(column[3]))
+                       for column in connection.exec_driver_sql(f"PRAGMA table_info({table})")} for table in tables},
+        }
+
+
+def test_migrate_matches_models(session: Session, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrated.db'}")
+
+    applied = migrate(engine)
+    applied_again = migrate(engine)
+
+    assert applied == list(range(1, SCHEMA_VERSION + 1))
+    assert applied_again == []
+    assert get_schema(engine) == get_schema(session.get_bind())
+    engine.dispose()
+
+
+def test_migrate_database_built_by_create_all(session: Session):
+    connection = session.connection()
+    connection.exec_driver_sql("CREATE INDEX ix_activities_description ON activities (description)")
+    connection.exec_driver_sql("CREATE INDEX ix_results_pace ON results (pace)")
+    connection.exec_driver_sql("DROP INDEX ix_activities_user_id_type_distance_tag")
+    session.commit()
+    schema = get_schema(session.get_bind())
+
+    with pytest.raises(SchemaVersionError):
+        check_schema(session.get_bind())
+    migrate(session.get_bind())
+    check_schema(session.get_bind())
+
+    assert get_schema(session.get_bind())["indexes"] == {
+        index.name for table in Base.metadata.tables.values() for index in table.indexes}
+    assert schema["indexes"] - get_schema(session.get_bind())["indexes"] == {"ix_activities_description",
+                                                                            "ix_results_pace"}
+
+
+def test_migrate_baseline_database(session: Session, client: TestClient, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'baseline.db'}", connect_args={"check_same_thread": False})
+    with engine.connect() as connection:
+        connection.connection.executescript(BASELINE_SCHEMA + BASELINE_DATA)
+
+    applied = migrate(engine)
+    check_schema(engine)
+    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with TestingSessionLocal() as db:
+        queued = [(job.kind, job.user_id) for job in db.query(Job).order_by(Job.id)]
+    runner = JobRunner(session_factory=TestingSessionLocal, retry_delay=0)
+    runner.start()
+    assert runner.join(timeout=10)
+    runner.shutdown()
+    TestingAsyncSessionLocal = async_sessionmaker(
+        create_async_engine(engine.url.set(drivername="sqlite+aiosqlite"), poolclass=NullPool),
+        autoflush=False, expire_on_commit=False)
+
+    def override_get_db():
+        with TestingSessionLocal() as db:
+            yield db
+
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    summaries = [client.get(f"/api/stats/{user_id}/running/summary").json() for user_id in (1, 2)]
+    created = client.post("/api/activities/2", json=get_activity_json(4, "activity 4", date="2023-11-24"))
+    summary = client.get("/api/stats/2/running/summary").json()
+    training_load = client.get("/api/stats/2/training-load")
+
+    assert applied == list(range(1, SCHEMA_VERSION + 1))
+    assert get_schema(engine) == get_schema(session.get_bind())
+    assert queued == [("retag", None), ("rebuild", 1), ("rebuild", 2)]
+    assert [(monthly["month"], monthly["activity_ids"], monthly["activity_count"], monthly["total_time"])
+            for summary in summaries for monthly in summary["monthly"]] == [("2023-11", [1, 2], 2, 6100),
+                                                                             ("2023-11", [3], 1, 2900)]
+    assert [summary["yearly"][0]["activity_ids"] for summary in summaries] == [[1, 2], [3]]
+    assert [summary["best_efforts"]["10k"] for summary in summaries] == [[1, 2], [3]]
+    assert created.status_code == 200
+    assert summary["monthly"][0]["activity_ids"] == [3, 4]
+    assert summary["monthly"][0]["total_distance"] == 20.0
+    assert summary["best_efforts"]["10k"] == [3, 4]
+    assert training_load.status_code == 200
+    assert len(training_load.json()) > 0
+    engine.dispose()
+
+
+def test_migrate_refuses_downgrade(session: Session):
+    migrate(session.get_bind())
+
+    with pytest.raises(SchemaVersionError):
+        migrate(session.get_bind(), target=1)
+    with pytest.raises(ValueError):
+        migrate(session.get_bind(), target=SCHEMA_VERSION + 1)
+
+
+def test_crud_queries_use_indexes(session: Session, client: TestClient, async_engine: AsyncEngine):
+    session.add(User(user_name="user 1", hashed_password="123456"))
+    training = create_training()
+    untraceable = create_untraceable()
+    session.add_all([training, untraceable])
+    session.commit()
+    event_1 = create_event()
+    event_1.training_id = training.id
+    session.add(event_1)
+    session.commit()
+    for day in ("2023-11-21", "2023-11-22", "2023-11-23"):
+        client.post("/api/activities/1", json={**get_activity_json(1, "activity", "personal", day),
+                                               "event_id": event_1.id, "training_id": training.id})
+    client.post("/api/stats/1/rebuild")
+
+    statements = []
+    capture = get_capture(statements, "SELECT")
+    event.listen(async_engine.sync_engine, "before_cursor_execute", capture)
+    event.listen(session.get_bind(), "before_cursor_execute", capture)
+    responses = [
+        client.get("/api/users/1"),
+        client.get("/api/users/1/export"),
+        client.get("/api/activities/1/running"),
+        client.get("/api/activities/1"),
+        client.get("/api/events/1/running"),
+        client.get("/api/events/1"),
+        client.get("/api/training/1/running"),
+        client.get("/api/training/1"),
+        client.get("/api/untraceables/1"),
+        client.get("/api/calendar/1", params={"date_from": "2023-11-01", "date_to": "2023-12-01"}),
+        client.get("/api/stats/1/running"),
+        client.get("/api/stats/1/running/summary"),
+        client.get("/api/stats/1/running/range", params={"date_from": "2023-11-01", "date_to": "2023-12-01"}),
+        client.get("/api/stats/1/running/trends"),
+        client.get("/api/stats/1/training-load"),
+        client.get("/api/jobs/", params={"user_id": 1}),
+    ]
+    event.remove(async_engine.sync_engine, "before_cursor_execute", capture)
+    event.remove(session.get_bind(), "before_cursor_execute", capture)
+
+    assert [response.status_code for response in responses] == [200] * len(responses)
+    assert len(statements) > len(responses)
+    assert get_full_scans(session, statements) == []
+
+
+def test_crud_writes_use_indexes(session: Session, client: TestClient, async_engine: AsyncEngine, monkeypatch):
+    session.add_all([User(user_name="user 1", hashed_password="123456"),
+                     User(user_name="user 2", hashed_password="123456")])
+    session.commit()
+    client.post("/api/activities/2", json=get_activity_json(1, "other user", "official", "2023-11-20"))
+    mile = get_activity_json(1, "mile", "official", "2023-11-21")
+    mile["results"][0].update(distance=1.609, time=400)
+    activities = [mile] + [get_activity_json(1, "activity", "official", day)
+                           for day in ("2023-11-22", "2023-11-23", "2023-11-24", "2023-11-25")]
+
+    statements = []
+    capture = get_capture(statements, "SELECT", "INSERT", "UPDATE", "DELETE")
+    event.listen(async_engine.sync_engine, "before_cursor_execute", capture)
+    event.listen(session.get_bind(), "before_cursor_execute", capture)
+    edited = get_activity_json(1, "edited", "official", "2023-12-02")
+    edited["results"][0]["time"] = 2900
+    responses = [
+        *[client.post("/api/activities/1", json=activity) for activity in activities],
+        client.post("/api/activities/1/bulk", json=[get_activity_json(1, "bulk", "official", "2023-12-01")]),
+        client.put("/api/activities/3", json=edited),
+        client.delete("/api/activities/4"),
+        client.post("/api/stats/1/rebuild"),
+    ]
+    monkeypatch.setitem(DISTANCE_TAG_TABLES, ActivityType.running,
+                        DISTANCE_TAG_TABLES[ActivityType.running].add("1 mile", 1.609))
+    responses += [
+        client.post("/api/stats/retag"),
+        client.post("/api/jobs/", json={"kind": "rebuild", "user_id": 1}),
+        client.get("/api/jobs/", params={"status": "queued"}),
+    ]
+    event.remove(async_engine.sync_engine, "before_cursor_execute", capture)
+    event.remove(session.get_bind(), "before_cursor_execute", capture)
+
+    assert [response.status_code for response in responses] == [200] * 10 + [202, 200]
+    assert responses[-3].json() == {"results": 1, "activities": 1}
+    assert {statement.split()[0] for statement, _ in statements} == {"SELECT", "INSERT", "UPDATE", "DELETE"}
+    assert get_full_scans(session, statements) == []
@@ -1,36 +1,45 @@
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlmodel import Session, SQLModel
-from sqlmodel.pool import StaticPool
+from sqlalchemy.pool import NullPool
+from sqlmodel import Session, SQLModel, select
 
-from database import Base, get_db
+import crud
+from database import Base, get_db, get_async_db
 from main import app
-from models import User
-from tests.utils import get_stats_json, get_activity_json
+from models import User, Monthly, Activity
+from tests.utils import get_stats_json, get_activity_json, get_result_json
+from definitions import ActivityType
+from utils.cache import stats_cache
+from utils.distance_tags import DISTANCE_TAG_TABLES
 
 STATS_URL = "/api/stats"
 ACTIVITY_URL = "/api/activities"
-SQLALCHEMY_DATABASE_URL = "sqlite://"
 
 
 @pytest.fixture(name="session")
-def session_fixture():
+def session_fixture(tmp_path):
     engine = create_engine(
-        SQLALCHEMY_DATABASE_URL,
+        f"sqlite:///{tmp_path / 'homerun.db'}",
         connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
     )
 
     Base.metadata.create_all(bind=engine)
     SQLModel.metadata.create_all(engine)
     with Session(engine) as session:
         yield session
+    engine.dispose()
+
+
+@pytest.fixture(name="async_engine")
+def async_engine_fixture(session: Session):
+    return create_async_engine(session.get_bind().url.set(drivername="sqlite+aiosqlite"), poolclass=NullPool)
 
 
 @pytest.fixture(name="client")
-def client_fixture(session: Session):
+def client_fixture(session: Session, async_engine: AsyncEngine):
     TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=session.get_bind())
 
     def override_get_db():
@@ -40,7 +49,15 @@ def client_fixture(session: Session):
         finally:
             db.close()
 
+    TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
+
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    stats_cache.clear()
     client = TestClient(app)
     yield client
     app.dependency_overrides.clear()
@@ -77,3 +94,314 @@ def test_get_stats(session: Session, client: TestClient):
     assert response_activity_4.status_code == 200
     assert data == get_stats_json()
 
+
+
+def test_get_stats_after_remove(session: Session, client: TestClient):
+    user_1 = User(user_name="user 1", hashed_password="123456")
+    session.add(user_1)
+    session.commit()
+
+    client.post(ACTIVITY_URL + "/1", json=get_activity_json(1, "activity 1", "personal", "2023-11-22"))
+    client.post(ACTIVITY_URL + "/1", json=get_activity_json(2, "activity 2", "personal", "2023-11-23"))
+    response_remove = client.delete(ACTIVITY_URL + "/1")
+    response = client.get(STATS_URL + "/1/running")
+    data = response.json()
+
+    assert response_remove.status_code == 200
+    assert response.status_code == 200
+    assert data["monthly"][0]["activity_count"] == 1
+    assert data["monthly"][0]["total_distance"] == 10.0
+    assert data["monthly"][0]["total_time"] == 3000
+    assert data["yearly"][0]["activity_count"] == 1
+
+
+def test_rebuild_rollups(session: Session, client: TestClient):
+    user_1 = User(user_name="user 1", hashed_password="123456")
+    session.add(user_1)
+    session.commit()
+
+    for count, day in enumerate(["2023-11-22", "2023-11-23", "2023-12-22", "2024-11-22"]):
+        client.post(ACTIVITY_URL + "/1", json=get_activity_json(count + 1, f"activity {count + 1}", "personal", day))
+    for monthly in session.exec(select(Monthly)).all():
+        monthly.total_distance, monthly.total_time, monthly.activity_count = 0.0, 0, 0
+    session.commit()
+
+    response_rebuild = client.post(STATS_URL + "/1/rebuild")
+    response = client.get(STATS_URL + "/1/running")
+
+    assert response_rebuild.status_code == 200
+    assert response.status_code == 200
+    assert response.json() == get_stats_json()
+
+
+def test_rebuild_rollups_prefers_personal_result(session: Session, client: TestClient):
+    user_1 = User(user_name="user 1", hashed_password="123456")
+    session.add(user_1)
+    session.commit()
+
+    activity = get_activity_json(1, "activity 1", "official", "2023-11-22")
+    activity["results"].append({"distance": 10.5, "time": 3100, "tracking_type": "personal"})
+    client.post(ACTIVITY_URL + "/1", json=activity)
+    session.exec(select(Monthly)).one().total_distance = 0.0
+    session.commit()
+
+    client.post(STATS_URL + "/1/rebuild")
+    data = client.get(STATS_URL + "/1/running").json()
+
+    assert data["monthly"][0]["total_distance"] == 10.5
+    assert data["monthly"][0]["total_time"] == 3100
+    assert data["yearly"][0]["total_distance"] == 10.5
+
+
+def test_get_stats_statement_count(session: Session, client: TestClient):
+    user_1 = User(user_name="user 1", hashed_password="123456")
+    session.add(user_1)
+    session.commit()
+    statements = []
+    event.listen(session.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    def count_stats_statements():
+        statements.clear()
+        client.get(STATS_URL + "/1/running")
+        return len(statements)
+
+    client.post(ACTIVITY_URL + "/1", json=get_activity_json(1, "activity 1", "personal", "2023-11-22"))
+    few_activities = count_stats_statements()
+    for day in ["2023-11-23", "2023-12-22", "2024-01-22", "2024-11-22"]:
+        client.post(ACTIVITY_URL + "/1", json=get_activity_json(1, "activity", "personal", day))
+    many_activities = count_stats_statements()
+
+    assert few_activities == many_activities > 0
+
+
+def test_buckets_are_user_scoped_and_cached(session: Session, client: TestClient):
+    session.add_all([User(user_name="user 1", hashed_password="123456"),
+                     User(user_name="user 2", hashed_password="123456")])
+    session.commit()
+    statements = []
+    event.listen(session.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    client.post(ACTIVITY_URL + "/1", json=get_activity_json(1, "activity 1", "personal", "2023-11-22"))
+    client.post(ACTIVITY_URL + "/2", json=get_activity_json(2, "activity 2", "personal", "2023-11-23"))
+    statements.clear()
+    client.post(ACTIVITY_URL + "/1", json=get_activity_json(3, "activity 3", "personal", "2023-11-24"))
+    bucket_statements = [statement for statement in statements if "monthly" in statement and "UPDATE" not in statement]
+    buckets = session.exec(select(Monthly.user_id, Monthly.month, Monthly.activity_count).order_by(Monthly.id)).all()
+
+    assert buckets == [(1, "2023-11", 2), (2, "2023-11", 1)]
+    assert bucket_statements == []
+
+
+def test_bucket_cache_is_shared_across_engines(session: Session, client: TestClient):
+    session.add(User(user_name="user 1", hashed_password="123456"))
+    session.commit()
+    client.post(ACTIVITY_URL + "/1", json=get_activity_json(1, "activity 1", "personal", "2023-11-22"))
+
+    crud.remove_user(session, 1)
+    session.add(User(user_name="user 1", hashed_password="123456"))
+    session.commit()
+    response = client.post(ACTIVITY_URL + "/1", json=get_activity_json(1, "activity 1", "personal", "2023-11-23"))
+    activity = session.get(Activity, response.json()["id"])
+
+    assert activity.user_id == 1
+    assert session.exec(select(Monthly.id, Monthly.user_id, Monthly.activity_count)).all() == \
+        [(activity.month_id, 1, 1)]
+
+
+def test_best_efforts_top_three(session: Session, client: TestClient):
+    user_1 = User(user_name="user 1", hashed_password="123456")
+    session.add(user_1)
+    session.commit()
+
+    for count, time in enumerate([3000, 2900, 3100, 3200]):
+        activity = get_activity_json(count + 1, f"activity {count + 1}", "personal", "2023-11-22")
+        activity["results"][0]["time"] = time
+        client.post(ACTIVITY_URL + "/1", json=activity)
+    best_efforts = client.get(STATS_URL + "/1/running").json()["best_efforts"]
+    response_remove = client.delete(ACTIVITY_URL + "/2")
+    best_efforts_after_remove = client.get(STATS_URL + "/1/running").json()["best_efforts"]
+
+    assert response_remove.status_code == 200
+    assert [activity["name"] for activity in best_efforts["10k"]] == ["activity 2", "activity 1", "activity 3"]
+    assert [activity["name"] for activity in best_efforts_after_remove["10k"]] == \
+           ["activity 1", "activity 3", "activity 4"]
+    assert best_efforts["5k"] == []
+
+
+def test_get_stats_cached(session: Session, client: TestClient):
+    user_1 = User(user_name="user 1", hashed_password="123456")
+    session.add(user_1)
+    session.commit()
+
+    client.post(ACTIVITY_URL + "/1", json=get_activity_json(1, "activity 1", "personal", "2023-11-22"))
+    response_miss = client.get(STATS_URL + "/1/running")
+    response_hit = client.get(STATS_URL + "/1/running")
+    cache_info = client.get(STATS_URL + "/cache").json()
+    client.post(ACTIVITY_URL + "/1", json=get_activity_json(2, "activity 2", "personal", "2023-11-23"))
+    response_invalidated = client.get(STATS_URL + "/1/running")
+
+    assert response_miss.json() == response_hit.json()
+    assert cache_info["hits"] == 1
+    assert cache_info["misses"] == 1
+    assert cache_info["size"] == 1
+    assert response_invalidated.json()["monthly"][0]["activity_count"] == 2
+
+
+def test_get_stats_summary(session: Session, client: TestClient):
+    user_1 = User(user_name="user 1", hashed_password="123456")
+    session.add(user_1)
+    session.commit()
+
+    for count, day in enumerate(["2023-11-22", "2023-11-23", "2023-12-22", "2024-11-22"]):
+        client.post(ACTIVITY_URL + "/1", json=get_activity_json(count + 1, f"activity {count + 1}", "personal", day))
+    response = client.get(STATS_URL + "/1/running/summary")
+    data = response.json()
+
+    assert response.status_code == 200
+    assert data["monthly"][0] == {
+        'activity_count': 2,
+        'activity_ids': [1, 2],
+        'activity_type': 'running',
+        'month': '2023-11',
+        'total_distance': 20.0,
+        'total_time': 6000,
+    }
+    assert [yearly["activity_ids"] for yearly in data["yearly"]] == [[1, 2, 3], [4]]
+    assert data["best_efforts"]["10k"] == [1, 2, 3]
+    assert data["best_efforts"]["5k"] == []
+
+
+def test_get_rollups(session: Session, client: TestClient):
+    user_1 = User(user_name="user 1", hashed_password="123456")
+    session.add(user_1)
+    session.commit()
+
+    for count, day in enumerate(["2023-11-20", "2023-11-22", "2023-11-22", "2023-11-27", "2023-12-04"]):
+        client.post(ACTIVITY_URL + "/1", json=get_activity_json(count + 1, f"activity {count + 1}", "personal", day))
+    params = {"date_from": "2023-11-21", "date_to": "2023-12-04"}
+    response_range = client.get(STATS_URL + "/1/running/range", params=params)
+    response_days = client.get(STATS_URL + "/1/running/range", params={**params, "period": "day"})
+    response_weeks = client.get(STATS_URL + "/1/running/range", params={**params, "period": "week"})
+    response_invalid = client.get(STATS_URL + "/1/running/range",
+                                  params={"date_from": "2023-12-04", "date_to": "2023-11-21"})
+
+    assert response_range.json() == [
+        {'period': '2023-11-21/2023-12-04', 'total_distance': 30.0, 'total_time': 9000, 'activity_count': 3},
+    ]
+    assert [(day["period"], day["activity_count"]) for day in response_days.json()] == \
+           [("2023-11-22", 2), ("2023-11-27", 1)]
+    assert [(week["period"], week["activity_count"]) for week in response_weeks.json()] == \
+           [("2023-W47", 2), ("2023-W48", 1)]
+    assert response_invalid.status_code == 400
+
+
+def test_get_trends(session: Session, client: TestClient):
+    user_1 = User(user_name="user 1", hashed_password="123456")
+    session.add(user_1)
+    session.commit()
+
+    for count, (day, time) in enumerate([("2023-11-01", 3000), ("2023-11-05", 2900), ("2023-11-10", 2800)]):
+        activity = get_activity_json(count + 1, f"activity {count + 1}", "personal", day)
+        activity["results"][0]["time"] = time
+        client.post(ACTIVITY_URL + "/1", json=activity)
+    response = client.get(STATS_URL + "/1/running/trends", params={"window": 2})
+    data = response.json()
+
+    assert response.status_code == 200
+    assert len(data["volume"]["dates"]) == 10
+    assert data["volume"]["volume_7d"][4] == 20.0
+    assert data["volume"]["volume_7d"][9] == 20.0
+    assert data["volume"]["volume_28d"][9] == 30.0
+    assert data["paces"]["10k"]["pace"] == [300.0, 290.0, 280.0]
+    assert data["paces"]["10k"]["moving_average_pace"] == [300.0, 295.0, 285.0]
+    assert data["paces"]["10k"]["trend"] < 0
+    assert data["paces"]["all"]["dates"] == ["2023-11-01", "2023-11-05", "2023-11-10"]
+
+
+def test_get_trends_empty(session: Session, client: TestClient):
+    response = client.get(STATS_URL + "/1/running/trends")
+
+    assert response.status_code == 200
+    assert response.json() == {
+        'volume': {'dates': [], 'volume_7d': [], 'volume_28d': []},
+        'paces': {'all': {'dates': [], 'pace': [], 'speed': [], 'moving_average_pace': [], 'trend': None}},
+    }
+
+
+def test_get_training_load(session: Session, client: TestClient):
+    user_1 = User(user_name="user 1", hashed_password="123456")
+    session.add(user_1)
+    session.commit()
+
+    client.post(ACTIVITY_URL + "/1", json=get_activity_json(1, "activity 1", "personal", "2023-11-01"))
+    client.post(ACTIVITY_URL + "/1", json=get_activity_json(2, "activity 2", "personal", "2023-11-05"))
+    client.post(ACTIVITY_URL + "/1", json=get_activity_json(3, "activity 3", "personal", "2023-11-03"))
+    training_load = client.get(STATS_URL + "/1/training-load").json()
+    client.post(STATS_URL + "/1/rebuild")
+    rebuilt_training_load = client.get(STATS_URL + "/1/training-load").json()
+    client.delete(ACTIVITY_URL + "/2")
+    training_load_after_remove = client.get(STATS_URL + "/1/training-load",
+                                            params={"date_from": "2023-11-02"}).json()
+
+    assert [day["date"] for day in training_load] == \
+           ["2023-11-01", "2023-11-02", "2023-11-03", "2023-11-04", "2023-11-05"]
+    assert [day["load"] for day in training_load] == [50.0, 0.0, 50.0, 0.0, 50.0]
+    assert training_load[0]["acute"] > training_load[0]["chronic"]
+    assert training_load == rebuilt_training_load
+    assert [day["date"] for day in training_load_after_remove] == ["2023-11-02", "2023-11-03"]
+    assert training_load_after_remove == training_load[1:3]
+
+
+def test_retag_distances(session: Session, client: TestClient, monkeypatch):
+    user_1 = User(user_name="user 1", hashed_password="123456")
+    session.add(user_1)
+    session.commit()
+
+    mile = get_activity_json(1, "activity 1", "personal", "2023-11-22")
+    mile["results"][0].update(distance=1.609, time=400)
+    client.post(ACTIVITY_URL + "/1", json=mile)
+    client.post(ACTIVITY_URL + "/1", json=get_activity_json(2, "activity 2", "personal", "2023-11-23"))
+    monkeypatch.setitem(DISTANCE_TAG_TABLES, ActivityType.running,
+                        DISTANCE_TAG_TABLES[ActivityType.running].add("1 mile", 1.609))
+
+    response = client.post(STATS_URL + "/retag")
+    activity = client.get(ACTIVITY_URL + "/1").json()
+    best_efforts = client.get(STATS_URL + "/1/running").json()["best_efforts"]
+
+    assert response.json() == {"results": 1, "activities": 1}
+    assert activity["distance_tag"] == "1 mile"
+    assert activity["results"][0]["distance_tag"] == "1 mile"
+    assert list(best_efforts) == ["1 mile", "5k", "10k", "15k", "half-marathon", "30k", "marathon"]
+    assert [effort["id"] for effort in best_efforts["1 mile"]] == [1]
+    assert [effort["id"] for effort in best_efforts["10k"]] == [2]
+
+
+def test_retag_result_only_invalidates_stats(session: Session, client: TestClient, monkeypatch):
+    user_1 = User(user_name="user 1", hashed_password="123456")
+    session.add(user_1)
+    session.commit()
+
+    activity = get_activity_json(1, "activity 1", "personal", "2023-11-22")
+    activity["results"].append({**get_result_json("official"), "distance": 1.609, "time": 400,
+                                "distance_tag": None})
+    client.post(ACTIVITY_URL + "/1", json=activity)
+    client.get(STATS_URL + "/1/running")
+    monkeypatch.setitem(DISTANCE_TAG_TABLES, ActivityType.running,
+                        DISTANCE_TAG_TABLES[ActivityType.running].add("1 mile", 1.609))
+
+    response = client.post(STATS_URL + "/retag")
+    stats = client.get(STATS_URL + "/1/running").json()
+
+    assert response.json() == {"results": 1, "activities": 0}
+    assert [result["distance_tag"] for result in stats["monthly"][0]["activities"][0]["results"]] == \
+        ["10k", "1 mile"]
+
+
+def test_stale_stats_are_not_cached():
+    generation = stats_cache.generation(1)
+    stats_cache.invalidate(1)
+
+    assert stats_cache.set((1, "running"), "stale", generation) is False
+    assert stats_cache.get((1, "running")) is None
+    assert stats_cache.set((1, "running"), "fresh", stats_cache.generation(1)) is True
+    stats_cache.clear()
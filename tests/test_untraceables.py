@@ -1,35 +1,40 @@
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from sqlmodel import Session, SQLModel, select
-from sqlmodel.pool import StaticPool
 
 from main import app
-from database import Base, get_db
+from database import Base, get_db, get_async_db
 from models import User, Untraceable
 from tests.utils import create_untraceable, get_untraceable_json, get_untraceables_json
 
 UNTRACEABLES_URL = "/api/untraceables"
-SQLALCHEMY_DATABASE_URL = "sqlite://"
 
 
 @pytest.fixture(name="session")
-def session_fixture():
+def session_fixture(tmp_path):
     engine = create_engine(
-        SQLALCHEMY_DATABASE_URL,
+        f"sqlite:///{tmp_path / 'homerun.db'}",
         connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
     )
 
     Base.metadata.create_all(bind=engine)
     SQLModel.metadata.create_all(engine)
     with Session(engine) as session:
         yield session
+    engine.dispose()
+
+
+@pytest.fixture(name="async_engine")
+def async_engine_fixture(session: Session):
+    return create_async_engine(session.get_bind().url.set(drivername="sqlite+aiosqlite"), poolclass=NullPool)
 
 
 @pytest.fixture(name="client")
-def client_fixture(session: Session):
+def client_fixture(session: Session, async_engine: AsyncEngine):
     TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=session.get_bind())
 
     def override_get_db():
@@ -39,7 +44,14 @@ def client_fixture(session: Session):
         finally:
             db.close()
 
+    TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
+
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
     client = TestClient(app)
     yield client
     app.dependency_overrides.clear()
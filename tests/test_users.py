@@ -1,35 +1,43 @@
+import csv
+import json
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from sqlmodel import Session, SQLModel, select
-from sqlmodel.pool import StaticPool
 
 from main import app
-from database import Base, get_db
+from database import Base, get_db, get_async_db
 from models import User
-from tests.utils import get_user_json
+from tests.utils import get_user_json, get_activity_json, create_untraceable
 
 USER_URL = "/api/users"
-SQLALCHEMY_DATABASE_URL = "sqlite://"
 
 
 @pytest.fixture(name="session")
-def session_fixture():
+def session_fixture(tmp_path):
     engine = create_engine(
-        SQLALCHEMY_DATABASE_URL,
+        f"sqlite:///{tmp_path / 'homerun.db'}",
         connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
     )
 
     Base.metadata.create_all(bind=engine)
     SQLModel.metadata.create_all(engine)
     with Session(engine) as session:
         yield session
+    engine.dispose()
+
+
+@pytest.fixture(name="async_engine")
+def async_engine_fixture(session: Session):
+    return create_async_engine(session.get_bind().url.set(drivername="sqlite+aiosqlite"), poolclass=NullPool)
 
 
 @pytest.fixture(name="client")
-def client_fixture(session: Session):
+def client_fixture(session: Session, async_engine: AsyncEngine):
     TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=session.get_bind())
 
     def override_get_db():
@@ -39,7 +47,14 @@ def client_fixture(session: Session):
         finally:
             db.close()
 
+    TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
+
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
     client = TestClient(app)
     yield client
     app.dependency_overrides.clear()
@@ -124,3 +139,35 @@ def test_remove_user(session: Session, client: TestClient):
     assert response.status_code == 200
     assert data[0].user_name == "user 1"
     assert data[1].user_name == "user 3"
+
+
+def test_export_user(session: Session, client: TestClient):
+    session.add(User(user_name="user 1", hashed_password="123456"))
+    session.add(User(user_name="user 2", hashed_password="123456"))
+    session.add(create_untraceable())
+    session.commit()
+    client.post("/api/activities/1", json=get_activity_json(1, "activity 1"))
+    client.post("/api/activities/2", json=get_activity_json(2, "activity 2"))
+
+    response = client.get(USER_URL + "/1/export")
+    records = [json.loads(line) for line in response.text.splitlines()]
+    csv_response = client.get(USER_URL + "/1/export", params={"format": "csv"})
+    rows = list(csv.DictReader(csv_response.text.splitlines()))
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [(record["kind"], record["id"]) for record in records] == [
+        ("activity", 1), ("result", 1), ("untraceable", 1)]
+    assert records[0]["name"] == "activity 1"
+    assert records[0]["splits"] == []
+    assert records[1]["time"] == 3000
+    assert records[2]["dates"] == ["2023-11-22", "2023-11-23"]
+    assert csv_response.headers["content-type"].startswith("text/csv")
+    assert [(row["kind"], row["id"], row["name"], row["time"]) for row in rows] == [
+        ("activity", "1", "activity 1", ""), ("result", "1", "", "3000"), ("untraceable", "1", "untraceable 1", "")]
+
+
+def test_export_user_not_found(session: Session, client: TestClient):
+    response = client.get(USER_URL + "/1/export")
+
+    assert response.status_code == 404
@@ -131,6 +131,7 @@ def get_activity_json(id=1, name="activity", tracking_type="personal", date="202
         "results": [
             get_result_json(tracking_type)
         ],
+        "splits": [],
         "distance_tag": "10k",
         "event_id": None,
         "training_id": None
@@ -159,6 +160,7 @@ def get_event_json(id=1, name="event 1", with_activity=True):
                 'url': None,
             },
         ],
+        'splits': [],
         'training_id': None,
         'training_type': 'base',
         'type': 'running',
@@ -175,6 +177,7 @@ def get_event_json(id=1, name="event 1", with_activity=True):
         'distance_tag': '10k',
         'environment': 'road',
         'goal': None,
+        'prediction': None,
         'id': id,
         'name': name,
         'race_type': 'base',
@@ -210,6 +213,7 @@ def get_training_json(id=1, name="training 1", with_activity=True, with_events=F
                 'url': None,
             },
         ],
+        'splits': [],
         'training_id': id,
         'training_type': 'base',
         'type': 'running',
@@ -226,6 +230,7 @@ def get_training_json(id=1, name="training 1", with_activity=True, with_events=F
         'distance_tag': '10k',
         'environment': 'road',
         'goal': None,
+        'prediction': None,
         'id': id,
         'name': "event " + str(id),
         'race_type': 'base',
@@ -276,6 +281,7 @@ def get_stats_json():
                             'url': None,
                         },
                     ],
+                    'splits': [],
                     'training_id': None,
                     'training_type': 'base',
                     'type': 'running',
@@ -304,6 +310,7 @@ def get_stats_json():
                             'url': None,
                         },
                     ],
+                    'splits': [],
                     'training_id': None,
                     'training_type': 'base',
                     'type': 'running',
@@ -332,6 +339,7 @@ def get_stats_json():
                             'url': None,
                         },
                     ],
+                    'splits': [],
                     'training_id': None,
                     'training_type': 'base',
                     'type': 'running',
@@ -339,34 +347,6 @@ def get_stats_json():
                     'with_friends': False,
                     'year_id': 1,
                 },
-                {
-                    'date': '2024-11-22',
-                    'description': 'a test',
-                    'distance_tag': '10k',
-                    'environment': 'road',
-                    'event_id': None,
-                    'id': 4,
-                    'month_id': 3,
-                    'name': 'activity 4',
-                    'race_type': None,
-                    'results': [
-                        {
-                            'distance': 10.0,
-                            'distance_tag': '10k',
-                            'pace': 300,
-                            'speed': 12.0,
-                            'time': 3000,
-                            'tracking_type': 'personal',
-                            'url': None,
-                        },
-                    ],
-                    'training_id': None,
-                    'training_type': 'base',
-                    'type': 'running',
-                    'user_id': 1,
-                    'with_friends': False,
-                    'year_id': 2,
-                },
             ],
             '15k': [],
             '30k': [],
@@ -398,6 +378,7 @@ def get_stats_json():
                                 'url': None,
                             },
                         ],
+                        'splits': [],
                         'training_id': None,
                         'training_type': 'base',
                         'type': 'running',
@@ -426,6 +407,7 @@ def get_stats_json():
                                 'url': None,
                             },
                         ],
+                        'splits': [],
                         'training_id': None,
                         'training_type': 'base',
                         'type': 'running',
@@ -434,6 +416,7 @@ def get_stats_json():
                         'year_id': 1,
                     },
                 ],
+                'activity_count': 2,
                 'activity_type': 'running',
                 'month': '2023-11',
                 'total_distance': 20.0,
@@ -462,6 +445,7 @@ def get_stats_json():
                                 'url': None,
                             },
                         ],
+                        'splits': [],
                         'training_id': None,
                         'training_type': 'base',
                         'type': 'running',
@@ -470,6 +454,7 @@ def get_stats_json():
                         'year_id': 1,
                     },
                 ],
+                'activity_count': 1,
                 'activity_type': 'running',
                 'month': '2023-12',
                 'total_distance': 10.0,
@@ -498,6 +483,7 @@ def get_stats_json():
                                 'url': None,
                             },
                         ],
+                        'splits': [],
                         'training_id': None,
                         'training_type': 'base',
                         'type': 'running',
@@ -506,6 +492,7 @@ def get_stats_json():
                         'year_id': 2,
                     },
                 ],
+                'activity_count': 1,
                 'activity_type': 'running',
                 'month': '2024-11',
                 'total_distance': 10.0,
@@ -536,6 +523,7 @@ def get_stats_json():
                                 'url': None,
                             },
                         ],
+                        'splits': [],
                         'training_id': None,
                         'training_type': 'base',
                         'type': 'running',
@@ -564,6 +552,7 @@ def get_stats_json():
                                 'url': None,
                             },
                         ],
+                        'splits': [],
                         'training_id': None,
                         'training_type': 'base',
                         'type': 'running',
@@ -592,6 +581,7 @@ def get_stats_json():
                                 'url': None,
                             },
                         ],
+                        'splits': [],
                         'training_id': None,
                         'training_type': 'base',
                         'type': 'running',
@@ -600,6 +590,7 @@ def get_stats_json():
                         'year_id': 1,
                     },
                 ],
+                'activity_count': 3,
                 'activity_type': 'running',
                 'total_distance': 30.0,
                 'total_time': 9000,
@@ -628,6 +619,7 @@ def get_stats_json():
                                 'url': None,
                             },
                         ],
+                        'splits': [],
                         'training_id': None,
                         'training_type': 'base',
                         'type': 'running',
@@ -636,6 +628,7 @@ def get_stats_json():
                         'year_id': 2,
                     },
                 ],
+                'activity_count': 1,
                 'activity_type': 'running',
                 'total_distance': 10.0,
                 'total_time': 3000,
@@ -0,0 +1,115 @@
+from datetime import date
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+import models
+from definitions import TrackingType
+
+
+def main_results(user_id: int, activity_type: str | None = None, date_from: date | None = None,
+                 date_to: date | None = None):
+    """Subquery with one row per activity holding its main result.
+
+    Mirrors utils.get_main_result: the (last) personal result, else the (last) official result, else the first
+    result. Activities without results are kept with a NULL distance and time. The optional dates select the
+    half-open range [date_from, date_to).
+    """
+    tracking_type = models.Result.tracking_type
+    rank = func.row_number().over(
+        partition_by=models.Activity.id,
+        order_by=(
+            case((tracking_type == TrackingType.personal.value, 0),
+                 (tracking_type == TrackingType.official.value, 1), else_=2),
+            case((tracking_type.in_([TrackingType.personal.value, TrackingType.official.value]), -models.Result.id),
+                 else_=models.Result.id),
+        ),
+    )
+    ranked = select(
+        models.Activity.id.label("activity_id"),
+        models.Activity.type,
+        models.Activity.date,
+        models.Activity.distance_tag,
+        models.Activity.month_id,
+        models.Activity.year_id,
+        models.Result.distance,
+        models.Result.time,
+        models.Result.pace,
+        rank.label("rank"),
+    ).outerjoin(models.Result, models.Result.activity_id == models.Activity.id) \
+        .where(models.Activity.user_id == user_id)
+    if activity_type is not None:
+        ranked = ranked.where(models.Activity.type == activity_type)
+    if date_from is not None:
+        ranked = ranked.where(models.Activity.date >= date_from.isoformat())
+    if date_to is not None:
+        ranked = ranked.where(models.Activity.date < date_to.isoformat())
+    ranked = ranked.subquery()
+
+    return select(ranked).where(ranked.c.rank == 1).subquery()
+
+
+def effort_paces(user_id: int, activity_type: str, distance_tag: str):
+    """Subquery with the pace used to rank each tagged activity as a best effort.
+
+    Mirrors utils.sort_on_pace: the (last) official result, else the (last) personal result. Activities with
+    neither are left out.
+    """
+    tracking_type = models.Result.tracking_type
+    rank = func.row_number().over(
+        partition_by=models.Activity.id,
+        order_by=(case((tracking_type == TrackingType.official.value, 0), else_=1), -models.Result.id),
+    )
+    ranked = select(
+        models.Activity.id.label("activity_id"),
+        models.Result.pace,
+        rank.label("rank"),
+    ).join(models.Result, models.Result.activity_id == models.Activity.id) \
+        .where(models.Activity.user_id == user_id, models.Activity.type == activity_type,
+               models.Activity.distance_tag == distance_tag,
+               tracking_type.in_([TrackingType.official.value, TrackingType.personal.value])) \
+        .subquery()
+
+    return select(ranked.c.activity_id, ranked.c.pace).where(ranked.c.rank == 1).subquery()
+
+
+def aggregate_rollups(db: Session, user_id: int, activity_type: str | None = None):
+    """Compute monthly and yearly totals in a single grouped query.
+
+    Only rebuild_rollups uses this; requests read the totals stored on the buckets. Returns two dicts, keyed by
+    month_id and year_id, of (total_distance, total_time, activity_count).
+    """
+    results = main_results(user_id, activity_type)
+    rows = db.execute(
+        select(
+            results.c.month_id,
+            results.c.year_id,
+            func.coalesce(func.sum(results.c.distance), 0.0),
+            func.coalesce(func.sum(results.c.time), 0),
+            func.count(results.c.activity_id),
+        ).group_by(results.c.month_id, results.c.year_id)
+    )
+
+    monthly, yearly = {}, {}
+    for month_id, year_id, distance, time, count in rows:
+        monthly[month_id] = (distance, time, count)
+        total_distance, total_time, total_count = yearly.get(year_id, (0.0, 0, 0))
+        yearly[year_id] = (total_distance + distance, total_time + time, total_count + count)
+
+    return monthly, yearly
+
+
+def aggregate_days(db: Session, user_id: int, activity_type: str | None, date_from: date, date_to: date):
+    """Totals per day in [date_from, date_to) as (date, total_distance, total_time, activity_count) rows.
+
+    Passing no activity type sums all activity types.
+    """
+    results = main_results(user_id, activity_type, date_from, date_to)
+    return db.execute(
+        select(
+            results.c.date,
+            func.coalesce(func.sum(results.c.distance), 0.0),
+            func.coalesce(func.sum(results.c.time), 0),
+            func.count(results.c.activity_id),
+        ).group_by(results.c.date).order_by(results.c.date)
+    ).all()
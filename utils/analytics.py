@@ -0,0 +1,77 @@
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from utils.aggregation import main_results
+
+
+def load_results(db: Session, user_id: int, activity_type: str):
+    """Load the main result of every activity into columnar arrays, ordered by date, with a single query."""
+    results = main_results(user_id, activity_type)
+    rows = db.execute(
+        select(results.c.date, results.c.distance, results.c.time, results.c.distance_tag)
+        .where(results.c.distance.is_not(None))
+        .order_by(results.c.date, results.c.activity_id)
+    ).all()
+
+    dates, distances, times, tags = zip(*rows) if rows else ((), (), (), ())
+    return (
+        np.array(dates, dtype="datetime64[D]"),
+        np.array(distances, dtype=np.float64),
+        np.array(times, dtype=np.float64),
+        np.array(tags, dtype=object),
+    )
+
+
+def rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    cumsum = np.cumsum(values, dtype=np.float64)
+    shifted = np.concatenate((np.zeros(window), cumsum))[:len(values)]
+    return cumsum - shifted
+
+
+def moving_average(values: np.ndarray, window: int) -> np.ndarray:
+    counts = np.minimum(np.arange(1, len(values) + 1), window)
+    return rolling_sum(values, window) / counts
+
+
+def get_volume(dates: np.ndarray, distances: np.ndarray):
+    if not len(dates):
+        return {'dates': [], 'volume_7d': [], 'volume_28d': []}
+
+    offsets = (dates - dates[0]).astype(np.int64)
+    daily = np.bincount(offsets, weights=distances, minlength=offsets[-1] + 1)
+    return {
+        'dates': (dates[0] + np.arange(len(daily))).tolist(),
+        'volume_7d': rolling_sum(daily, 7).tolist(),
+        'volume_28d': rolling_sum(daily, 28).tolist(),
+    }
+
+
+def get_pace_series(dates: np.ndarray, distances: np.ndarray, times: np.ndarray, window: int):
+    pace = times / distances
+    days = (dates - dates[0]).astype(np.float64) if len(dates) else np.zeros(0)
+    trend = float(np.polyfit(days, pace, 1)[0]) if len(np.unique(days)) > 1 else None
+    return {
+        'dates': dates.tolist(),
+        'pace': pace.tolist(),
+        'speed': (distances * 3600 / times).tolist(),
+        'moving_average_pace': moving_average(pace, window).tolist(),
+        'trend': trend,
+    }
+
+
+def get_trends(db: Session, user_id: int, activity_type: str, window: int = 5):
+    """Rolling 7/28-day volume, and pace/speed series with a moving average and linear trend per distance tag.
+
+    The "all" entry of paces holds every activity regardless of its distance tag; trend is the slope of the
+    fitted pace in seconds per km per day.
+    """
+    dates, distances, times, tags = load_results(db, user_id, activity_type)
+    valid = (distances > 0) & (times > 0)
+
+    paces = {'all': get_pace_series(dates[valid], distances[valid], times[valid], window)}
+    for tag in sorted({tag for tag in tags[valid] if tag}):
+        selected = valid & (tags == tag)
+        paces[tag] = get_pace_series(dates[selected], distances[selected], times[selected], window)
+
+    return {'volume': get_volume(dates, distances), 'paces': paces}
@@ -0,0 +1,113 @@
+import os
+from collections import OrderedDict
+from threading import Lock
+from weakref import WeakKeyDictionary
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class LRUCache:
+    """Thread-safe, size-bounded LRU cache with hit/miss counters.
+
+    Keys are tuples; invalidate() drops every key starting with the given prefix, so entries keyed by
+    (user_id, ...) can be dropped for a whole user at once.
+
+    Every invalidate() also bumps the generation of the key's first element. A reader takes generation() before
+    its query and passes it to set(), so a value read before a concurrent write is not stored after the write has
+    invalidated the cache.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._epoch = 0
+        self._lock = Lock()
+
+    def get(self, key: tuple):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def generation(self, owner) -> tuple[int, int]:
+        with self._lock:
+            return self._epoch, self._generations.get(owner, 0)
+
+    def set(self, key: tuple, value, generation: tuple[int, int] | None = None) -> bool:
+        with self._lock:
+            if generation is not None and generation != (self._epoch, self._generations.get(key[0], 0)):
+                return False
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            return True
+
+    def invalidate(self, *prefix):
+        with self._lock:
+            if prefix:
+                self._generations[prefix[0]] = self._generations.get(prefix[0], 0) + 1
+            else:
+                self._epoch += 1
+            for key in [key for key in self._entries if key[:len(prefix)] == prefix]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
+
+
+stats_cache = LRUCache(maxsize=256)
+prediction_cache = LRUCache(maxsize=256)
+
+
+_bucket_caches = {}
+_memory_bucket_caches = WeakKeyDictionary()
+_bucket_caches_lock = Lock()
+
+
+def get_bucket_cache(db: Session) -> LRUCache:
+    """Monthly/yearly bucket ids keyed by (user_id, table, activity_type, period), one cache per database.
+
+    Every engine on the same database file (the sync and async, read and write engines) shares the cache, so an
+    invalidation through one engine is seen by all of them. In-memory databases get one cache per engine.
+    """
+    bind = db.get_bind()
+    database = bind.url.database
+    with _bucket_caches_lock:
+        if not database or database == ":memory:":
+            return _memory_bucket_caches.setdefault(bind, LRUCache(maxsize=4096))
+        return _bucket_caches.setdefault(os.path.abspath(database), LRUCache(maxsize=4096))
+
+
+def get_pending_buckets(db: Session) -> dict:
+    """Bucket ids resolved in the current transaction; they only reach the shared cache once it commits."""
+    return db.info.setdefault("pending_buckets", {})
+
+
+@event.listens_for(Session, "after_commit")
+def promote_pending_buckets(db: Session):
+    pending = db.info.pop("pending_buckets", None)
+    if pending:
+        cache = get_bucket_cache(db)
+        for key, bucket_id in pending.items():
+            cache.set(key, bucket_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_pending_buckets(db: Session):
+    db.info.pop("pending_buckets", None)
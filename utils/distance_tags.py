@@ -0,0 +1,69 @@
+from bisect import bisect_right
+
+from definitions import ActivityType, DistanceTagRunning, DistanceTagSwimming
+
+# A distance counts as a canonical distance when it is within 1/25th (4%) of it.
+MARGIN_RATIO = 1 / 25
+
+
+class DistanceTagTable:
+    """Canonical distances (km) of one activity type with their tolerance windows, sorted for bisection.
+
+    Tables are immutable; add() returns an extended copy, so a table can be swapped in DISTANCE_TAG_TABLES while
+    other threads are classifying with the old one.
+    """
+
+    def __init__(self, distances: dict[str, float], margin_ratio: float = MARGIN_RATIO):
+        self.distances = dict(sorted(distances.items(), key=lambda item: item[1]))
+        self.margin_ratio = margin_ratio
+        self.lows, self.highs, self.tags = [], [], []
+        for tag, distance in self.distances.items():
+            low, high = distance - distance * margin_ratio, distance + distance * margin_ratio
+            if self.highs and low <= self.highs[-1]:
+                raise ValueError(f"Distance tag {tag} overlaps with {self.tags[-1]}")
+            self.lows.append(low)
+            self.highs.append(high)
+            self.tags.append(tag)
+
+    def classify(self, distance: float) -> str | None:
+        index = bisect_right(self.lows, distance) - 1
+        if index >= 0 and distance <= self.highs[index]:
+            return self.tags[index]
+        return None
+
+    def add(self, tag: str, distance: float) -> "DistanceTagTable":
+        return DistanceTagTable({**self.distances, tag: distance}, self.margin_ratio)
+
+
+DISTANCE_TAG_TABLES = {
+    ActivityType.running: DistanceTagTable({
+        DistanceTagRunning.tag_5k_running.value: 5.0,
+        DistanceTagRunning.tag_10k_running.value: 10.0,
+        DistanceTagRunning.tag_15k_running.value: 15.0,
+        DistanceTagRunning.tag_21k_running.value: 21.1,
+        DistanceTagRunning.tag_30k_running.value: 30.0,
+        DistanceTagRunning.tag_42k_running.value: 42.2,
+    }),
+    ActivityType.swimming: DistanceTagTable({
+        DistanceTagSwimming.tag_250_swimming.value: 0.250,
+        DistanceTagSwimming.tag_500_swimming.value: 0.500,
+        DistanceTagSwimming.tag_1000_swimming.value: 1.0,
+        DistanceTagSwimming.tag_1500_swimming.value: 1.5,
+        DistanceTagSwimming.tag_2000_swimming.value: 2.0,
+    }),
+}
+
+
+def get_distance_tags(activity_type: str) -> list[str]:
+    table = DISTANCE_TAG_TABLES.get(activity_type)
+    return list(table.tags) if table else []
+
+
+def classify_distance(distance: float, activity_type: str) -> str | None:
+    table = DISTANCE_TAG_TABLES.get(activity_type)
+    return table.classify(distance) if table else None
+
+
+def register_distance_tag(activity_type: ActivityType, tag: str, distance: float):
+    """Add a canonical distance, e.g. a mile; existing rows are reclassified by crud.retag_distances."""
+    DISTANCE_TAG_TABLES[activity_type] = DISTANCE_TAG_TABLES[activity_type].add(tag, distance)
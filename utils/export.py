@@ -0,0 +1,71 @@
+import csv
+import io
+import json
+from typing import Iterator
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import models
+from schemas.results import decode_splits
+
+EXPORT_BATCH_SIZE = 500
+
+EXPORT_COLUMNS = {
+    "activity": (models.Activity, ("id", "name", "type", "description", "date", "distance_tag", "environment",
+                                   "training_type", "race_type", "with_friends", "event_id", "training_id",
+                                   "splits")),
+    "result": (models.Result, ("id", "activity_id", "distance", "time", "tracking_type", "pace", "speed",
+                               "distance_tag", "url")),
+    "event": (models.Event, ("id", "name", "type", "description", "date", "environment", "race_type", "distance",
+                             "distance_tag", "training_id")),
+    "untraceable": (models.Untraceable, ("id", "name", "description", "dates")),
+}
+CSV_COLUMNS = ["kind", *dict.fromkeys(column for _, columns in EXPORT_COLUMNS.values() for column in columns)]
+
+
+def export_statement(kind: str, user_id: int):
+    model, columns = EXPORT_COLUMNS[kind]
+    statement = select(*(getattr(model, column) for column in columns))
+    if model is models.Result:
+        statement = statement.join(models.Result.activity).where(models.Activity.user_id == user_id)
+    else:
+        statement = statement.where(model.user_id == user_id)
+    return statement.order_by(model.id)
+
+
+def iter_export_batches(db: Session, user_id: int) -> Iterator[tuple[str, tuple[str, ...], list]]:
+    """Yield (kind, columns, rows) batches of a user's history, fetching EXPORT_BATCH_SIZE rows at a time."""
+    for kind, (_, columns) in EXPORT_COLUMNS.items():
+        rows = db.execute(export_statement(kind, user_id).execution_options(yield_per=EXPORT_BATCH_SIZE))
+        splits_index = columns.index("splits") if "splits" in columns else None
+        for batch in rows.partitions():
+            if splits_index is not None:
+                batch = [(*row[:splits_index], [split.model_dump() for split in decode_splits(row[splits_index])],
+                          *row[splits_index + 1:]) for row in batch]
+            yield kind, columns, batch
+
+
+def iter_ndjson(batches) -> Iterator[str]:
+    for kind, columns, rows in batches:
+        yield "".join(json.dumps({"kind": kind, **dict(zip(columns, row))}) + "\n" for row in rows)
+
+
+def iter_csv(batches) -> Iterator[str]:
+    """One table for every kind of record; columns a kind does not have are left empty."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS)
+    writer.writeheader()
+    for kind, columns, rows in batches:
+        for row in rows:
+            writer.writerow({"kind": kind, **{column: json.dumps(value) if isinstance(value, list) else value
+                                               for column, value in zip(columns, row)}})
+        yield flush_buffer(buffer)
+    yield flush_buffer(buffer)
+
+
+def flush_buffer(buffer: io.StringIO) -> str:
+    value = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return value
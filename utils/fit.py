@@ -0,0 +1,201 @@
+import struct
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+from definitions import ActivityType, Pool
+from utils.tracks import TrackSummary
+
+FIT_EPOCH = datetime(1989, 12, 31, tzinfo=timezone.utc)
+FIT_SIGNATURE = b".FIT"
+FILE_HEADER = struct.Struct("<BBHI4s")
+
+SESSION, LAP, RECORD, LENGTH = 18, 19, 20, 101
+TIMESTAMP = 253
+
+# Field numbers read per global message number; every other message and field is skipped without decoding.
+MESSAGE_FIELDS = {
+    SESSION: (TIMESTAMP, 2, 5, 8, 9, 44),  # timestamp, start_time, sport, total_timer_time, total_distance, pool_length
+    LAP: (TIMESTAMP, 8, 9),  # timestamp, total_timer_time, total_distance
+    RECORD: (TIMESTAMP, 5),  # timestamp, distance
+    LENGTH: (TIMESTAMP, 4, 12),  # timestamp, total_timer_time, length_type
+}
+
+# Struct code and invalid value per base type number.
+BASE_TYPES = {
+    0x00: ("B", 0xFF),  # enum
+    0x01: ("b", 0x7F),  # sint8
+    0x02: ("B", 0xFF),  # uint8
+    0x03: ("h", 0x7FFF),  # sint16
+    0x04: ("H", 0xFFFF),  # uint16
+    0x05: ("i", 0x7FFFFFFF),  # sint32
+    0x06: ("I", 0xFFFFFFFF),  # uint32
+    0x0A: ("B", 0x00),  # uint8z
+    0x0B: ("H", 0x0000),  # uint16z
+    0x0C: ("I", 0x00000000),  # uint32z
+}
+
+SPORTS = {1: ActivityType.running, 5: ActivityType.swimming}
+POOLS = {2500: Pool.pool_25m, 5000: Pool.pool_50m}
+ACTIVE_LENGTH = 1
+
+
+@dataclass(slots=True)
+class Definition:
+    message: int
+    layout: struct.Struct
+    positions: tuple[int | None, ...]
+    invalid: tuple[int, ...]
+
+
+@dataclass(slots=True)
+class FitActivity:
+    sport: ActivityType | None = None
+    start: int | None = None
+    distance: int | None = None
+    timer_time: int | None = None
+    pool_length: int | None = None
+    active_lengths: int = 0
+    first_timestamp: int | None = None
+    last_timestamp: int | None = None
+    last_record_distance: int | None = None
+    laps: list[tuple[int, int]] = field(default_factory=list)
+
+
+def is_fit(header: bytes) -> bool:
+    return len(header) >= 12 and header[8:12] == FIT_SIGNATURE
+
+
+def compile_definition(view: memoryview, offset: int, developer_data: bool) -> tuple[Definition, int]:
+    """Read a definition message and compile it into one struct that unpacks only the wanted fields.
+
+    Returns the definition and the offset right after it; messages of no interest compile to padding only.
+    """
+    byte_order = ">" if view[offset + 1] else "<"
+    message, field_count = struct.unpack_from(byte_order + "HB", view, offset + 2)
+    offset += 5
+
+    wanted = MESSAGE_FIELDS.get(message, ())
+    layout, positions, invalid = [byte_order], dict.fromkeys(wanted), []
+    for number, size, base_type in struct.iter_unpack("BBB", view[offset:offset + 3 * field_count]):
+        code, invalid_value = BASE_TYPES.get(base_type & 0x1F, (None, None))
+        if number in positions and code and struct.calcsize(code) == size:
+            positions[number] = len(invalid)
+            invalid.append(invalid_value)
+            layout.append(code)
+        else:
+            layout.append(f"{size}x")
+    offset += 3 * field_count
+
+    if developer_data:
+        developer_count = view[offset]
+        layout.extend(f"{size}x" for _, size, _ in
+                      struct.iter_unpack("BBB", view[offset + 1:offset + 1 + 3 * developer_count]))
+        offset += 1 + 3 * developer_count
+
+    return Definition(message, struct.Struct("".join(layout)), tuple(positions.values()), tuple(invalid)), offset
+
+
+def read_field(values: tuple, definition: Definition, index: int):
+    position = definition.positions[index]
+    if position is None or values[position] == definition.invalid[position]:
+        return None
+    return values[position]
+
+
+def apply_message(activity: FitActivity, definition: Definition, values: tuple, timestamp: int | None):
+    message = definition.message
+    if message == RECORD:
+        distance = read_field(values, definition, 1)
+        if distance is not None:
+            activity.last_record_distance = distance
+    elif message == LAP:
+        timer_time, distance = read_field(values, definition, 1), read_field(values, definition, 2)
+        if timer_time is not None and distance is not None:
+            activity.laps.append((distance, timer_time))
+    elif message == LENGTH:
+        if read_field(values, definition, 2) == ACTIVE_LENGTH:
+            activity.active_lengths += 1
+    elif message == SESSION:
+        activity.start = read_field(values, definition, 1) or activity.start
+        activity.sport = SPORTS.get(read_field(values, definition, 2), activity.sport)
+        activity.timer_time = read_field(values, definition, 3)
+        activity.distance = read_field(values, definition, 4)
+        activity.pool_length = read_field(values, definition, 5)
+
+    if timestamp is not None:
+        if activity.first_timestamp is None:
+            activity.first_timestamp = timestamp
+        activity.last_timestamp = timestamp
+
+
+def decode_fit(data: bytes) -> FitActivity:
+    """Decode the session, laps, pool lengths and records of a FIT file.
+
+    Messages are unpacked in place from a memoryview of the file with one precompiled struct per definition, so
+    no per-message objects are built besides the tuple of wanted values.
+    """
+    view = memoryview(data)
+    try:
+        header_size, _, _, data_size, signature = FILE_HEADER.unpack_from(view)
+    except struct.error:
+        raise ValueError("Not a FIT file")
+    if signature != FIT_SIGNATURE:
+        raise ValueError("Not a FIT file")
+
+    activity = FitActivity()
+    definitions: dict[int, Definition] = {}
+    offset, end = header_size, min(header_size + data_size, len(view))
+    try:
+        while offset < end:
+            record_header = view[offset]
+            offset += 1
+            if record_header & 0x80:
+                # Compressed timestamp header: a 5 bit offset from the last full timestamp.
+                local_type = (record_header >> 5) & 0x03
+                time_offset, last_timestamp = record_header & 0x1F, activity.last_timestamp or 0
+                timestamp = (last_timestamp & ~0x1F) + time_offset
+                if time_offset < last_timestamp & 0x1F:
+                    timestamp += 0x20
+            elif record_header & 0x40:
+                definitions[record_header & 0x0F], offset = compile_definition(view, offset, bool(record_header & 0x20))
+                continue
+            else:
+                local_type = record_header & 0x0F
+                timestamp = None
+
+            definition = definitions[local_type]
+            values = definition.layout.unpack_from(view, offset)
+            offset += definition.layout.size
+            if definition.message not in MESSAGE_FIELDS:
+                continue
+            if not record_header & 0x80:
+                timestamp = read_field(values, definition, 0)
+            apply_message(activity, definition, values, timestamp)
+    except (KeyError, IndexError, struct.error):
+        raise ValueError("Truncated or corrupt FIT file")
+
+    return activity
+
+
+def summarize_fit(activity: FitActivity) -> TrackSummary:
+    """Convert decoded FIT values to the units of a track summary, falling back to the records when a file has
+    no session message and to the pool lengths when a swim has no distance.
+    """
+    start = activity.start or activity.first_timestamp
+    timer_time = activity.timer_time
+    if timer_time is None and activity.first_timestamp is not None:
+        timer_time = (activity.last_timestamp - activity.first_timestamp) * 1000
+    distance = activity.distance or activity.last_record_distance
+    if not distance and activity.pool_length:
+        distance = activity.active_lengths * activity.pool_length
+    if start is None or not timer_time or not distance:
+        raise ValueError("FIT file has no timed movement")
+
+    return TrackSummary(
+        start=FIT_EPOCH + timedelta(seconds=start),
+        distance=round(distance / 100000, 3),
+        time=round(timer_time / 1000),
+        splits=[(round(lap_distance / 100000, 3), round(lap_time / 1000)) for lap_distance, lap_time in activity.laps],
+        activity_type=activity.sport,
+        pool=POOLS.get(activity.pool_length) if activity.sport is ActivityType.swimming else None,
+    )
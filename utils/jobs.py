@@ -0,0 +1,174 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from threading import Condition, Timer
+from typing import Callable
+
+from sqlalchemy.orm import Session
+
+import crud
+import models
+from database import SessionLocal
+from definitions import ActivityType, JobKind, JobStatus
+from schemas.stats import Stats, StatsSummary
+from utils.cache import stats_cache
+
+logger = logging.getLogger(__name__)
+
+RETRY_DELAY = 5.0
+
+
+def now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def run_rebuild(db: Session, job: models.Job, report: Callable[[float], None]):
+    crud.rebuild_rollups(db=db, user_id=job.user_id)
+    report(1 / 3)
+    crud.rebuild_training_load(db=db, user_id=job.user_id)
+    report(2 / 3)
+    return crud.rebuild_best_efforts(db=db, user_id=job.user_id)
+
+
+def run_retag(db: Session, job: models.Job, report: Callable[[float], None]):
+    return crud.retag_distances(db=db)
+
+
+def run_import(db: Session, job: models.Job, report: Callable[[float], None]):
+    return crud.import_activities(db=db, activities=job.payload, user_id=job.user_id)
+
+
+def run_warm_cache(db: Session, job: models.Job, report: Callable[[float], None]):
+    activity_types = list(ActivityType)
+    for index, activity_type in enumerate(activity_types):
+        generation = stats_cache.generation(job.user_id)
+        stats_cache.set((job.user_id, activity_type.value), Stats.model_validate(
+            crud.get_stats(db=db, user_id=job.user_id, activity_type=activity_type.value), from_attributes=True),
+            generation)
+        stats_cache.set((job.user_id, activity_type.value, "summary"), StatsSummary.model_validate(
+            crud.get_stats_summary(db=db, user_id=job.user_id, activity_type=activity_type.value)), generation)
+        db.commit()
+        report((index + 1) / len(activity_types))
+    return {"ok": True}
+
+
+# Progress is written and committed through the job's own session, which holds the single writer connection, so a
+# handler may call report() only between its own commits and must not leave a read transaction open around it.
+JOB_HANDLERS = {
+    JobKind.rebuild: run_rebuild,
+    JobKind.retag: run_retag,
+    JobKind.import_activities: run_import,
+    JobKind.warm_cache: run_warm_cache,
+}
+
+
+class JobRunner:
+    """Runs persisted jobs on a thread pool next to the app, off the request path.
+
+    The jobs table is the queue: start() picks up jobs that were queued or interrupted by a restart, and a failing
+    job is queued again after RETRY_DELAY * attempts seconds until it has used max_attempts.
+    """
+
+    def __init__(self, session_factory=SessionLocal, max_workers: int = 2, retry_delay: float = RETRY_DELAY):
+        self.session_factory = session_factory
+        self.max_workers = max_workers
+        self.retry_delay = retry_delay
+        self._executor = None
+        self._pending = 0
+        self._condition = Condition()
+
+    def start(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+        with self.session_factory() as db:
+            db.query(models.Job).filter(models.Job.status == JobStatus.running) \
+                .update({models.Job.status: JobStatus.queued})
+            db.commit()
+            job_ids = [job_id for job_id, in db.query(models.Job.id)
+                       .filter(models.Job.status == JobStatus.queued).order_by(models.Job.id)]
+        for job_id in job_ids:
+            self.submit(job_id)
+
+    def shutdown(self, wait: bool = True):
+        if self._executor:
+            self._executor.shutdown(wait=wait, cancel_futures=not wait)
+            self._executor = None
+
+    def submit(self, job_id: int):
+        """Queue a job for execution; before start() it stays queued in the table and runs once started."""
+        if self._executor is None:
+            return
+        with self._condition:
+            self._pending += 1
+        self._executor.submit(self._run, job_id)
+
+    def join(self, timeout: float | None = None) -> bool:
+        """Wait until every submitted job, including scheduled retries, has finished."""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._pending == 0, timeout)
+
+    def _done(self):
+        with self._condition:
+            self._pending -= 1
+            self._condition.notify_all()
+
+    def _retry_later(self, job_id: int, delay: float):
+        with self._condition:
+            self._pending += 1
+        timer = Timer(delay, self._resubmit, (job_id,))
+        timer.daemon = True
+        timer.start()
+
+    def _resubmit(self, job_id: int):
+        try:
+            self.submit(job_id)
+        finally:
+            self._done()
+
+    @staticmethod
+    def _report(db: Session, job_id: int, progress: float):
+        db.query(models.Job).filter(models.Job.id == job_id).update({models.Job.progress: progress})
+        db.commit()
+
+    def _run(self, job_id: int):
+        try:
+            self._execute(job_id)
+        except Exception:
+            logger.exception("Job %s could not be run", job_id)
+        finally:
+            self._done()
+
+    def _execute(self, job_id: int):
+        with self.session_factory() as db:
+            job = db.get(models.Job, job_id)
+            if job is None or job.status != JobStatus.queued:
+                return
+            job.status, job.attempts, job.started_at, job.error = JobStatus.running, job.attempts + 1, now(), None
+            db.commit()
+
+            try:
+                result = JOB_HANDLERS[JobKind(job.kind)](db, job, lambda progress: self._report(db, job_id, progress))
+            except Exception as error:
+                logger.exception("Job %s failed on attempt %s", job_id, job.attempts)
+                db.rollback()
+                job = db.get(models.Job, job_id)
+                job.error = f"{type(error).__name__}: {error}"
+                retry = job.attempts < job.max_attempts
+                if retry:
+                    job.status = JobStatus.queued
+                else:
+                    job.status, job.finished_at = JobStatus.failed, now()
+                db.commit()
+                if retry:
+                    self._retry_later(job_id, self.retry_delay * job.attempts)
+                return
+
+            db.refresh(job)
+            job.status, job.progress, job.result, job.finished_at = JobStatus.succeeded, 1.0, result, now()
+            db.commit()
+
+
+job_runner = JobRunner()
+
+
+def get_job_runner() -> JobRunner:
+    return job_runner
@@ -0,0 +1,74 @@
+from datetime import date
+from math import exp
+
+import numpy as np
+from sqlalchemy.orm import Session, selectinload
+
+import models
+from utils.cache import prediction_cache
+from utils.utils import calculate_pace, get_effort_result
+
+RIEGEL_EXPONENT = 1.06
+MIN_EXPONENT, MAX_EXPONENT = 1.0, 1.2
+RECENT_DAYS = 365
+
+
+def fit_curve(efforts: list[tuple[date, float, int]]):
+    """Fit time = coefficient * distance ** exponent through the best efforts.
+
+    Only efforts within RECENT_DAYS of the latest one are used. With a single distance the Riegel exponent is used
+    and the curve goes through the fastest effort.
+    """
+    latest = max(day for day, _, _ in efforts)
+    recent = [(distance, time) for day, distance, time in efforts if (latest - day).days <= RECENT_DAYS]
+    distances = np.log([distance for distance, _ in recent])
+    times = np.log([time for _, time in recent])
+
+    if len(np.unique(distances)) > 1:
+        exponent = float(np.clip(np.polyfit(distances, times, 1)[0], MIN_EXPONENT, MAX_EXPONENT))
+        coefficient = exp(float(np.mean(times - exponent * distances)))
+    else:
+        exponent = RIEGEL_EXPONENT
+        coefficient = exp(float(np.min(times - exponent * distances)))
+    return coefficient, exponent
+
+
+def get_curve(db: Session, user_id: int, activity_type: str):
+    """Cached fit per user and activity type; crud invalidates it whenever the best-efforts set changes."""
+    curve = prediction_cache.get((user_id, activity_type))
+    if curve is None:
+        generation = prediction_cache.generation(user_id)
+        activities = db.query(models.Activity).join(models.Activity.best_effort) \
+            .options(selectinload(models.Activity.results)) \
+            .filter(models.BestEffort.user_id == user_id, models.BestEffort.activity_type == activity_type)
+        efforts = []
+        for activity in activities:
+            effort_result = get_effort_result(activity)
+            efforts.append((date.fromisoformat(str(activity.date)), effort_result.distance, effort_result.time))
+        curve = fit_curve(efforts) if efforts else ()
+        prediction_cache.set((user_id, activity_type), curve, generation)
+    return curve
+
+
+def attach_predictions(db: Session, events: list[models.Event]):
+    """Set a prediction on every upcoming event, fitting at most one curve per user and activity type.
+
+    Events stored without a positive distance, which the API no longer accepts, get no prediction.
+    """
+    today = date.today()
+    for event in events:
+        event.prediction = None
+        if date.fromisoformat(str(event.date)) < today or event.distance <= 0:
+            continue
+        curve = get_curve(db, event.user_id, event.type)
+        if not curve:
+            continue
+
+        coefficient, exponent = curve
+        time = round(coefficient * event.distance ** exponent)
+        event.prediction = {
+            'time': time,
+            'pace': calculate_pace(time, event.distance),
+            'goal_difference': time - event.goal.time if event.goal else None,
+        }
+    return events
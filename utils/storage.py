@@ -0,0 +1,142 @@
+import logging
+import os
+from dataclasses import dataclass, fields
+from threading import Event, Lock, Thread
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+ENV_PREFIX = "HOMERUN_SQLITE_"
+REPORTED_PRAGMAS = ("journal_mode", "synchronous", "cache_size", "mmap_size", "busy_timeout", "temp_store",
+                    "wal_autocheckpoint")
+CHECKPOINT_MODES = ("PASSIVE", "FULL", "RESTART", "TRUNCATE")
+
+
+@dataclass(frozen=True)
+class StorageProfile:
+    """Pragmas applied to every pooled SQLite connection, plus the checkpoint policy of the WAL.
+
+    Every field can be overridden with a HOMERUN_SQLITE_<FIELD> environment variable.
+    """
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    cache_size: int = -64000  # negative values are KiB, so 64 MB
+    mmap_size: int = 256 * 1024 * 1024
+    busy_timeout: int = 5000  # ms
+    temp_store: str = "MEMORY"
+    wal_autocheckpoint: int = 1000  # pages
+    checkpoint_interval: float = 300.0  # seconds between passive checkpoints
+    wal_size_limit: int = 64 * 1024 * 1024  # bytes of WAL after which a truncating checkpoint runs
+
+    @classmethod
+    def from_env(cls, environ=os.environ) -> "StorageProfile":
+        overrides = {}
+        for field in fields(cls):
+            value = environ.get(ENV_PREFIX + field.name.upper())
+            if value is not None:
+                overrides[field.name] = field.type(value)
+        return cls(**overrides)
+
+    def __post_init__(self):
+        for name, value in self.pragmas().items():
+            if not str(value).lstrip("-").isalnum():
+                raise ValueError(f"Invalid value {value!r} for PRAGMA {name}")
+
+    def pragmas(self) -> dict:
+        return {name: getattr(self, name) for name in REPORTED_PRAGMAS}
+
+
+def apply_storage_profile(engine: Engine, profile: StorageProfile):
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in profile.pragmas().items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+        finally:
+            cursor.close()
+
+
+def apply_read_only(engine: Engine):
+    """Make every connection of an engine refuse writes, so a read pool can never take the database's write lock."""
+    @event.listens_for(engine, "connect")
+    def set_query_only(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("PRAGMA query_only = ON")
+        finally:
+            cursor.close()
+
+
+def get_pragmas(connection) -> dict:
+    return {name: connection.exec_driver_sql(f"PRAGMA {name}").scalar() for name in REPORTED_PRAGMAS}
+
+
+def get_wal_size(engine: Engine) -> int | None:
+    database = engine.url.database
+    if not database or database == ":memory:":
+        return None
+    try:
+        return os.path.getsize(database + "-wal")
+    except OSError:
+        return 0
+
+
+def checkpoint(engine: Engine, mode: str = "PASSIVE") -> dict:
+    mode = mode.upper()
+    if mode not in CHECKPOINT_MODES:
+        raise ValueError(f"Unknown checkpoint mode {mode}")
+    with engine.connect() as connection:
+        busy, log, checkpointed = connection.exec_driver_sql(f"PRAGMA wal_checkpoint({mode})").one()
+    return {"mode": mode, "busy": bool(busy), "log_frames": log, "checkpointed_frames": checkpointed}
+
+
+class CheckpointPolicy:
+    """Runs a passive checkpoint every checkpoint_interval seconds, and a truncating one once the WAL has grown
+    past wal_size_limit, so long read transactions cannot make the WAL grow without bound.
+    """
+
+    def __init__(self, engine: Engine, profile: StorageProfile):
+        self.engine = engine
+        self.profile = profile
+        self.last_checkpoint = None
+        self._stop = Event()
+        self._thread = None
+        self._lock = Lock()
+
+    def run_once(self) -> dict:
+        with self._lock:
+            wal_size = get_wal_size(self.engine)
+            mode = "TRUNCATE" if wal_size and wal_size > self.profile.wal_size_limit else "PASSIVE"
+            self.last_checkpoint = checkpoint(self.engine, mode)
+            return self.last_checkpoint
+
+    def start(self):
+        if self._thread or self.profile.checkpoint_interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = Thread(target=self._loop, name="checkpoint", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.wait(self.profile.checkpoint_interval):
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("WAL checkpoint failed")
+
+    def info(self) -> dict:
+        return {
+            "wal_size": get_wal_size(self.engine),
+            "wal_size_limit": self.profile.wal_size_limit,
+            "checkpoint_interval": self.profile.checkpoint_interval,
+            "last_checkpoint": self.last_checkpoint,
+        }
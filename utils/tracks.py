@@ -0,0 +1,131 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from math import asin, cos, radians, sin, sqrt
+from typing import BinaryIO, Iterator
+from xml.etree.ElementTree import iterparse
+
+from definitions import ActivityType, Pool
+
+EARTH_RADIUS = 6371.0088
+MIN_MOVING_SPEED = 0.5 / 1000  # km/s
+SPLIT_DISTANCE = 1.0
+
+POINT_TAGS = {"trkpt", "Trackpoint"}
+CONTAINER_TAGS = {"trkseg", "Track"}
+
+
+@dataclass
+class TrackPoint:
+    time: datetime | None = None
+    latitude: float | None = None
+    longitude: float | None = None
+    distance: float | None = None
+
+
+@dataclass
+class TrackSummary:
+    start: datetime
+    distance: float
+    time: int
+    splits: list[tuple[float, int]] = field(default_factory=list)
+    activity_type: ActivityType | None = None
+    pool: Pool | None = None
+
+
+def local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def parse_time(text: str) -> datetime:
+    """Times without an offset are taken as UTC, as GPX and TCX prescribe, so that they compare with offset times."""
+    time = datetime.fromisoformat(text.strip())
+    return time if time.tzinfo else time.replace(tzinfo=timezone.utc)
+
+
+def iter_track_points(file: BinaryIO) -> Iterator[TrackPoint]:
+    """Yield the points of a GPX or TCX file without building the document tree.
+
+    Each point element is cleared from its track segment once read, so memory stays constant however long the
+    recording is.
+    """
+    container = None
+    point = None
+    for event, element in iterparse(file, events=("start", "end")):
+        tag = local_name(element.tag)
+        if event == "start":
+            if tag in CONTAINER_TAGS:
+                container = element
+            elif tag in POINT_TAGS:
+                point = TrackPoint()
+                if "lat" in element.attrib:
+                    point.latitude, point.longitude = float(element.attrib["lat"]), float(element.attrib["lon"])
+            continue
+
+        if point is None:
+            continue
+        if tag in ("time", "Time") and element.text:
+            point.time = parse_time(element.text)
+        elif tag == "LatitudeDegrees":
+            point.latitude = float(element.text)
+        elif tag == "LongitudeDegrees":
+            point.longitude = float(element.text)
+        elif tag == "DistanceMeters":
+            point.distance = float(element.text) / 1000
+        elif tag in POINT_TAGS:
+            yield point
+            point = None
+            if container is not None:
+                container.clear()
+
+
+def haversine(latitude_1: float, longitude_1: float, latitude_2: float, longitude_2: float) -> float:
+    latitude_1, longitude_1, latitude_2, longitude_2 = map(radians, (latitude_1, longitude_1, latitude_2, longitude_2))
+    a = sin((latitude_2 - latitude_1) / 2) ** 2 + \
+        cos(latitude_1) * cos(latitude_2) * sin((longitude_2 - longitude_1) / 2) ** 2
+    return 2 * EARTH_RADIUS * asin(sqrt(a))
+
+
+def summarize_track(points: Iterator[TrackPoint], split_distance: float = SPLIT_DISTANCE) -> TrackSummary:
+    """Distance (km), moving time (s) and per-split (distance, moving time) pairs of a stream of points.
+
+    Segments slower than MIN_MOVING_SPEED count as pauses. Distances recorded by the device are preferred over
+    distances computed from coordinates.
+    """
+    start = previous = None
+    distance = moving_time = 0.0
+    split_start_distance = split_start_time = 0.0
+    splits = []
+    for point in points:
+        if point.time is None:
+            continue
+        if previous is None:
+            start = previous = point
+            continue
+
+        if point.distance is not None and previous.distance is not None:
+            step = max(point.distance - previous.distance, 0.0)
+        elif None not in (point.latitude, previous.latitude):
+            step = haversine(previous.latitude, previous.longitude, point.latitude, point.longitude)
+        else:
+            step = 0.0
+        seconds = (point.time - previous.time).total_seconds()
+        moving = seconds > 0 and step / seconds >= MIN_MOVING_SPEED
+
+        while moving and distance + step >= split_start_distance + split_distance:
+            fraction = (split_start_distance + split_distance - distance) / step
+            split_time = moving_time + fraction * seconds
+            splits.append((split_distance, round(split_time - split_start_time)))
+            split_start_distance += split_distance
+            split_start_time = split_time
+
+        distance += step
+        if moving:
+            moving_time += seconds
+        previous = point
+
+    if start is None or moving_time <= 0:
+        raise ValueError("Track has no timed movement")
+    if distance - split_start_distance > 0.001:
+        splits.append((round(distance - split_start_distance, 3), round(moving_time - split_start_time)))
+
+    return TrackSummary(start=start.time, distance=round(distance, 3), time=round(moving_time), splits=splits)
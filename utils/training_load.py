@@ -0,0 +1,77 @@
+from datetime import date, timedelta
+from math import exp
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+import models
+from definitions import ActivityType
+from utils.aggregation import main_results
+from utils.utils import calculate_pace
+
+ACUTE_DAYS = 7
+CHRONIC_DAYS = 42
+
+# Pace (s/km) at which one minute of activity counts as one unit of load.
+REFERENCE_PACES = {
+    ActivityType.running: 300,
+    ActivityType.swimming: 1200,
+}
+
+
+def activity_load(time: int, distance: float, activity_type: str) -> float:
+    """Duration in minutes weighted by the squared intensity relative to the reference pace."""
+    intensity = REFERENCE_PACES[ActivityType(activity_type)] / calculate_pace(time, distance)
+    return time / 60 * intensity ** 2
+
+
+def daily_loads(db: Session, user_id: int, date_from: date):
+    results = main_results(user_id, date_from=date_from)
+    loads = {}
+    for day, activity_type, time, distance in db.execute(
+            select(results.c.date, results.c.type, results.c.time, results.c.distance)):
+        if distance and time:
+            day = date.fromisoformat(day)
+            loads[day] = loads.get(day, 0.0) + activity_load(time, distance, activity_type)
+    return loads
+
+
+def update_training_load(db: Session, user_id: int, date_from: date):
+    """Recompute the persisted daily series from date_from onwards.
+
+    The series runs without gaps from the first to the last activity of the user. Rows before date_from are
+    kept and seed the exponentially weighted averages, so appending an activity only computes the new days.
+    """
+    previous = db.query(models.TrainingLoad) \
+        .filter(models.TrainingLoad.user_id == user_id, models.TrainingLoad.date < date_from.isoformat()) \
+        .order_by(models.TrainingLoad.date.desc()).first()
+    if previous:
+        day = date.fromisoformat(previous.date) + timedelta(days=1)
+        acute, chronic = previous.acute, previous.chronic
+    else:
+        day = None
+        acute, chronic = 0.0, 0.0
+
+    db.query(models.TrainingLoad) \
+        .filter(models.TrainingLoad.user_id == user_id, models.TrainingLoad.date >= (day or date_from).isoformat()) \
+        .delete()
+
+    loads = daily_loads(db, user_id, day or date_from)
+    if not loads:
+        last_activity = db.query(func.max(models.Activity.date)).filter(models.Activity.user_id == user_id).scalar()
+        db.query(models.TrainingLoad) \
+            .filter(models.TrainingLoad.user_id == user_id, models.TrainingLoad.date > (last_activity or "")) \
+            .delete()
+        return
+    day, last_day = day or min(loads), max(loads)
+
+    acute_decay, chronic_decay = 1 - exp(-1 / ACUTE_DAYS), 1 - exp(-1 / CHRONIC_DAYS)
+    rows = []
+    while day <= last_day:
+        load = loads.get(day, 0.0)
+        acute += (load - acute) * acute_decay
+        chronic += (load - chronic) * chronic_decay
+        rows.append(models.TrainingLoad(user_id=user_id, date=day.isoformat(), load=load, acute=acute,
+                                        chronic=chronic, balance=chronic - acute))
+        day += timedelta(days=1)
+    db.add_all(rows)
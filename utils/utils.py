@@ -1,5 +1,6 @@
 from schemas.activities import ActivityType, Activity
-from schemas.results import DistanceTagRunning, DistanceTagSwimming, ResultBase, TrackingType, Goal
+from schemas.results import ResultBase, TrackingType, Goal
+from utils.distance_tags import classify_distance
 
 
 def calculate_pace(time: int, distance: float) -> int:
@@ -20,42 +21,33 @@ def get_activity_distance_tag(results: list[ResultBase], type: ActivityType):
 
 
 def get_distance_tag(distance: float, type: ActivityType):
-    if type is ActivityType.running:
-        if get_margin(5.0)[0] <= distance <= get_margin(5.0)[1]:
-            return DistanceTagRunning.tag_5k_running
-        if get_margin(10.0)[0] <= distance <= get_margin(10.0)[1]:
-            return DistanceTagRunning.tag_10k_running
-        if get_margin(15.0)[0] <= distance <= get_margin(15.0)[1]:
-            return DistanceTagRunning.tag_15k_running
-        if get_margin(21.1)[0] <= distance <= get_margin(21.1)[1]:
-            return DistanceTagRunning.tag_21k_running
-        if get_margin(30.0)[0] <= distance <= get_margin(30.0)[1]:
-            return DistanceTagRunning.tag_30k_running
-        if get_margin(42.2)[0] <= distance <= get_margin(42.2)[1]:
-            return DistanceTagRunning.tag_42k_running
-    elif type is ActivityType.swimming:
-        if get_margin(0.250)[0] <= distance <= get_margin(0.250)[1]:
-            return DistanceTagSwimming.tag_250_swimming
-        if get_margin(0.500)[0] <= distance <= get_margin(0.500)[1]:
-            return DistanceTagSwimming.tag_500_swimming
-        if get_margin(1.0)[0] <= distance <= get_margin(1.0)[1]:
-            return DistanceTagSwimming.tag_1000_swimming
-        if get_margin(1.5)[0] <= distance <= get_margin(1.5)[1]:
-            return DistanceTagSwimming.tag_1500_swimming
-        if get_margin(2.0)[0] <= distance <= get_margin(2.0)[1]:
-            return DistanceTagSwimming.tag_2000_swimming
-
-
-def get_margin(number: float):
-    return [number - number / 25, number + number / 25]
+    return classify_distance(distance, type)
 
 
 def sort_on_pace(activity: Activity):
+    effort_result = get_effort_result(activity)
+    if effort_result is not None:
+        return effort_result.pace
+
+
+def get_effort_result(activity: Activity):
     official_index, personal_index = get_official_and_personal_indices(activity)
     if official_index is not None:
-        return activity.results[official_index].pace
+        return activity.results[official_index]
     elif personal_index is not None:
-        return activity.results[personal_index].pace
+        return activity.results[personal_index]
+    return None
+
+
+def get_main_result(activity: Activity):
+    official_index, personal_index = get_official_and_personal_indices(activity)
+    if personal_index is not None:
+        return activity.results[personal_index]
+    elif official_index is not None:
+        return activity.results[official_index]
+    elif activity.results:
+        return activity.results[0]
+    return None
 
 
 def get_official_and_personal_indices(activity: Activity):